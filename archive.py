@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timezone
+import pyarrow as pa
+
+ARCHIVE_DIRECTORY = "archive"
+INDEX_FILENAME = "index.jsonl"
+COMPRESSION = "zstd"
+
+def pack_filename(fetched_at):
+    """Returns the pack file that pages fetched on a UTC date are appended to."""
+    return f"pages-{fetched_at.strftime('%Y-%m-%d')}.pack"
+
+def to_utc_datetime(value):
+    """Parses an ISO timestamp from the index, or passes a datetime through, as an aware UTC datetime."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+class PageArchive:
+    """An append-only, deduplicated archive of raw page sources, indexed by URL and fetch time.
+
+    Each distinct page is zstd-compressed once and appended to a daily pack file. Every fetch
+    adds one line to index.jsonl pointing at its page, so an identical page fetched again only
+    costs an index line. Nothing is ever rewritten, so a crash can at worst lose the last line.
+    """
+
+    def __init__(self, directory=ARCHIVE_DIRECTORY):
+        self.directory = directory
+        self.index_path = os.path.join(directory, INDEX_FILENAME)
+        self.lock = threading.Lock()
+        # Where each distinct page already lives, keyed by its SHA-256
+        self.blobs = {}
+        for entry in self.entries():
+            self.blobs[entry["sha256"]] = {key: entry[key] for key in ("pack", "offset", "length", "size")}
+
+    def record(self, url, page_source, fetched_at=None, path="http"):
+        """Archives one fetched page source and returns its index entry.
+
+        path is what served the page: "http", "browser", or "deep" for one page of a deep scrape.
+        """
+        fetched_at = to_utc_datetime(fetched_at or datetime.now(timezone.utc))
+        raw = page_source.encode("utf-8")
+        digest = hashlib.sha256(raw).hexdigest()
+
+        with self.lock:
+            os.makedirs(self.directory, exist_ok=True)
+            location = self.blobs.get(digest)
+            if location is None:
+                compressed = pa.compress(raw, codec=COMPRESSION, asbytes=True)
+                pack = pack_filename(fetched_at)
+                with open(os.path.join(self.directory, pack), "ab") as pack_file:
+                    offset = pack_file.tell()
+                    pack_file.write(compressed)
+                location = {"pack": pack, "offset": offset, "length": len(compressed), "size": len(raw)}
+                self.blobs[digest] = location
+
+            entry = {"url": url, "fetched_at": fetched_at.isoformat(), "path": path, "sha256": digest, **location}
+            with open(self.index_path, "a", encoding="utf-8") as index_file:
+                index_file.write(json.dumps(entry) + "\n")
+        return entry
+
+    def entries(self, urls=None, start=None, end=None):
+        """Returns the index entries fetched in [start, end) for the given URLs, oldest first."""
+        if not os.path.exists(self.index_path):
+            return []
+        start = to_utc_datetime(start) if start is not None else None
+        end = to_utc_datetime(end) if end is not None else None
+        urls = set(urls) if urls is not None else None
+
+        entries = []
+        with open(self.index_path, encoding="utf-8") as index_file:
+            for line in index_file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line cut short by a crash mid-append
+                    continue
+                if urls is not None and entry["url"] not in urls:
+                    continue
+                fetched_at = to_utc_datetime(entry["fetched_at"])
+                if (start is not None and fetched_at < start) or (end is not None and fetched_at >= end):
+                    continue
+                entries.append(entry)
+        entries.sort(key=lambda entry: entry["fetched_at"])
+        return entries
+
+    def read(self, entry, pack_files=None):
+        """Returns the page source behind an index entry.
+
+        pack_files can be a dict of already-open pack files, so a replay does not reopen a pack per page.
+        """
+        if pack_files is None:
+            with open(os.path.join(self.directory, entry["pack"]), "rb") as pack_file:
+                pack_file.seek(entry["offset"])
+                compressed = pack_file.read(entry["length"])
+        else:
+            if entry["pack"] not in pack_files:
+                pack_files[entry["pack"]] = open(os.path.join(self.directory, entry["pack"]), "rb")
+            pack_file = pack_files[entry["pack"]]
+            pack_file.seek(entry["offset"])
+            compressed = pack_file.read(entry["length"])
+        return pa.decompress(compressed, decompressed_size=entry["size"], codec=COMPRESSION, asbytes=True).decode("utf-8")
+
+    def pages(self, urls=None, start=None, end=None):
+        """Yields (entry, page_source) for every archived fetch in [start, end), oldest first."""
+        pack_files = {}
+        try:
+            for entry in self.entries(urls, start, end):
+                yield entry, self.read(entry, pack_files)
+        finally:
+            for pack_file in pack_files.values():
+                pack_file.close()
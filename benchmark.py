@@ -0,0 +1,310 @@
+import time
+import tempfile
+import multiprocessing
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pyarrow as pa
+import requests
+from bs4 import BeautifulSoup
+from rich.console import Console
+from rich.table import Table
+from rich.style import Style
+from archive import PageArchive
+from table_parser import available_backends, parse_market_table
+from short_interest import fetch_short_interest_bulk, parse_short_interest
+from history import append_snapshot, load_history, market_from_filename, snapshot_table, write_partition
+from stub_server import PageStub
+from benchmark_fixtures import directory_size, load_fixture_pages, load_market_frames, peak_rss_bytes, reset_peak_rss, time_call
+
+def load_archived_pages(limit=200):
+    """Loads the most recent archived page sources (see archive.py), or an empty dict when nothing is archived.
+
+    Real pages recorded by the scraper carry all the markup the fixtures leave out, so they are the
+    more realistic parser input whenever an archive exists.
+    """
+    archive = PageArchive()
+    return {f"{entry['url']} @ {entry['fetched_at']}": archive.read(entry) for entry in archive.entries()[-limit:]}
+
+def measure_parser(backend, pages, repeat, results):
+    """Parses every page repeat times with one backend, recording time and peak memory growth."""
+    reset_peak_rss()
+    baseline_rss = peak_rss_bytes()
+    page_times = []
+    for _ in range(repeat):
+        for page_source in pages:
+            start_time = time.perf_counter()
+            parse_market_table(page_source, backend=backend)
+            page_times.append(time.perf_counter() - start_time)
+    results.put((backend, page_times, peak_rss_bytes() - baseline_rss))
+
+def verify_backends(pages):
+    """Checks that every backend extracts exactly the same rows as the original BeautifulSoup path."""
+    for filename, page_source in pages.items():
+        expected_rows = parse_market_table(page_source, backend="soup")
+        for backend in available_backends():
+            rows = parse_market_table(page_source, backend=backend)
+            if rows != expected_rows:
+                raise AssertionError(f"Parser backend '{backend}' disagrees with 'soup' on {filename}")
+
+def benchmark_parsers(repeat=5):
+    """Benchmarks each parser backend in a fresh process so peak memory is measured in isolation."""
+    pages = load_archived_pages() or load_fixture_pages()
+    verify_backends(pages)
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    benchmark_results = []
+    for backend in available_backends():
+        process = context.Process(target=measure_parser, args=(backend, list(pages.values()), repeat, results))
+        process.start()
+        backend, page_times, peak_memory = results.get()
+        process.join()
+
+        page_times.sort()
+        benchmark_results.append({
+            "backend": backend,
+            "pages": len(page_times),
+            "mean_ms": sum(page_times) / len(page_times) * 1000,
+            "p50_ms": page_times[len(page_times) // 2] * 1000,
+            "max_ms": page_times[-1] * 1000,
+            "peak_memory_mb": peak_memory / 1e6,
+        })
+    return benchmark_results
+
+def display_parser_results(benchmark_results):
+    """Displays the parser benchmark results in a table."""
+    console = Console()
+    header_style = Style(color="white", bold=True)
+    table = Table(title="Table Parser Backends", show_header=True, header_style=header_style)
+
+    table.add_column("Backend", justify="left")
+    table.add_column("Pages", justify="right")
+    table.add_column("Mean (ms/page)", justify="right")
+    table.add_column("p50 (ms/page)", justify="right")
+    table.add_column("Max (ms/page)", justify="right")
+    table.add_column("Peak Memory (MB)", justify="right")
+
+    for result in benchmark_results:
+        table.add_row(
+            result["backend"],
+            str(result["pages"]),
+            f"{result['mean_ms']:.2f}",
+            f"{result['p50_ms']:.2f}",
+            f"{result['max_ms']:.2f}",
+            f"{result['peak_memory_mb']:.1f}",
+        )
+
+    console.print(table)
+
+def build_history_day(df, day_start, interval_minutes):
+    """Builds a whole day of snapshots of one market at a fixed interval as a single Arrow table."""
+    snapshots = 24 * 60 // interval_minutes
+    base = snapshot_table(df, day_start)
+    table = pa.concat_tables([base] * snapshots)
+
+    offsets = np.repeat(np.arange(snapshots, dtype="int64") * interval_minutes * 60_000_000, len(df))
+    start_us = int(day_start.timestamp() * 1_000_000)
+    timestamps = pa.array(start_us + offsets, type=pa.timestamp("us", tz="UTC"))
+    return table.set_column(0, "scraped_at", timestamps)
+
+def benchmark_history(days=30, interval_minutes=1, append_cycles=20, market_file="usa_market.csv"):
+    """Benchmarks appending scrape cycles and querying a month of 1-minute snapshots."""
+    frames = load_market_frames()
+    history_results = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        # One cycle appends a snapshot of every market, like the scraper does
+        cycle_times = []
+        cycle_start = datetime.now(timezone.utc)
+        for cycle in range(append_cycles):
+            scraped_at = cycle_start + timedelta(minutes=cycle)
+            _, elapsed = time_call(
+                lambda: [append_snapshot(market_from_filename(f), df, scraped_at, directory) for f, df in frames.items()]
+            )
+            cycle_times.append(elapsed)
+        history_results.append({
+            "operation": f"Append one cycle ({len(frames)} markets)",
+            "rows": sum(len(df) for df in frames.values()),
+            "ms": sum(cycle_times) / len(cycle_times),
+        })
+
+    with tempfile.TemporaryDirectory() as directory:
+        df = frames[market_file]
+        market = market_from_filename(market_file)
+        first_day = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for day in range(days):
+            day_start = first_day + timedelta(days=day)
+            write_partition(market, day_start.strftime("%Y-%m-%d"), build_history_day(df, day_start, interval_minutes), directory)
+
+        total_rows = days * 24 * 60 // interval_minutes * len(df)
+        last_day = first_day + timedelta(days=days - 1)
+        company = df["Name"].iloc[len(df) // 2]
+        queries = [
+            (f"Market, one hour ({market})", dict(market=market, start=last_day, end=last_day + timedelta(hours=1))),
+            (f"Market, one day ({market})", dict(market=market, start=last_day, end=last_day + timedelta(days=1))),
+            (f"Market, full month ({market})", dict(market=market, start=first_day, end=first_day + timedelta(days=days))),
+            (f"Company, full month ({company})", dict(name=company, start=first_day, end=first_day + timedelta(days=days))),
+            (f"Company, one week ({company})", dict(market=market, name=company, start=last_day - timedelta(days=6), end=last_day + timedelta(days=1))),
+        ]
+        for operation, query in queries:
+            result, elapsed = time_call(load_history, directory=directory, **query)
+            history_results.append({"operation": operation, "rows": len(result), "ms": elapsed})
+
+        print(f"History store: {total_rows:,} rows over {days} days take {directory_size(directory) / 1e6:.1f} MB on disk")
+
+    return history_results
+
+def display_history_results(history_results):
+    """Displays the history store benchmark results in a table."""
+    console = Console()
+    header_style = Style(color="white", bold=True)
+    table = Table(title="History Store", show_header=True, header_style=header_style)
+
+    table.add_column("Operation", justify="left")
+    table.add_column("Rows", justify="right")
+    table.add_column("Time (ms)", justify="right")
+
+    for result in history_results:
+        table.add_row(result["operation"], f"{result['rows']:,}", f"{result['ms']:.1f}")
+
+    console.print(table)
+
+def key_statistics_values(number):
+    """The stats a fixture key-statistics page shows for the number-th symbol."""
+    return {
+        "Float": f"{1 + number % 9}.{number % 100:02d}B",
+        "Shares Short": f"{10 + number % 90}.{number % 10}M",
+        "Short Ratio": f"{1 + number % 7}.{number % 10}{number % 7}",
+        "Short Interest": f"{number % 30 / 10 + 0.5:.2f}%",
+    }
+
+def render_statistics_table(rows):
+    cells = ''.join(
+        f'<tr class="row"><td class="label">{label}</td><td class="value">{value}</td></tr>' for label, value in rows
+    )
+    return f'<table class="table"><tbody>{cells}</tbody></table>'
+
+def render_key_statistics_page(symbol, number):
+    """Renders a Yahoo Finance key-statistics page for a fixture symbol, with the page's other tables and noise.
+
+    Even symbols use the older 'Short Percent of Float' labels, odd ones the current labels with dates and footnotes.
+    """
+    values = key_statistics_values(number)
+    short_float = "Short Percent of Float" if number % 2 == 0 else "Short % of Float (Oct 15, 2024) <sup>4</sup>"
+    share_statistics = [
+        ("Avg Vol (3 month) <sup>3</sup>", "55.2M"),
+        ("Shares Outstanding <sup>5</sup>", "15.2B"),
+        ("Implied Shares Outstanding <sup>6</sup>", "15.5B"),
+        ("Float <sup>8</sup>", values["Float"]),
+        ("% Held by Insiders <sup>1</sup>", "2.07%"),
+        ("% Held by Institutions <sup>1</sup>", "61.54%"),
+        ("Shares Short (Oct 15, 2024) <sup>4</sup>", values["Shares Short"]),
+        ("Short Ratio (Oct 15, 2024) <sup>4</sup>", values["Short Ratio"]),
+        (short_float, values["Short Interest"]),
+        ("Short % of Shares Outstanding (Oct 15, 2024) <sup>4</sup>", "0.92%"),
+        ("Shares Short (prior month Sep 13, 2024) <sup>4</sup>", "99.0M"),
+    ]
+    valuation = [(label, "1.23") for label in ["Market Cap", "Enterprise Value", "Trailing P/E", "Forward P/E", "PEG Ratio (5yr expected)", "Price/Sales", "Price/Book"]]
+    highlights = [(label, "4.56") for label in ["Profit Margin", "Operating Margin", "Return on Assets", "Return on Equity", "Revenue", "Free Cash Flow", "Levered Free Cash Flow"]]
+    price_history = [(label, "7.89") for label in ["Beta (5Y Monthly)", "52-Week Change", "52 Week High", "52 Week Low", "50-Day Moving Average"]]
+    scripts = ''.join(f'<script>window.YAHOO.context.push({{"module": "quote-{idx}", "symbol": "{symbol}", "payload": "{"x" * 400}"}});</script>' for idx in range(300))
+    navigation = ''.join(f'<li><a href="/quote/{symbol}/{idx}/">Link {idx}</a></li>' for idx in range(300))
+    sections = ''.join(
+        f'<section><h3>{title}</h3>{render_statistics_table(rows)}</section>'
+        for title, rows in [("Valuation Measures", valuation), ("Financial Highlights", highlights),
+                            ("Stock Price History", price_history), ("Share Statistics", share_statistics)]
+    )
+    return (
+        f'<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>{symbol} Key Statistics</title>{scripts}</head>'
+        f'<body><nav><ul>{navigation}</ul></nav><main>{sections}</main><footer>{navigation}</footer></body></html>'
+    )
+
+def expected_short_interest(symbol, number):
+    values = key_statistics_values(number)
+    return {"Symbol": symbol, "Short Interest": values["Short Interest"], "Days to Cover": values["Short Ratio"],
+            "Float": values["Float"], "Shares Short": values["Shares Short"]}
+
+def parse_short_interest_legacy(symbol, page_source):
+    """The original parse: a full html.parser tree, every table and row scanned with substring checks."""
+    soup = BeautifulSoup(page_source, 'html.parser')
+    stats = {"Symbol": symbol.upper(), "Short Interest": "N/A", "Days to Cover": "N/A", "Float": "N/A"}
+    for table in soup.find_all('table'):
+        if "Short Percent of Float" in table.text:
+            for row in table.find_all('tr'):
+                if "Short Percent of Float" in row.text:
+                    stats["Short Interest"] = row.find_all('td')[1].text.strip()
+                if "Shares Short (prior month)" in row.text:
+                    stats["Days to Cover"] = row.find_all('td')[1].text.strip()
+                if "Float" in row.text:
+                    stats["Float"] = row.find_all('td')[1].text.strip()
+    return stats
+
+def benchmark_short_interest(symbols=200, parse_pages=20, latency=0.05, workers=16):
+    """Benchmarks the short interest parse and bulk fetch offline, on rendered fixture pages served locally.
+
+    The original parse is timed on a sample of pages, the targeted one on all of them. Both are checked
+    against the values the fixtures were rendered from.
+    """
+    fixtures = {f"SYM{number:03d}": number for number in range(symbols)}
+    expected = [expected_short_interest(symbol, number) for symbol, number in fixtures.items()]
+    short_interest_results = []
+
+    pages = {symbol: render_key_statistics_page(symbol, number) for symbol, number in fixtures.items()}
+    page_kb = sum(len(page) for page in pages.values()) / len(pages) / 1000
+
+    sample = list(pages)[:parse_pages]
+    legacy, elapsed = time_call(lambda: [parse_short_interest_legacy(symbol, pages[symbol]) for symbol in sample])
+    correct = sum(all(stats[key] == want[key] for key in stats) for stats, want in zip(legacy, expected))
+    short_interest_results.append({"operation": f"Parse, full tree and substring scan ({page_kb:.0f} KB pages)", "symbols": len(sample), "correct": correct, "ms": elapsed})
+
+    targeted, elapsed = time_call(lambda: [parse_short_interest(symbol, page) for symbol, page in pages.items()])
+    correct = sum(stats == want for stats, want in zip(targeted, expected))
+    short_interest_results.append({"operation": "Parse, statistics table only", "symbols": len(pages), "correct": correct, "ms": elapsed})
+
+    with PageStub({f"/quote/{symbol}/key-statistics": page for symbol, page in pages.items()}, latency) as stub:
+        url = f"{stub.base_url}/quote/{{}}/key-statistics"
+
+        def one_at_a_time():
+            return [parse_short_interest(symbol, requests.get(url.format(symbol), timeout=15).text) for symbol in fixtures]
+
+        sequential, elapsed = time_call(one_at_a_time)
+        short_interest_results.append({"operation": f"Fetch one at a time ({latency * 1000:.0f} ms latency)", "symbols": len(sequential),
+                                       "correct": sum(stats == want for stats, want in zip(sequential, expected)), "ms": elapsed})
+
+        (frame, _), elapsed = time_call(fetch_short_interest_bulk, list(fixtures), workers, url)
+        correct = sum(stats == want for stats, want in zip(frame.to_dict("records"), expected))
+        short_interest_results.append({"operation": f"Bulk fetch, {workers} at once, pooled session", "symbols": len(frame),
+                                       "correct": correct, "ms": elapsed})
+
+    return short_interest_results
+
+def display_short_interest_results(short_interest_results):
+    """Displays the short interest benchmark results in a table."""
+    console = Console()
+    header_style = Style(color="white", bold=True)
+    table = Table(title="Short Interest on Fixture Pages", show_header=True, header_style=header_style)
+
+    table.add_column("Operation", justify="left")
+    table.add_column("Symbols", justify="right")
+    table.add_column("Correct", justify="right")
+    table.add_column("Time (ms)", justify="right")
+    table.add_column("Per Symbol (ms)", justify="right")
+
+    for result in short_interest_results:
+        table.add_row(result["operation"], str(result["symbols"]), str(result["correct"]), f"{result['ms']:.0f}",
+                      f"{result['ms'] / result['symbols']:.2f}")
+
+    console.print(table)
+
+def main():
+    print("Benchmarking table parser backends on archived pages, or fixture pages when nothing is archived...")
+    display_parser_results(benchmark_parsers())
+
+    print("\nBenchmarking the history store over a month of 1-minute snapshots...")
+    display_history_results(benchmark_history())
+
+    print("\nBenchmarking short interest parsing and bulk fetching on rendered fixture pages...")
+    display_short_interest_results(benchmark_short_interest())
+
+if __name__ == "__main__":
+    main()
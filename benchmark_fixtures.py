@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+import resource
+import pandas as pd
+
+OUTPUT_DIRECTORY = "output"
+
+# Reverse of the scraper's flag map, used to put flags back into the fixture pages
+country_code_to_flag = {
+    "US": "🇺🇸", "CN": "🇨🇳", "CA": "🇨🇦", "MX": "🇲🇽", "BR": "🇧🇷", "CL": "🇨🇱", "EU": "🇪🇺",
+    "DE": "🇩🇪", "GB": "🇬🇧", "FR": "🇫🇷", "ES": "🇪🇸", "NL": "🇳🇱", "SE": "🇸🇪", "IT": "🇮🇹",
+    "CH": "🇨🇭", "PL": "🇵🇱", "FI": "🇫🇮", "JP": "🇯🇵", "KR": "🇰🇷", "HK": "🇭🇰", "SG": "🇸🇬",
+    "ID": "🇮🇩", "IN": "🇮🇳", "MY": "🇲🇾", "TW": "🇹🇼", "TH": "🇹🇭", "AU": "🇦🇺", "NZ": "🇳🇿",
+    "IL": "🇮🇱", "SA": "🇸🇦", "TR": "🇹🇷", "RU": "🇷🇺", "ZA": "🇿🇦", "IE": "🇮🇪", "DK": "🇩🇰",
+    "BE": "🇧🇪", "AT": "🇦🇹",
+}
+
+def render_fixture_row(row):
+    """Renders one CSV row as a companiesmarketcap.com table row."""
+    flag = country_code_to_flag.get(row['Country'], "🏳")
+    return (
+        '<tr>'
+        '<td class="fav"><img alt="favorite icon" src="/img/fav.svg"></td>'
+        f'<td class="rank-td td-right" data-sort="{row["Rank"]}">{row["Rank"]}</td>'
+        '<td class="name-td"><div class="logo-container">'
+        '<img loading="lazy" class="company-logo" src="/img/company-logos/64/logo.webp"></div>'
+        f'<div class="name-div"><a href="/company/marketcap/"><div class="company-name">{row["Name"]}</div>'
+        '<div class="company-code"><span class="rank d-none"></span>CODE</div></a></div></td>'
+        f'<td class="td-right" data-sort="0">{row["Market Cap"]}</td>'
+        f'<td class="td-right" data-sort="0">{row["Price"]}</td>'
+        '<td data-sort="0" class="rh-sm"><span class="percentage-green">'
+        '<svg class="a" viewBox="0 0 12 12"><path d="M10 4 6 8 2 4h8Z"></path></svg>0.52%</span></td>'
+        '<td class="p-0 sparkline-td"><svg width="100" height="20"><polyline points="0,10 50,5 100,12"></polyline></svg></td>'
+        f'<td><span class="responsive-hidden">{flag}</span> <span class="responsive-hidden">Country</span></td>'
+        '</tr>'
+    )
+
+def render_fixture_page(df):
+    """Renders a market CSV as a full page in the site's markup, including the non-table noise."""
+    navigation = ''.join(f'<li><a href="/category/{idx}/">Category {idx}</a></li>' for idx in range(200))
+    scripts = ''.join(f'<script>window.dataLayer.push({{"event": "load-{idx}"}});</script>' for idx in range(50))
+    rows = ''.join(render_fixture_row(row) for _, row in df.iterrows())
+    return (
+        '<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>Largest companies by market cap</title>'
+        f'{scripts}</head><body><nav><ul>{navigation}</ul></nav>'
+        '<div class="table-container shadow"><table class="default-table table marketcap-table dataTable" style="width:100%">'
+        '<thead><tr><th class="fav"></th><th class="sorting">Rank</th><th>Name</th><th>Market Cap</th>'
+        '<th>Price</th><th>Today</th><th>Price (30 days)</th><th>Country</th></tr></thead>'
+        f'<tbody>{rows}</tbody></table></div><footer>{navigation}</footer></body></html>'
+    )
+
+def load_fixture_pages(directory=OUTPUT_DIRECTORY):
+    """Builds one fixture page per market CSV in the output directory."""
+    pages = {}
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith('.csv'):
+            df = pd.read_csv(os.path.join(directory, filename), dtype=str)
+            pages[filename] = render_fixture_page(df)
+    return pages
+
+def read_proc_status(field):
+    """Reads a memory field in bytes from /proc/self/status, or returns None where /proc is unavailable."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def reset_peak_rss():
+    """Resets the peak resident set size on Linux so a measurement starts from current usage."""
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+def peak_rss_bytes():
+    """Returns the process's peak resident set size in bytes."""
+    peak = read_proc_status("VmHWM")
+    if peak is not None:
+        return peak
+    # ru_maxrss is reported in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def load_market_frames(directory=OUTPUT_DIRECTORY):
+    """Loads every market CSV in the output directory as scraped strings."""
+    return {
+        filename: pd.read_csv(os.path.join(directory, filename), dtype=str)
+        for filename in sorted(os.listdir(directory)) if filename.endswith('.csv')
+    }
+
+def directory_size(directory):
+    """Returns the total size in bytes of every file under a directory."""
+    return sum(
+        os.path.getsize(os.path.join(root, f))
+        for root, _, files in os.walk(directory) for f in files
+    )
+
+def time_call(function, *args, **kwargs):
+    """Calls a function once and returns its result with the elapsed milliseconds."""
+    start_time = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, (time.perf_counter() - start_time) * 1000
@@ -0,0 +1,363 @@
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta, timezone
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from rich.console import Console
+from rich.table import Table
+from rich.style import Style
+import correlation
+import main as scraper
+import screener
+from archive import PageArchive
+from market_data import write_typed
+from market_values import parse_money_column
+from correlation_engine import CorrelationEngine
+from query_engine import ScreenEngine
+from rolling_correlation import ROLLING_WINDOW, RollingCorrelation
+from table_view import TableView
+from benchmark_fixtures import OUTPUT_DIRECTORY, load_market_frames, peak_rss_bytes, render_fixture_page, reset_peak_rss
+
+# Synthetic output/ sizes every stage is measured at, in rows
+SCALES = (100, 1_000, 10_000, 100_000, 1_000_000)
+# Page-based stages parse and write 100 rows per page, so they stop earlier to keep a run in minutes
+STAGE_MAX_ROWS = {"scrape": 100_000, "parse": 100_000, "rolling_update": 10_000, "correlation_pandas": 5_000, "correlation_engine": 10_000}
+# Snapshot-to-snapshot returns per company in the large-universe correlation stages
+CORRELATION_OBSERVATIONS = 240
+ROWS_PER_PAGE = 100
+REPEAT = 3
+
+RESULTS_DIRECTORY = "benchmark_results"
+# A stage whose p50 grew by more than this factor against the baseline run counts as a regression
+REGRESSION_THRESHOLD = 1.2
+
+def convert_market_cap_per_row(market_cap_str):
+    """The per-row converter the viewer ran through .apply before market_values, kept as the baseline."""
+    market_cap_str = market_cap_str.replace('$', '').strip()
+    if 'T' in market_cap_str:
+        return float(market_cap_str.replace('T', '')) * 1e12
+    elif 'B' in market_cap_str:
+        return float(market_cap_str.replace('B', '')) * 1e9
+    elif 'M' in market_cap_str:
+        return float(market_cap_str.replace('M', '')) * 1e6
+    else:
+        return float(market_cap_str)
+
+def build_synthetic_frame(rows, seed=0):
+    """Builds an output/-style frame of the given size by resampling the real rows of every market CSV."""
+    # The per-row reference converter fails on a missing market cap, so only complete rows are resampled
+    base = pd.concat(load_market_frames().values(), ignore_index=True).dropna()
+    sample = base.iloc[np.random.default_rng(seed).integers(0, len(base), rows)].reset_index(drop=True)
+    sample["Rank"] = (np.arange(rows) % ROWS_PER_PAGE + 1).astype(str)
+    return sample
+
+def prepare_workload(workdir, rows):
+    """Writes the synthetic CSV and, for the page-based stages, an archive of fixture pages built from it."""
+    df = build_synthetic_frame(rows)
+    df.to_csv(os.path.join(workdir, "market.csv"), index=False)
+    write_typed([df], os.path.join(workdir, "market.csv"))
+
+    if rows <= max(STAGE_MAX_ROWS.values()):
+        # Spread the pages over the scraper's URLs, one minute apart, like a recorded run
+        archive = PageArchive(os.path.join(workdir, "archive"))
+        urls = list(scraper.url_filename_map)
+        fetched_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for page_number, start in enumerate(range(0, rows, ROWS_PER_PAGE)):
+            page_source = render_fixture_page(df.iloc[start:start + ROWS_PER_PAGE])
+            archive.record(urls[page_number % len(urls)], page_source, fetched_at + timedelta(minutes=page_number))
+
+def stage_scrape(workdir):
+    """The scraper's parse, hash, CSV and history write pipeline, replayed from the page archive."""
+    archive = PageArchive(os.path.join(workdir, "archive"))
+    runs = iter(range(1_000_000))
+    return lambda: scraper.replay_archive(directory=os.path.join(workdir, f"replay-{next(runs)}"), archive=archive)
+
+def stage_parse(workdir):
+    """Table extraction alone, over the archived page sources held in memory."""
+    archive = PageArchive(os.path.join(workdir, "archive"))
+    pages = [page_source for _, page_source in archive.pages()]
+    return lambda: [scraper.extract_rows(page_source) for page_source in pages]
+
+def stage_load_csv(workdir):
+    """Reading the market CSV of display strings, as the viewer did before the typed copy."""
+    path = os.path.join(workdir, "market.csv")
+    return lambda: pd.read_csv(path)
+
+def stage_load(workdir):
+    """The viewer's load_data, which memory-maps the typed copy."""
+    path = os.path.join(workdir, "market.csv")
+    return lambda: screener.load_data(path)
+
+def stage_convert_per_row(workdir):
+    """The old per-row market-cap conversion through .apply, as the baseline for convert_vectorized."""
+    df = pd.read_csv(os.path.join(workdir, "market.csv"))
+    return lambda: df["Market Cap"].apply(convert_market_cap_per_row)
+
+def stage_convert_vectorized(workdir):
+    """The shared vectorized market-cap conversion the scraper uses to write the typed copy."""
+    df = pd.read_csv(os.path.join(workdir, "market.csv"))
+    return lambda: parse_money_column(df["Market Cap"])
+
+def stage_convert_correlation(workdir):
+    """The correlation tool's market-cap and price cleaning, on the display strings of a CSV."""
+    df = pd.read_csv(os.path.join(workdir, "market.csv"))
+    return lambda: correlation.clean_and_convert_data(df.copy())
+
+def stage_rolling_update(workdir):
+    """Ten snapshots fed into a full rolling correlation window with one company per row."""
+    df = screener.load_data(os.path.join(workdir, "market.csv"))
+    rng = np.random.default_rng(0)
+    values = df["Market Cap"].fillna(1e9).to_numpy()
+    rolling = RollingCorrelation(assets=pd.RangeIndex(len(df)), window=ROLLING_WINDOW)
+    for _ in range(ROLLING_WINDOW + 1):
+        rolling.update_values(values * (1 + rng.normal(0, 0.001, len(values))))
+    snapshots = [values * (1 + rng.normal(0, 0.001, len(values))) for _ in range(10)]
+
+    def run():
+        for snapshot in snapshots:
+            rolling.update_values(snapshot)
+    return run
+
+def synthetic_returns(workdir):
+    """Returns with some shared factors, one column per company of the synthetic market."""
+    df = pd.read_csv(os.path.join(workdir, "market.csv"), usecols=["Name"])
+    rng = np.random.default_rng(0)
+    factors = rng.normal(0, 0.01, (CORRELATION_OBSERVATIONS, 8))
+    loadings = rng.normal(0, 1, (8, len(df))) * (rng.random((8, len(df))) < 0.2)
+    returns = factors @ loadings + rng.normal(0, 0.01, (CORRELATION_OBSERVATIONS, len(df)))
+    return pd.DataFrame(returns, columns=pd.RangeIndex(len(df)))
+
+def stage_correlation_pandas(workdir):
+    """The full float64 DataFrame.corr() that generate_correlation_matrix builds, over company returns."""
+    returns = synthetic_returns(workdir)
+    return lambda: correlation.generate_correlation_matrix(returns)
+
+def stage_correlation_engine(workdir):
+    """The blockwise float32 engine over the same returns: top pairs and nearest neighbours in one pass."""
+    returns = synthetic_returns(workdir)
+    return lambda: CorrelationEngine.from_frame(returns).compute()
+
+def stage_screen(workdir):
+    """A batch of screens through the indexed query engine, over indexes built once beforehand."""
+    engine = ScreenEngine(screener.load_data(os.path.join(workdir, "market.csv")))
+    screens = [
+        {"market_cap": (1e11, 1e12), "countries": ["US"]},
+        {"price": (None, 5.0), "rank": (1, 20)},
+        {"countries": ["JP", "KR"], "market_cap": (1e10, None), "sort_by": "Price"},
+        {"name_prefix": "ba"},
+        {"rank": (1, 10), "page": 3},
+    ] * 20
+    return lambda: [engine.query(**screen) for screen in screens]
+
+def stage_render_table(workdir):
+    """The viewer's display_table, rendered into a discarded buffer."""
+    df = screener.load_data(os.path.join(workdir, "market.csv"))
+
+    def render():
+        with redirect_stdout(io.StringIO()):
+            screener.display_table(df)
+    return render
+
+def stage_render_scroll(workdir):
+    """Ten pages spread over the whole frame through the viewer's table view, rendered into a discarded buffer."""
+    df = screener.load_data(os.path.join(workdir, "market.csv"))
+    view = TableView(df)
+    console = Console(file=io.StringIO(), width=120)
+
+    def render():
+        for page in range(1, view.page_count + 1, max(1, view.page_count // 10)):
+            view.go_to_page(page)
+            console.print(view.render())
+    return render
+
+def stage_render_chart(workdir):
+    """The viewer's display_chart on the non-interactive Agg backend."""
+    df = screener.load_data(os.path.join(workdir, "market.csv"))
+
+    def render():
+        screener.display_chart(df.copy())
+        plt.close("all")
+    return render
+
+STAGES = {
+    "scrape": stage_scrape,
+    "parse": stage_parse,
+    "load_csv": stage_load_csv,
+    "load": stage_load,
+    "convert_per_row": stage_convert_per_row,
+    "convert_vectorized": stage_convert_vectorized,
+    "convert_correlation": stage_convert_correlation,
+    "rolling_update": stage_rolling_update,
+    "correlation_pandas": stage_correlation_pandas,
+    "correlation_engine": stage_correlation_engine,
+    "screen": stage_screen,
+    "render_table": stage_render_table,
+    "render_scroll": stage_render_scroll,
+    "render_chart": stage_render_chart,
+}
+
+def measure_stage(stage, workdir, rows, repeat, results):
+    """Runs one stage repeat times in this process, recording each run's time and the peak memory growth."""
+    warnings.simplefilter("ignore")
+    try:
+        run = STAGES[stage](workdir)
+        reset_peak_rss()
+        baseline_rss = peak_rss_bytes()
+        run_times = []
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            run()
+            run_times.append(time.perf_counter() - start_time)
+        results.put((run_times, peak_rss_bytes() - baseline_rss, None))
+    except Exception as e:
+        # Report the failure instead of leaving the parent waiting on a result that never comes
+        results.put((None, None, f"{e.__class__.__name__}: {e}"))
+
+def summarize(stage, rows, run_times, peak_memory):
+    """Turns one stage's run times into latency, throughput and memory figures."""
+    run_times = sorted(run_times)
+    p50 = run_times[len(run_times) // 2]
+    return {
+        "stage": stage,
+        "rows": rows,
+        "runs": len(run_times),
+        "min_ms": run_times[0] * 1000,
+        "p50_ms": p50 * 1000,
+        "p95_ms": run_times[min(len(run_times) - 1, int(len(run_times) * 0.95))] * 1000,
+        "rows_per_s": rows / p50 if p50 else None,
+        "peak_memory_mb": peak_memory / 1e6,
+    }
+
+def run_suite(scales=SCALES, stages=tuple(STAGES), repeat=REPEAT):
+    """Measures every stage at every scale, each in a fresh process so peak memory is measured in isolation."""
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    suite_results = []
+
+    for rows in scales:
+        with tempfile.TemporaryDirectory() as workdir:
+            prepare_workload(workdir, rows)
+            for stage in stages:
+                if rows > STAGE_MAX_ROWS.get(stage, max(SCALES)):
+                    continue
+                process = context.Process(target=measure_stage, args=(stage, workdir, rows, repeat, results))
+                process.start()
+                run_times, peak_memory, error = results.get()
+                process.join()
+                if error is not None:
+                    print(f"{stage} at {rows:,} rows failed: {error}", file=sys.stderr)
+                    continue
+                suite_results.append(summarize(stage, rows, run_times, peak_memory))
+                print(f"{stage} at {rows:,} rows: {suite_results[-1]['p50_ms']:.1f} ms", file=sys.stderr)
+    return suite_results
+
+def current_commit():
+    """Returns the short hash of the checked-out commit, or None outside a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def save_results(suite_results, path=None):
+    """Saves a run as JSON along with the commit and machine it ran on, and returns the file path."""
+    created_at = datetime.now(timezone.utc)
+    commit = current_commit()
+    if path is None:
+        os.makedirs(RESULTS_DIRECTORY, exist_ok=True)
+        path = os.path.join(RESULTS_DIRECTORY, f"{created_at.strftime('%Y%m%dT%H%M%S')}-{commit or 'nocommit'}.json")
+
+    report = {
+        "created_at": created_at.isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "results": suite_results,
+    }
+    with open(path, "w") as results_file:
+        json.dump(report, results_file, indent=2)
+    return path
+
+def compare_results(suite_results, baseline_path):
+    """Pairs every result with the same stage and size from a baseline run and its p50 ratio."""
+    with open(baseline_path) as baseline_file:
+        baseline = {(r["stage"], r["rows"]): r for r in json.load(baseline_file)["results"]}
+    for result in suite_results:
+        previous = baseline.get((result["stage"], result["rows"]))
+        result["baseline_p50_ms"] = previous["p50_ms"] if previous else None
+        result["ratio"] = result["p50_ms"] / previous["p50_ms"] if previous and previous["p50_ms"] else None
+    return [r for r in suite_results if r["ratio"] is not None and r["ratio"] > REGRESSION_THRESHOLD]
+
+def display_suite_results(suite_results):
+    """Displays the suite's results, with the change against the baseline when one was given."""
+    console = Console()
+    header_style = Style(color="white", bold=True)
+    table = Table(title="Benchmark Suite", show_header=True, header_style=header_style)
+    compared = any("ratio" in result for result in suite_results)
+
+    table.add_column("Stage", justify="left")
+    table.add_column("Rows", justify="right")
+    table.add_column("p50 (ms)", justify="right")
+    table.add_column("p95 (ms)", justify="right")
+    table.add_column("Rows/s", justify="right")
+    table.add_column("Peak Memory (MB)", justify="right")
+    if compared:
+        table.add_column("vs Baseline", justify="right")
+
+    for result in suite_results:
+        row = [
+            result["stage"],
+            f"{result['rows']:,}",
+            f"{result['p50_ms']:.1f}",
+            f"{result['p95_ms']:.1f}",
+            f"{result['rows_per_s']:,.0f}" if result["rows_per_s"] else "-",
+            f"{result['peak_memory_mb']:.1f}",
+        ]
+        style = None
+        if compared:
+            ratio = result.get("ratio")
+            row.append(f"{ratio:.2f}x" if ratio is not None else "-")
+            if ratio is not None and ratio > REGRESSION_THRESHOLD:
+                style = Style(color="red", bold=True)
+        table.add_row(*row, style=style)
+
+    console.print(table)
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmarks the scrape, parse, load, convert and render paths offline.")
+    parser.add_argument("--scales", type=int, nargs="+", default=list(SCALES), help="synthetic sizes in rows")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--output", help=f"JSON file to write, defaults to a new file in {RESULTS_DIRECTORY}/")
+    parser.add_argument("--compare", help="earlier results JSON to compare against; exits with 1 on a regression")
+    return parser.parse_args()
+
+def main():
+    arguments = parse_arguments()
+    if not os.path.isdir(OUTPUT_DIRECTORY):
+        sys.exit(f"The suite resamples the CSVs in '{OUTPUT_DIRECTORY}', run the scraper first.")
+
+    suite_results = run_suite(arguments.scales, arguments.stages, arguments.repeat)
+    regressions = compare_results(suite_results, arguments.compare) if arguments.compare else []
+    display_suite_results(suite_results)
+    print(f"Results saved to {save_results(suite_results, arguments.output)}")
+
+    if regressions:
+        print(f"{len(regressions)} stage(s) slower than the baseline by more than {REGRESSION_THRESHOLD}x")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
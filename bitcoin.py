@@ -1,42 +1,35 @@
+import argparse
 import requests
 from rich.console import Console
 from rich.table import Table
 from rich.style import Style
 from rich.text import Text
 from rich.panel import Panel
+from crypto_client import get_client
 
-# Endpoint for getting prices of multiple cryptocurrencies from CoinGecko API
-API_URL = "https://api.coingecko.com/api/v3/coins/markets"
-PARAMS = {
-    "vs_currency": "usd",  # Get prices in USD
-    "order": "market_cap_desc",  # Order by market cap descending
-    "per_page": 50,  # Adjust this number to get more cryptocurrencies
-    "page": 1,
-    "sparkline": False
-}
+# Number of cryptocurrencies to show by default
+TOP_COINS = 50
 
-def fetch_crypto_data():
-    """Fetches cryptocurrency data from the CoinGecko API and returns it as a list."""
+def fetch_crypto_data(count=TOP_COINS, all_coins=False):
+    """Fetches the largest cryptocurrencies by market cap through the shared CoinGecko client and returns them as a list."""
     try:
-        response = requests.get(API_URL, params=PARAMS)
-        if response.status_code == 200:
-            crypto_data = response.json()
-            crypto_prices = []
-            
-            # Extracting data for each cryptocurrency
-            for crypto in crypto_data:
-                name = crypto.get("name", "N/A")
-                symbol = crypto.get("symbol", "N/A").upper()
-                price = crypto.get("current_price", 0.0)
-                market_cap = crypto.get("market_cap", 0.0)
-                
-                # Creating a list for each entry
-                crypto_prices.append([name, symbol, price, market_cap])
-                
-            return crypto_prices
-        else:
-            print("Failed to fetch data. Please check the API.")
-            return []
+        crypto_data = get_client().all_coins() if all_coins else get_client().top(count)
+        crypto_prices = []
+
+        # Extracting data for each cryptocurrency
+        for crypto in crypto_data:
+            name = crypto.get("name", "N/A")
+            symbol = crypto.get("symbol", "N/A").upper()
+            price = crypto.get("current_price") or 0.0
+            market_cap = crypto.get("market_cap") or 0.0
+
+            # Creating a list for each entry
+            crypto_prices.append([name, symbol, price, market_cap])
+
+        return crypto_prices
+    except requests.RequestException as e:
+        print(f"Failed to fetch data. Please check the API. ({e})")
+        return []
     except Exception as e:
         print(f"Error occurred: {e}")
         return []
@@ -101,9 +94,16 @@ def display_crypto_table(crypto_data):
     # Display the table
     console.print(table)
 
-def main():
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Shows the largest cryptocurrencies by market cap.")
+    parser.add_argument("--top", type=int, default=TOP_COINS, help="number of cryptocurrencies to show")
+    parser.add_argument("--all", action="store_true", help="page through every coin CoinGecko lists")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
     # Fetch data from the API
-    crypto_data = fetch_crypto_data()
+    crypto_data = fetch_crypto_data(arguments.top, arguments.all)
     
     if crypto_data:
         # Display the fetched data in a table
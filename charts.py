@@ -0,0 +1,43 @@
+import numpy as np
+import seaborn as sns
+from market_values import format_market_cap, parse_money_column
+
+# Companies per bar chart
+TOP_N = 50
+# Numeric columns of a market that a correlation heatmap compares
+CORRELATION_COLUMNS = ["Rank", "Market Cap", "Price"]
+
+def top_companies(data, top_n=TOP_N):
+    """Returns the top_n companies by market cap with a numeric 'Market Cap (Numeric)' column, and any unparseable values."""
+    market_cap, unparseable = parse_money_column(data["Market Cap"])
+    ranked = data.assign(**{"Market Cap (Numeric)": market_cap}).dropna(subset=["Market Cap (Numeric)"])
+    top = ranked.nlargest(top_n, "Market Cap (Numeric)")
+    return top, unparseable
+
+def chart_labels(top):
+    """Builds the 'Name ($3.595 T, US)' bar labels from whole columns."""
+    market_caps = [format_market_cap(value) for value in top["Market Cap (Numeric)"].tolist()]
+    return [f"{name} ({market_cap}, {country})" for name, market_cap, country in zip(top["Name"].tolist(), market_caps, top["Country"].tolist())]
+
+def draw_top_chart(ax, top, title):
+    """Draws a horizontal bar chart of the top companies onto an axes, largest at the top."""
+    positions = np.arange(len(top))
+    # Bars are placed by position, so two companies with the same label still get a bar each
+    ax.barh(positions, top["Market Cap (Numeric)"].to_numpy(), color="blue")
+    ax.set_yticks(positions, chart_labels(top))
+    ax.invert_yaxis()
+    ax.set_xlabel("Market Cap (in USD)")
+    ax.set_title(title)
+    ax.grid(axis="x", linestyle="--", alpha=0.7)
+
+def correlation_matrix(data, columns=CORRELATION_COLUMNS):
+    """Returns the correlation matrix of a market's numeric columns, or None when there is too little data."""
+    numeric = data[[column for column in columns if column in data.columns]].select_dtypes(include="number")
+    if numeric.shape[1] < 2 or numeric.dropna().shape[0] < 3:
+        return None
+    return numeric.corr()
+
+def draw_heatmap(ax, matrix, title, cbar_ax=None):
+    """Draws a correlation heatmap onto an axes, with its color bar on cbar_ax when one is given."""
+    sns.heatmap(matrix, ax=ax, cbar_ax=cbar_ax, annot=True, cmap="coolwarm", center=0, vmin=-1, vmax=1, linewidths=1, linecolor="white")
+    ax.set_title(title)
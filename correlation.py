@@ -1,5 +1,6 @@
 import os
-import pandas as pd
+import time
+import numpy as np
 import matplotlib.pyplot as plt
 from rich.console import Console
 from rich.table import Table
@@ -7,6 +8,21 @@ from rich.style import Style
 from rich.text import Text
 from rich.panel import Panel
 import seaborn as sns
+from market_data import load_all_markets, load_market, rank_across_markets
+from correlation_engine import NEIGHBOURS, TOP_PAIRS, CorrelationEngine, draw_clustered_heatmap
+from history import list_markets, load_history
+from market_values import describe_unparseable, parse_money_column
+from rolling_correlation import ROLLING_WINDOW, rolling_from_history, snapshot_values
+
+# Menu choice that loads every market at once instead of a single CSV
+ALL_MARKETS = "all"
+
+# Companies shown in the rolling correlation table (the largest by their latest value)
+ROLLING_DISPLAY_ASSETS = 10
+# Seconds between checks for new snapshots when following a market
+FOLLOW_INTERVAL = 60
+# Above this many assets a matrix is summarized as top pairs and a clustered heatmap, not printed cell by cell
+FULL_MATRIX_LIMIT = 25
 
 def list_csv_files(directory):
     """List all CSV files in the specified directory."""
@@ -22,13 +38,17 @@ def select_csv_file():
         return None
     
     print("Available CSV files:")
+    print("0. All markets (cross-market view)")
     for idx, file in enumerate(csv_files):
         print(f"{idx + 1}. {file}")
     
     # Get user's choice
     while True:
         try:
-            choice = int(input(f"Select a file (1-{len(csv_files)}): "))
+            choice = int(input(f"Select a file (0-{len(csv_files)}): "))
+            if choice == 0:
+                print("Selected: all markets")
+                return ALL_MARKETS
             if 1 <= choice <= len(csv_files):
                 selected_file = os.path.join(output_directory, csv_files[choice - 1])
                 print(f"Selected file: {csv_files[choice - 1]}")
@@ -39,34 +59,27 @@ def select_csv_file():
             print("Please enter a valid number.")
 
 def load_data(csv_file):
-    """Load data from the specified CSV file."""
+    """Load a market as a typed frame, or every market with each company once when ALL_MARKETS is selected."""
+    if csv_file == ALL_MARKETS:
+        return rank_across_markets(load_all_markets())
     if os.path.exists(csv_file):
-        df = pd.read_csv(csv_file)
+        df = load_market(csv_file)
         return df
     else:
         print(f"{csv_file} not found.")
         return None
 
-def convert_market_cap_to_numeric(market_cap_str):
-    """Convert market cap strings like '$3.5B' or '500M' to float values."""
-    if isinstance(market_cap_str, str):
-        market_cap_str = market_cap_str.replace('$', '').strip()
-        if 'B' in market_cap_str:
-            return float(market_cap_str.replace('B', '')) * 1e9
-        elif 'M' in market_cap_str:
-            return float(market_cap_str.replace('M', '')) * 1e6
-        elif 'T' in market_cap_str:
-            return float(market_cap_str.replace('T', '')) * 1e12
-        else:
-            return float(market_cap_str)  # Assuming it's a plain number
-    return market_cap_str
-
 def clean_and_convert_data(data):
-    """Clean and convert specific columns to numeric values."""
-    if 'Market Cap' in data.columns:
-        data['Market Cap'] = data['Market Cap'].apply(convert_market_cap_to_numeric)
-    if 'Price' in data.columns:
-        data['Price'] = pd.to_numeric(data['Price'], errors='coerce')
+    """Clean and convert specific columns to numeric values, reporting any value that could not be parsed.
+
+    Typed frames from load_data are already numeric and pass straight through.
+    """
+    for column in ('Market Cap', 'Price'):
+        if column in data.columns:
+            data[column], unparseable = parse_money_column(data[column])
+            notice = describe_unparseable(column, unparseable)
+            if notice:
+                print(notice)
     return data
 
 def select_columns(data):
@@ -84,7 +97,7 @@ def select_columns(data):
             selected_columns = [columns[i] for i in indices if i < len(columns)]
             if selected_columns:
                 print(f"Selected Columns: {selected_columns}")
-                numeric_data = data[selected_columns].select_dtypes(include=['float64', 'int64'])
+                numeric_data = data[selected_columns].select_dtypes(include='number')
                 return numeric_data
             else:
                 print("No valid columns selected. Please try again.")
@@ -105,6 +118,9 @@ def display_correlation_table(correlation_matrix):
     if correlation_matrix is None:
         print("Correlation matrix is empty. No data to display.")
         return
+    if len(correlation_matrix) > FULL_MATRIX_LIMIT:
+        print(f"{len(correlation_matrix)} assets are too many to print; use the Universe mode for top pairs.")
+        return
 
     console = Console()
     
@@ -134,7 +150,7 @@ def display_correlation_table(correlation_matrix):
     # Populate the table with correlation data
     for i, row in enumerate(correlation_matrix.iterrows()):
         row_data = [asset_names[i]] + [f"{value:.2f}" for value in row[1]]
-        row_style = Style(color="white" if i % 2 == 0 else "light_gray", bold=True)
+        row_style = Style(color="white" if i % 2 == 0 else "grey82", bold=True)
         table.add_row(*row_data, style=row_style)
     
     console.print(table)
@@ -146,7 +162,9 @@ def generate_heatmap(data):
         return
     
     plt.figure(figsize=(10, 8))
-    sns.heatmap(data, annot=True, cmap='coolwarm', center=0, linewidths=1, linecolor='white')
+    # Cell annotations and borders only while the cells are big enough to read
+    small = len(data) <= FULL_MATRIX_LIMIT
+    sns.heatmap(data, annot=small, cmap='coolwarm', center=0, linewidths=1 if small else 0, linecolor='white')
     plt.title("Correlation Heatmap")
     plt.tight_layout()
     plt.show()
@@ -161,7 +179,139 @@ def generate_gradient_color(start_rgb, end_rgb, steps):
         gradient_colors.append(f"rgb({r},{g},{b})")
     return gradient_colors
 
+def select_option(prompt, options):
+    """Prompt the user to pick one of a numbered list of options."""
+    for idx, option in enumerate(options):
+        print(f"{idx + 1}. {option}")
+    while True:
+        try:
+            choice = int(input(f"{prompt} (1-{len(options)}): "))
+            if 1 <= choice <= len(options):
+                return options[choice - 1]
+            print("Invalid choice. Please try again.")
+        except ValueError:
+            print("Please enter a valid number.")
+
+def display_rolling_correlation(rolling, market, column):
+    """Displays the rolling correlation of the largest companies' returns."""
+    if rolling.count < 2:
+        print(f"Not enough snapshots of '{market}' yet: {rolling.count} return(s) in the window.")
+        return None
+    largest = rolling.assets[np.argsort(-np.nan_to_num(rolling.last_values, nan=-np.inf))[:ROLLING_DISPLAY_ASSETS]]
+    print(f"\n{market}: correlation of {column} returns over the last {rolling.count} snapshots, up to {rolling.updated_at}")
+    correlation_matrix = rolling.correlation(largest)
+    display_correlation_table(correlation_matrix)
+    return correlation_matrix
+
+def run_rolling_correlation():
+    """Time-series mode: correlates companies' returns across the scraper's snapshot history."""
+    markets = list_markets()
+    if not markets:
+        print("No snapshot history found in the 'history' directory.")
+        return
+
+    print("\nMarkets with history:")
+    market = select_option("Select a market", markets)
+    print("\nReturns of:")
+    column = select_option("Select a column", ["Market Cap", "Price"])
+    window_input = input(f"Window in snapshots (default {ROLLING_WINDOW}): ").strip()
+    window = int(window_input) if window_input.isdigit() and int(window_input) > 1 else ROLLING_WINDOW
+
+    rolling = rolling_from_history(market, column, window)
+    correlation_matrix = display_rolling_correlation(rolling, market, column)
+
+    if input("\nFollow new snapshots as they arrive? (y/N): ").strip().lower() != "y":
+        if correlation_matrix is not None:
+            print("\nGenerating correlation heatmap...")
+            generate_heatmap(correlation_matrix)
+        return
+
+    # Each check only reads and applies the snapshots taken since the last one
+    try:
+        while True:
+            time.sleep(FOLLOW_INTERVAL)
+            updated_at = rolling.updated_at
+            rolling = rolling_from_history(market, column, window, start=updated_at, rolling=rolling)
+            if rolling.updated_at != updated_at:
+                display_rolling_correlation(rolling, market, column)
+    except KeyboardInterrupt:
+        pass
+
+def display_pairs_table(title, pairs):
+    """Displays correlated pairs of assets in a table."""
+    console = Console()
+    header_style = Style(color="white", bold=True)
+    table = Table(title=title, show_header=True, header_style=header_style)
+    first, second, value_column = pairs.columns
+    table.add_column(first, justify="left")
+    table.add_column(second, justify="left")
+    table.add_column(value_column, justify="right")
+    for i, (asset_a, asset_b, value) in enumerate(zip(pairs.iloc[:, 0].tolist(), pairs.iloc[:, 1].tolist(), pairs.iloc[:, 2].tolist())):
+        row_style = Style(color="white" if i % 2 == 0 else "grey82", bold=True)
+        table.add_row(str(asset_a), str(asset_b), f"{value:.2f}", style=row_style)
+    console.print(table)
+
+def generate_clustered_heatmap(engine):
+    """Generate a clustered, downsampled heatmap of a large correlation matrix."""
+    fig, ax = plt.subplots(figsize=(10, 8))
+    draw_clustered_heatmap(ax, engine)
+    fig.tight_layout()
+    plt.show()
+
+def run_universe_correlation():
+    """Large-universe mode: top correlated pairs and nearest neighbours across every company of a market."""
+    markets = list_markets()
+    if not markets:
+        print("No snapshot history found in the 'history' directory.")
+        return
+
+    print("\nMarkets with history:")
+    market = select_option("Select a market", markets)
+    print("\nReturns of:")
+    column = select_option("Select a column", ["Market Cap", "Price"])
+
+    history = load_history(market=market, columns=["scraped_at", "Name", column])
+    if history.empty:
+        print(f"No snapshots of '{market}' found.")
+        return
+    # Missing values carry forward, as in the rolling mode, so a gap is a zero return
+    returns = snapshot_values(history, column).ffill().pct_change(fill_method=None).iloc[1:]
+    if len(returns) < 2:
+        print(f"Not enough snapshots of '{market}' yet: {len(returns)} return(s).")
+        return
+
+    engine = CorrelationEngine.from_frame(returns).compute(top_k=TOP_PAIRS, neighbours=NEIGHBOURS)
+    print(f"\n{market}: {len(engine.assets):,} companies over {len(returns)} returns ({len(engine.dropped):,} without any change left out)")
+    display_pairs_table("Most positively correlated pairs", engine.top_positive)
+    display_pairs_table("Most negatively correlated pairs", engine.top_negative)
+
+    while True:
+        name = input("\nCompany to show nearest neighbours for (Enter to skip): ").strip()
+        if not name:
+            break
+        if name not in engine.assets:
+            print(f"'{name}' is not in the {market} history or never changed.")
+            continue
+        neighbours = engine.nearest(name)
+        display_pairs_table(f"Nearest neighbours of {name}", neighbours.assign(Asset=name)[["Asset", "Neighbour", "Correlation"]])
+
+    print("\nGenerating clustered correlation heatmap...")
+    generate_clustered_heatmap(engine)
+
 def main():
+    print("Correlation modes:")
+    mode = select_option("Select a mode", [
+        "Snapshot: correlate columns of one CSV",
+        "Rolling: correlate company returns across snapshots",
+        "Universe: top correlated pairs across every company in a market",
+    ])
+    if mode.startswith("Rolling"):
+        run_rolling_correlation()
+        return
+    if mode.startswith("Universe"):
+        run_universe_correlation()
+        return
+
     # Prompt the user to select a CSV file
     selected_file = select_csv_file()
     
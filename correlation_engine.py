@@ -0,0 +1,173 @@
+import numpy as np
+import pandas as pd
+import seaborn as sns
+
+# Correlations computed per block. Selecting from a block also needs int64 positions for each of
+# its entries, so a block costs about 20 bytes per correlation while it is being processed
+BLOCK_ELEMENTS = 1 << 20
+TOP_PAIRS = 20
+NEIGHBOURS = 5
+# Cells per side of the downsampled heatmap
+HEATMAP_CELLS = 100
+CLUSTER_ITERATIONS = 10
+
+def standardize(values):
+    """Scales each column of a (observations x assets) array to zero mean and unit norm, in float32.
+
+    The dot product of two scaled columns is then their correlation. Missing observations count as
+    the column's mean. Returns the scaled array and a mask of the columns that vary at all.
+    """
+    values = np.asarray(values, dtype=np.float32)
+    mean = np.nanmean(values, axis=0) if len(values) else np.zeros(values.shape[1], dtype=np.float32)
+    centered = np.nan_to_num(values - mean, nan=0.0)
+    norm = np.sqrt(np.einsum("ij,ij->j", centered, centered))
+    varies = np.isfinite(norm) & (norm > 0)
+    centered[:, varies] /= norm[varies]
+    centered[:, ~varies] = 0.0
+    return centered, varies
+
+def cluster_order(scaled, clusters=None, iterations=CLUSTER_ITERATIONS, seed=0):
+    """Orders assets so that correlated ones sit together, using spherical k-means on the scaled columns.
+
+    Clusters are laid out largest first, and assets within a cluster by closeness to its centre.
+    """
+    count = scaled.shape[1]
+    if count < 3:
+        return np.arange(count)
+    clusters = clusters or max(2, min(50, int(np.sqrt(count))))
+    rng = np.random.default_rng(seed)
+    centres = scaled[:, rng.choice(count, size=min(clusters, count), replace=False)].copy()
+    for _ in range(iterations):
+        labels = np.argmax(centres.T @ scaled, axis=0)
+        for cluster in range(centres.shape[1]):
+            members = scaled[:, labels == cluster]
+            if members.shape[1]:
+                centre = members.sum(axis=1)
+                centres[:, cluster] = centre / (np.linalg.norm(centre) or 1.0)
+    similarity = centres.T @ scaled
+    labels = np.argmax(similarity, axis=0)
+    sizes = np.bincount(labels, minlength=centres.shape[1])
+    # Sort by cluster size (largest first), then by similarity to the cluster centre
+    return np.lexsort((-similarity[labels, np.arange(count)], labels, -sizes[labels]))
+
+class CorrelationEngine:
+    """Correlations of a large universe of assets, computed blockwise in float32 without an N x N frame.
+
+    values is an (observations x assets) array such as returns per snapshot. One pass over the
+    matrix, a block of rows at a time, collects the top-k positive and negative pairs and each
+    asset's nearest neighbours. The full matrix is only kept when memmap_path is given, in which
+    case it is written to that file as float32 and can be opened again with np.memmap.
+    """
+
+    def __init__(self, values, assets, block_size=None):
+        scaled, varies = standardize(values)
+        # Assets that never move have no correlation with anything
+        self.scaled = np.ascontiguousarray(scaled[:, varies])
+        self.assets = pd.Index(assets)[varies]
+        self.dropped = pd.Index(assets)[~varies]
+        # Rows per block, so that a block holds about BLOCK_ELEMENTS correlations
+        self.block_size = block_size or max(16, BLOCK_ELEMENTS // max(len(self.assets), 1))
+        self.matrix = None
+
+    @classmethod
+    def from_frame(cls, frame, block_size=None):
+        """Builds an engine from a frame with one row per observation and one column per asset."""
+        return cls(frame.to_numpy(dtype="float32", na_value=np.nan), frame.columns, block_size)
+
+    def blocks(self):
+        """Yields (first row, block of rows of the correlation matrix) in order."""
+        for start in range(0, len(self.assets), self.block_size):
+            stop = min(start + self.block_size, len(self.assets))
+            yield start, self.scaled[:, start:stop].T @ self.scaled
+
+    def compute(self, top_k=TOP_PAIRS, neighbours=NEIGHBOURS, memmap_path=None):
+        """Runs one blockwise pass over the matrix and stores the top pairs and nearest neighbours."""
+        count = len(self.assets)
+        neighbours = min(neighbours, max(count - 1, 0))
+        if memmap_path is not None:
+            self.matrix = np.lib.format.open_memmap(memmap_path, mode="w+", dtype=np.float32, shape=(count, count))
+
+        best_high = (np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64))
+        best_low = (np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64))
+        self.neighbour_index = np.empty((count, neighbours), dtype=np.int32)
+        self.neighbour_correlation = np.empty((count, neighbours), dtype=np.float32)
+
+        for start, block in self.blocks():
+            if self.matrix is not None:
+                self.matrix[start:start + len(block)] = block
+            rows = np.arange(start, start + len(block))
+            np.clip(block, -1.0, 1.0, out=block)
+
+            # Nearest neighbours: the most positively correlated other assets of each row
+            block[np.arange(len(block)), rows] = -np.inf
+            if neighbours:
+                nearest = np.argpartition(block, -neighbours, axis=1)[:, -neighbours:]
+                nearest_values = np.take_along_axis(block, nearest, axis=1)
+                order = np.argsort(-nearest_values, axis=1)
+                self.neighbour_index[rows] = np.take_along_axis(nearest, order, axis=1)
+                self.neighbour_correlation[rows] = np.take_along_axis(nearest_values, order, axis=1)
+
+            # Each pair once: everything left of and on the diagonal is blanked out, and NaN is never selected
+            block[np.arange(count)[None, :] <= rows[:, None]] = np.nan
+            values = block.ravel()
+            best_high = merge_top(best_high, values, start * count, top_k, largest=True)
+            best_low = merge_top(best_low, values, start * count, top_k, largest=False)
+
+        if self.matrix is not None:
+            self.matrix.flush()
+        self.top_positive = self.pairs_frame(*best_high)
+        self.top_negative = self.pairs_frame(*best_low)
+        return self
+
+    def pairs_frame(self, values, flat_positions):
+        count = len(self.assets)
+        return pd.DataFrame({
+            "Asset A": self.assets[flat_positions // count],
+            "Asset B": self.assets[flat_positions % count],
+            "Correlation": values,
+        })
+
+    def nearest(self, asset):
+        """Returns an asset's nearest neighbours and their correlation with it."""
+        position = self.assets.get_loc(asset)
+        return pd.DataFrame({
+            "Neighbour": self.assets[self.neighbour_index[position]],
+            "Correlation": self.neighbour_correlation[position],
+        })
+
+    def downsampled(self, cells=HEATMAP_CELLS):
+        """Returns a cells x cells clustered view of the matrix, each cell the mean correlation of its two groups.
+
+        The mean correlation between two groups is the dot product of their mean scaled columns, so the
+        view is exact without computing the full matrix. Returns the view and the first asset of each group.
+        """
+        order = cluster_order(self.scaled)
+        groups = [group for group in np.array_split(order, min(cells, len(order))) if len(group)]
+        means = np.stack([self.scaled[:, group].mean(axis=1) for group in groups], axis=1)
+        view = np.clip(means.T @ means, -1.0, 1.0)
+        # Within a group the diagonal of ones is averaged in, so single-asset groups read 1 as usual
+        return view, self.assets[[group[0] for group in groups]]
+
+def merge_top(best, values, offset, top_k, largest):
+    """Keeps the top_k largest (or smallest) values seen so far, with their flat matrix positions.
+
+    values is a flattened block starting at flat position offset, with NaN for entries to skip.
+    """
+    take = min(top_k, len(values))
+    if not take:
+        return best
+    # NaN sorts last either way, so it is only picked when a block has fewer than top_k pairs
+    candidates = np.argpartition(-values if largest else values, take - 1)[:take]
+    candidates = candidates[~np.isnan(values[candidates])]
+    merged_values = np.concatenate([best[0], values[candidates]])
+    merged_positions = np.concatenate([best[1], candidates + offset])
+    order = np.argsort(-merged_values if largest else merged_values, kind="stable")[:top_k]
+    return merged_values[order], merged_positions[order]
+
+def draw_clustered_heatmap(ax, engine, cells=HEATMAP_CELLS, title="Clustered Correlation Heatmap", cbar_ax=None):
+    """Draws the clustered, downsampled view of a large correlation matrix onto an axes."""
+    view, labels = engine.downsampled(cells)
+    # Label every cell only while the labels can still be read
+    ticks = list(labels) if len(labels) <= 40 else False
+    sns.heatmap(view, ax=ax, cbar_ax=cbar_ax, cmap="coolwarm", center=0, vmin=-1, vmax=1, xticklabels=ticks, yticklabels=ticks)
+    ax.set_title(f"{title} ({len(engine.assets):,} assets, {len(view)} groups)")
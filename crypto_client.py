@@ -0,0 +1,171 @@
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import requests
+from requests.adapters import HTTPAdapter
+from disk_cache import DiskCache
+
+# CoinGecko market data, shared by bitcoin.py and volume.py
+API_URL = "https://api.coingecko.com/api/v3/coins/markets"
+PARAMS = {
+    "vs_currency": "usd",
+    "order": "market_cap_desc",
+    "sparkline": False,
+}
+# The largest page the endpoint serves. Every screen asks for whole pages and slices them, so they share responses
+PAGE_SIZE = 250
+HTTP_TIMEOUT = 15
+
+# CoinGecko refreshes market data about once a minute, so a response is reused for that long,
+# in memory within a process and on disk across the screens
+CACHE_TTL = 60
+CACHE_DIRECTORY = os.path.join(".cache", "coingecko")
+
+# Pages fetched at once when paging through every coin. The public API allows only a few calls per second
+MAX_CONCURRENCY = 4
+# Retries of a page answered with 429 Too Many Requests, waiting BACKOFF_SECONDS * 2 ** attempt
+# unless the response says how long to wait
+MAX_RETRIES = 5
+BACKOFF_SECONDS = 2.0
+
+class MarketClient:
+    """Fetches /coins/markets pages through one pooled session, with a short-TTL cache.
+
+    Identical requests that are already in flight are coalesced: the second caller waits for the
+    first one's response instead of making its own call. At most max_concurrency calls are made at
+    once, across all threads.
+    """
+
+    def __init__(self, api_url=API_URL, cache_ttl=CACHE_TTL, cache_directory=CACHE_DIRECTORY,
+                 max_concurrency=MAX_CONCURRENCY, max_retries=MAX_RETRIES, backoff_seconds=BACKOFF_SECONDS):
+        self.api_url = api_url
+        self.cache_ttl = cache_ttl
+        self.disk_cache = DiskCache(cache_directory, cache_ttl) if cache_directory else None
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.lock = threading.Lock()
+        # Request key -> (monotonic time it expires, coins), and request key -> Future of the call in flight
+        self.responses = {}
+        self.in_flight = {}
+        self.calls = 0
+
+    def cache_key(self, params):
+        return "&".join(f"{key}={params[key]}" for key in sorted(params))
+
+    def cached(self, key):
+        """Returns a fresh response from memory or disk, or None."""
+        response = self.responses.get(key)
+        if response is not None and time.monotonic() < response[0]:
+            return response[1]
+        if self.disk_cache is not None:
+            entry = self.disk_cache.entry(key)
+            if entry is not None:
+                age, coins = entry
+                # The entry keeps only what is left of its TTL, so it is never served older than cache_ttl
+                self.responses[key] = (time.monotonic() + self.cache_ttl - age, coins)
+                return coins
+        return None
+
+    def get(self, **params):
+        """Returns the coins of one request, from the cache, a call already in flight, or a new call."""
+        params = {**PARAMS, **params}
+        key = self.cache_key(params)
+        with self.lock:
+            coins = self.cached(key)
+            if coins is not None:
+                return coins
+            future = self.in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self.in_flight[key] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            coins = self.request(params)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            with self.lock:
+                self.responses[key] = (time.monotonic() + self.cache_ttl, coins)
+            if self.disk_cache is not None:
+                self.disk_cache.put(key, coins)
+            future.set_result(coins)
+            return coins
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+
+    def request(self, params):
+        """Makes one call within the concurrency limit, backing off and retrying on 429 responses."""
+        for attempt in range(self.max_retries + 1):
+            with self.slots:
+                self.calls += 1
+                response = self.session.get(self.api_url, params=params, timeout=HTTP_TIMEOUT)
+            if response.status_code != 429 or attempt == self.max_retries:
+                break
+            time.sleep(retry_delay(response, self.backoff_seconds * 2 ** attempt))
+        response.raise_for_status()
+        return response.json()
+
+    def page(self, page, per_page=PAGE_SIZE):
+        return self.get(page=page, per_page=per_page)
+
+    def top(self, count):
+        """Returns the count largest coins by market cap, read from whole pages so every screen shares them."""
+        coins = []
+        for page in range(1, -(-count // PAGE_SIZE) + 1):
+            coins.extend(self.page(page))
+            if len(coins) < page * PAGE_SIZE:
+                break
+        return coins[:count]
+
+    def all_coins(self, max_pages=None):
+        """Pages through the whole coin universe, max_concurrency pages at a time, and returns every coin in order.
+
+        The endpoint does not report how many pages there are, so new pages are requested as earlier
+        ones come back full, and paging stops at the first short page.
+        """
+        pages = {}
+        last_page = max_pages
+        next_page = 1
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            pending = {}
+            while True:
+                while len(pending) < self.max_concurrency and (last_page is None or next_page <= last_page):
+                    pending[pool.submit(self.page, next_page)] = next_page
+                    next_page += 1
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    page = pending.pop(future)
+                    pages[page] = future.result()
+                    if len(pages[page]) < PAGE_SIZE:
+                        last_page = page if last_page is None else min(last_page, page)
+        return [coin for page in sorted(pages) if page <= (last_page or page) for coin in pages[page]]
+
+def retry_delay(response, default):
+    """Seconds to wait before retrying a 429 response, from its Retry-After header when it has one."""
+    try:
+        return max(0.0, float(response.headers.get("Retry-After", default)))
+    except ValueError:
+        return default
+
+# One client per process, so every screen in it shares the same session and cache
+client = None
+
+def get_client():
+    """Returns this process's shared MarketClient."""
+    global client
+    if client is None:
+        client = MarketClient()
+    return client
@@ -0,0 +1,320 @@
+import argparse
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from datetime import datetime
+import pyarrow as pa
+from rich.columns import Columns
+from rich.console import Console, Group
+from rich.live import Live
+from rich.measure import Measurement
+from rich.panel import Panel
+from rich.segment import Segment
+from rich.style import Style
+from rich.table import Table
+from rich.text import Text
+from history import market_from_filename
+from market_data import MARKET_DIRECTORY, load_market, market_paths
+from market_values import format_market_cap, format_price
+from screener import ALL_MARKETS, select_csv_file
+from table_view import HEADER_STYLE, gradient_styles
+
+# Rows shown for a single market, and per market when several are open side by side
+SINGLE_MARKET_ROWS = 50
+MULTI_MARKET_ROWS = 10
+
+# How long to wait for the rest of a write (the CSV, then its typed copy) before reloading
+DEBOUNCE_SECONDS = 0.3
+# Used when inotify is not available, e.g. on macOS
+POLL_INTERVAL = 2.0
+
+# Highlights for rows that changed since the previous snapshot of their market
+CHANGE_STYLES = {
+    "new": Style(color="black", bgcolor="rgb(255,215,0)", bold=True),
+    "up": Style(color="rgb(0,200,83)", bold=True),
+    "down": Style(color="rgb(255,23,68)", bold=True),
+}
+MOVE_STYLES = {"up": Style(color="rgb(0,200,83)"), "down": Style(color="rgb(255,23,68)")}
+
+# inotify events for a file finished writing, or renamed into place (how typed copies are written)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+EVENT_HEADER = struct.Struct("iIII")
+
+class DirectoryWatcher:
+    """Reports which files in a directory were written, through inotify where available and polling otherwise."""
+
+    def __init__(self, directory, extensions=(".csv", ".arrow")):
+        self.directory = directory
+        self.extensions = extensions
+        self.fd = None
+        self.mtimes = {}
+
+        libc_name = ctypes.util.find_library("c")
+        libc = ctypes.CDLL(libc_name, use_errno=True) if libc_name else None
+        if libc is not None and hasattr(libc, "inotify_init1"):
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd >= 0 and libc.inotify_add_watch(fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO) >= 0:
+                self.fd = fd
+            elif fd >= 0:
+                os.close(fd)
+        if self.fd is None:
+            self.mtimes = self.scan()
+
+    @property
+    def mode(self):
+        return "inotify" if self.fd is not None else "polling"
+
+    def scan(self):
+        """Returns the modification time of every watched file."""
+        mtimes = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(self.extensions):
+                    try:
+                        mtimes[entry.name] = entry.stat().st_mtime_ns
+                    except FileNotFoundError:
+                        continue
+        return mtimes
+
+    def read_events(self, timeout):
+        """Returns the watched filenames written within timeout seconds (None waits indefinitely)."""
+        if self.fd is not None:
+            ready, _, _ = select.select([self.fd], [], [], timeout)
+            if not ready:
+                return set()
+            changed = set()
+            while True:
+                try:
+                    buffer = os.read(self.fd, 64 * 1024)
+                except BlockingIOError:
+                    return changed
+                offset = 0
+                while offset < len(buffer):
+                    _, _, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+                    name = buffer[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0").decode()
+                    offset += EVENT_HEADER.size + length
+                    if name.endswith(self.extensions):
+                        changed.add(name)
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            mtimes = self.scan()
+            changed = {name for name, mtime in mtimes.items() if self.mtimes.get(name) != mtime}
+            self.mtimes = mtimes
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+            time.sleep(POLL_INTERVAL if deadline is None else max(0.0, min(POLL_INTERVAL, deadline - time.monotonic())))
+
+    def wait(self):
+        """Blocks until files are written, then keeps collecting until writes go quiet, and returns their names."""
+        changed = self.read_events(None)
+        while True:
+            more = self.read_events(DEBOUNCE_SECONDS)
+            if not more:
+                return changed
+            changed |= more
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+class CachedRenderable:
+    """Wraps a renderable and replays its rendered lines while the width stays the same.
+
+    Rich re-renders everything inside Live on each refresh, so a market panel that did not change
+    would otherwise lay out its whole table again every time another market updates.
+    """
+
+    def __init__(self, renderable):
+        self.renderable = renderable
+        self.lines = {}
+        self.measurements = {}
+
+    def __rich_console__(self, console, options):
+        key = (options.max_width, options.height)
+        if key not in self.lines:
+            self.lines[key] = console.render_lines(self.renderable, options, pad=False)
+        new_line = Segment.line()
+        for line in self.lines[key]:
+            yield from line
+            yield new_line
+
+    def __rich_measure__(self, console, options):
+        if options.max_width not in self.measurements:
+            self.measurements[options.max_width] = Measurement.get(console, options, self.renderable)
+        return self.measurements[options.max_width]
+
+def snapshot_rows(frame, limit):
+    """Returns the top rows of a market as tuples with None for missing values, reading whole columns instead of iterating the frame."""
+    top = frame.head(limit)
+    columns = [top[column].astype(object) for column in ("Rank", "Name", "Market Cap", "Price", "Country")]
+    # None rather than NaN, so an unchanged snapshot compares equal to the displayed one
+    return list(zip(*(column.where(column.notna(), None).tolist() for column in columns)))
+
+def diff_rows(previous, current):
+    """Classifies each current row against the previous snapshot by company.
+
+    Returns a list parallel to current of (change, rank move), where change is None, 'new', 'up'
+    or 'down' (market cap), and rank move is how many places the company climbed.
+    """
+    if previous is None:
+        return [(None, 0)] * len(current)
+    before = {(name, country): (rank, market_cap) for rank, name, market_cap, _, country in previous}
+    changes = []
+    for rank, name, market_cap, _, country in current:
+        if (name, country) not in before:
+            changes.append(("new", 0))
+            continue
+        previous_rank, previous_market_cap = before[(name, country)]
+        change = None
+        if market_cap is not None and previous_market_cap is not None and market_cap != previous_market_cap:
+            change = "up" if market_cap > previous_market_cap else "down"
+        move = int(previous_rank) - int(rank) if rank is not None and previous_rank is not None else 0
+        changes.append((change, move))
+    return changes
+
+class MarketView:
+    """The displayed state of one market: its last snapshot, the diff against the one before, and its panel."""
+
+    def __init__(self, market, path, limit):
+        self.market = market
+        self.path = path
+        self.limit = limit
+        self.rows = None
+        self.changes = []
+        # Formatted cells per (row, change), kept while the row is on screen so unchanged rows are not reformatted
+        self.cells = {}
+        self.panel = None
+        self.updated_at = None
+
+    def reload(self):
+        """Loads the market again and diffs it against what is displayed.
+
+        Returns the number of rows that changed, or None when the snapshot is identical or could not be read.
+        """
+        try:
+            rows = snapshot_rows(load_market(self.path), self.limit)
+        except (OSError, ValueError, pa.ArrowInvalid):
+            # Caught halfway through a write; the next event brings the finished file
+            return None
+        if rows == self.rows:
+            return None
+
+        self.changes = diff_rows(self.rows, rows)
+        self.rows = rows
+        self.updated_at = datetime.now()
+        self.panel = None
+        return sum(1 for change, move in self.changes if change or move)
+
+    def row_cells(self, row, change, move):
+        """Returns the formatted cells of one row, reusing them when the row and its change are unchanged."""
+        key = (row, change, move)
+        cells = self.cells.get(key)
+        if cells is None:
+            rank, name, market_cap, price, country = row
+            rank_cell = Text("" if rank is None else str(rank))
+            if move:
+                rank_cell.append(f" {'▲' if move > 0 else '▼'}{abs(move)}", style=MOVE_STYLES["up" if move > 0 else "down"])
+            cells = (rank_cell, Text(name or ""), Text(format_market_cap(market_cap)), Text(format_price(price)), Text(country or ""))
+        return key, cells
+
+    def render(self):
+        """Returns the market's panel, rebuilding it only after the snapshot changed."""
+        if self.panel is not None:
+            return self.panel
+
+        table = Table(show_header=True, header_style=HEADER_STYLE, expand=False)
+        table.add_column("Rank", justify="center")
+        table.add_column("Name", justify="left", max_width=28, no_wrap=True)
+        table.add_column("Market Cap", justify="right")
+        table.add_column("Price", justify="right")
+        table.add_column("Country", justify="center")
+
+        styles = gradient_styles(len(self.rows or []))
+        cells = {}
+        for idx, (row, (change, move)) in enumerate(zip(self.rows or [], self.changes)):
+            key, row_cells = self.row_cells(row, change, move)
+            cells[key] = row_cells
+            table.add_row(*row_cells, style=CHANGE_STYLES.get(change, styles[idx]))
+        # Rows that scrolled off or changed are dropped from the cache
+        self.cells = cells
+
+        updated = self.updated_at.strftime("%H:%M:%S") if self.updated_at else "-"
+        self.panel = CachedRenderable(Panel(table, title=f"{self.market} ({updated})", border_style="bold white", expand=False))
+        return self.panel
+
+def select_markets(markets, directory):
+    """Maps the requested markets (all of them by default) to their CSVs."""
+    return market_paths(markets or None, directory)
+
+def render_dashboard(views, status):
+    """Composes every market panel with a status line."""
+    panels = [view.render() for view in views.values()]
+    body = panels[0] if len(panels) == 1 else Columns(panels)
+    return Group(Text(status, style="dim"), body)
+
+def run_dashboard(markets=None, directory=MARKET_DIRECTORY, console=None):
+    """Shows a live dashboard of one or more markets, refreshing a market's panel whenever its files change.
+
+    The screen is only redrawn after a write, and only the markets whose files changed are reloaded,
+    diffed and rendered again. Rows that are new, moved rank or changed market cap are highlighted
+    until the next snapshot of their market.
+    """
+    console = console or Console()
+    paths = select_markets(markets, directory)
+    limit = SINGLE_MARKET_ROWS if len(paths) == 1 else MULTI_MARKET_ROWS
+    views = {market: MarketView(market, path, limit) for market, path in paths.items()}
+    for view in views.values():
+        view.reload()
+
+    watcher = DirectoryWatcher(directory)
+    status = f"Watching '{directory}' ({watcher.mode}), {len(views)} market(s). Ctrl+C to exit."
+    try:
+        with Live(render_dashboard(views, status), console=console, auto_refresh=False) as live:
+            while True:
+                changed_markets = {market_from_filename(os.path.splitext(name)[0] + ".csv") for name in watcher.wait()}
+                updates = {}
+                for market in changed_markets & views.keys():
+                    changed_rows = views[market].reload()
+                    if changed_rows is not None:
+                        updates[market] = changed_rows
+                if not updates:
+                    continue
+                summary = ", ".join(f"{market} {rows} row(s)" for market, rows in sorted(updates.items()))
+                status = f"Watching '{directory}' ({watcher.mode}). {datetime.now():%H:%M:%S} updated: {summary}. Ctrl+C to exit."
+                live.update(render_dashboard(views, status), refresh=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Live dashboard of scraped markets that updates as the scraper writes them.")
+    parser.add_argument("markets", nargs="*", help="markets to show, e.g. usa china (default: choose one, or 'all')")
+    parser.add_argument("--directory", default=MARKET_DIRECTORY)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    markets = arguments.markets
+    if not markets:
+        selected_file = select_csv_file()
+        if not selected_file:
+            print("No file selected. Exiting.")
+            return
+        markets = [] if selected_file == ALL_MARKETS else [market_from_filename(os.path.basename(selected_file))]
+    elif markets == [ALL_MARKETS]:
+        markets = []
+
+    try:
+        run_dashboard(markets, arguments.directory)
+    except FileNotFoundError as e:
+        print(e)
+
+if __name__ == "__main__":
+    main()
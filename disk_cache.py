@@ -0,0 +1,43 @@
+import json
+import os
+import threading
+import time
+
+class DiskCache:
+    """A JSON file per key with the time it was stored, considered fresh for ttl seconds."""
+
+    def __init__(self, directory, ttl):
+        self.directory = directory
+        self.ttl = ttl
+
+    def path(self, key):
+        safe_key = "".join(char if char.isalnum() or char in "-_." else "_" for char in key)
+        return os.path.join(self.directory, f"{safe_key}.json")
+
+    def entry(self, key):
+        """Returns (seconds since the value was stored, value), or None when it is missing or expired."""
+        try:
+            with open(self.path(key), encoding="utf-8") as cache_file:
+                entry = json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+        age = time.time() - entry["stored_at"]
+        if age > self.ttl:
+            return None
+        return age, entry["value"]
+
+    def get(self, key):
+        """Returns the cached value, or None when it is missing or expired."""
+        entry = self.entry(key)
+        return None if entry is None else entry[1]
+
+    def put(self, key, value):
+        write_json(self.path(key), {"stored_at": time.time(), "value": value})
+
+def write_json(path, value):
+    """Writes a JSON file atomically, so an interrupted run never leaves half a cache entry."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as json_file:
+        json.dump(value, json_file)
+    os.replace(temporary_path, path)
@@ -0,0 +1,112 @@
+import logging
+import time
+from selenium.common.exceptions import WebDriverException
+
+try:
+    import psutil
+except ImportError:  # psutil is optional, without it drivers are only recycled by page count
+    psutil = None
+
+logger = logging.getLogger("scraper.driver")
+
+# Recycle a driver after this many pages, or once Chrome's processes use more than this much memory
+MAX_PAGES_PER_DRIVER = 200
+MAX_DRIVER_RSS_MB = 1024
+# How often, in pages, to measure Chrome's memory
+RSS_CHECK_INTERVAL = 10
+
+class ManagedDriver:
+    """Keeps one Chrome driver warm across pages and cycles, restarting it when it dies or grows too large.
+
+    The driver is only started the first time a page needs it. Every start, recycle and memory
+    measurement is logged, so startup cost and memory growth over a long run show up in the logs.
+    """
+
+    def __init__(self, create_driver, name, max_pages=MAX_PAGES_PER_DRIVER, max_rss_mb=MAX_DRIVER_RSS_MB):
+        self.create_driver = create_driver
+        self.name = name
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.driver = None
+        self.pages = 0
+        self.stats = {"starts": 0, "restarts": 0, "recycles": 0, "startup_time": 0.0, "rss_mb": None}
+
+    def start(self):
+        """Starts a fresh Chrome driver and logs how long it took."""
+        start_time = time.time()
+        self.driver = self.create_driver()
+        elapsed = time.time() - start_time
+        self.pages = 0
+        self.stats["starts"] += 1
+        self.stats["startup_time"] += elapsed
+        logger.info("Chrome started", extra={"fields": {
+            "driver": self.name, "startup_ms": round(elapsed * 1000), "start": self.stats["starts"],
+        }})
+
+    def quit(self):
+        """Quits the driver, ignoring errors from a session that is already gone."""
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except WebDriverException:
+                pass
+            self.driver = None
+
+    def restart(self, reason):
+        """Replaces a dead or unhealthy driver with a fresh one."""
+        logger.warning("Restarting Chrome", extra={"fields": {"driver": self.name, "reason": reason}})
+        self.stats["restarts"] += 1
+        self.quit()
+        self.start()
+
+    def recycle(self, reason):
+        """Replaces a healthy driver that has served enough pages or grown too large."""
+        logger.info("Recycling Chrome", extra={"fields": {"driver": self.name, "pages": self.pages, "reason": reason}})
+        self.stats["recycles"] += 1
+        self.quit()
+        self.start()
+
+    def is_healthy(self):
+        """Checks that the browser session still answers a trivial command."""
+        try:
+            self.driver.execute_script("return document.readyState")
+            return True
+        except WebDriverException:
+            return False
+
+    def get(self):
+        """Returns a health-checked driver, starting or restarting Chrome as needed."""
+        if self.driver is None:
+            self.start()
+        elif not self.is_healthy():
+            self.restart("health check failed")
+        return self.driver
+
+    def chrome_rss_mb(self):
+        """Returns the memory used by chromedriver and every Chrome process it started, or None."""
+        if psutil is None or self.driver is None:
+            return None
+        try:
+            process = psutil.Process(self.driver.service.process.pid)
+            processes = [process] + process.children(recursive=True)
+            return sum(p.memory_info().rss for p in processes) / 1e6
+        except (psutil.Error, AttributeError):
+            return None
+
+    def page_done(self):
+        """Counts a page served by the driver and recycles it once it has done enough work."""
+        if self.driver is None:
+            return
+        self.pages += 1
+
+        if self.pages % RSS_CHECK_INTERVAL == 0:
+            rss_mb = self.chrome_rss_mb()
+            if rss_mb is not None:
+                self.stats["rss_mb"] = rss_mb
+                logger.info("Chrome memory", extra={"fields": {"driver": self.name, "rss_mb": round(rss_mb), "pages": self.pages}})
+                if rss_mb > self.max_rss_mb:
+                    self.recycle(f"RSS {rss_mb:.0f} MB over {self.max_rss_mb} MB")
+                    return
+
+        if self.pages >= self.max_pages:
+            self.recycle(f"page limit of {self.max_pages}")
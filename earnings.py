@@ -1,13 +1,256 @@
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
 from rich.console import Console
 from rich.table import Table
 from rich.style import Style
 from rich.text import Text
 from rich.panel import Panel
+from disk_cache import DiskCache, write_json
 
 # Alpha Vantage free API endpoint - Requires a valid API key (get it from https://www.alphavantage.co)
 BASE_URL = "https://www.alphavantage.co/query"
 API_KEY = "YOUR_API_KEY"  # Replace with your actual Alpha Vantage API key
+HTTP_TIMEOUT = 15
+
+# Free-tier quota. Calls are spaced evenly, so no rolling minute ever holds more than CALLS_PER_MINUTE
+CALLS_PER_MINUTE = 5
+CALLS_PER_DAY = 25
+
+# Responses are cached per symbol. Quarterly earnings change a few times a year, and a company's symbol almost never does
+CACHE_DIRECTORY = os.path.join(".cache", "earnings")
+EARNINGS_TTL = 7 * 24 * 3600
+SYMBOL_TTL = 90 * 24 * 3600
+# How long to wait after the API says the per-minute limit was hit, before trying that call again
+THROTTLE_BACKOFF = 60
+
+WATCHLIST_FILE = "watchlist.txt"
+MARKET_DIRECTORY = "output"
+
+class QuotaExhausted(Exception):
+    """The API's daily quota is used up; the remaining symbols have to wait for a later run."""
+
+class ApiError(Exception):
+    """The API answered with a message instead of data, e.g. for a bad key or an unknown symbol."""
+
+class TokenBucket:
+    """Hands out calls at a steady rate, blocking until the next one is allowed.
+
+    capacity is how many calls may go out back to back after an idle period. It defaults to 1,
+    which keeps calls evenly spaced.
+    """
+
+    def __init__(self, calls_per_minute=CALLS_PER_MINUTE, capacity=1):
+        self.rate = calls_per_minute / 60
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Waits for a token and takes it."""
+        with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                time.sleep((1 - self.tokens) / self.rate)
+
+class DailyQuota:
+    """Counts the calls made per UTC day in a small file, so the daily quota holds across runs."""
+
+    def __init__(self, path, calls_per_day=CALLS_PER_DAY):
+        self.path = path
+        self.calls_per_day = calls_per_day
+        self.lock = threading.Lock()
+
+    def today(self):
+        return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+    def used(self):
+        try:
+            with open(self.path, encoding="utf-8") as quota_file:
+                counts = json.load(quota_file)
+        except (OSError, ValueError):
+            return 0
+        return counts.get(self.today(), 0)
+
+    def take(self):
+        """Counts one call, or raises QuotaExhausted when today's calls are used up."""
+        with self.lock:
+            used = self.used()
+            if used >= self.calls_per_day:
+                raise QuotaExhausted(f"All {self.calls_per_day} calls for {self.today()} are used")
+            write_json(self.path, {self.today(): used + 1})
+
+    def exhaust(self):
+        """Records that the API reported the daily quota as used up, whatever the local count says."""
+        with self.lock:
+            write_json(self.path, {self.today(): self.calls_per_day})
+
+def earnings_rows(symbol, data):
+    """Turns an EARNINGS response into [company, report date, EPS estimate, EPS actual] rows."""
+    earnings_list = []
+    for report in data.get("quarterlyEarnings", []):
+        report_date = report.get("fiscalDateEnding", "N/A")
+        eps_estimate = report.get("estimatedEPS", "N/A")
+        eps_actual = report.get("reportedEPS", "N/A")
+        earnings_list.append([symbol, report_date, eps_estimate, eps_actual])
+    return earnings_list
+
+class EarningsClient:
+    """Fetches earnings through one pooled session, within the API quota, and caches them on disk by symbol."""
+
+    def __init__(self, api_key=API_KEY, base_url=BASE_URL, calls_per_minute=CALLS_PER_MINUTE, calls_per_day=CALLS_PER_DAY,
+                 cache_directory=CACHE_DIRECTORY, throttle_backoff=THROTTLE_BACKOFF):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self.bucket = TokenBucket(calls_per_minute)
+        self.quota = DailyQuota(os.path.join(cache_directory, "quota.json"), calls_per_day)
+        self.earnings_cache = DiskCache(os.path.join(cache_directory, "earnings"), EARNINGS_TTL)
+        self.symbol_cache = DiskCache(os.path.join(cache_directory, "symbols"), SYMBOL_TTL)
+        self.throttle_backoff = throttle_backoff
+        self.calls = 0
+
+    def request(self, params):
+        """Makes one API call within the quota and returns its JSON.
+
+        The API answers problems with HTTP 200 and a message instead of data. A 'Note' (the per-minute
+        throttle) is waited out and retried once. An 'Information' about the daily limit raises
+        QuotaExhausted, and any other 'Information' or an 'Error Message' raises ApiError.
+        """
+        for attempt in range(2):
+            self.quota.take()
+            self.bucket.acquire()
+            self.calls += 1
+            response = self.session.get(self.base_url, params={**params, "apikey": self.api_key}, timeout=HTTP_TIMEOUT)
+            response.raise_for_status()
+            data = response.json()
+
+            if "Error Message" in data:
+                raise ApiError(data["Error Message"])
+            if "Information" in data:
+                # Sent once the daily limit is reached, and for keys that cannot make this call at all
+                if "per day" not in data["Information"]:
+                    raise ApiError(data["Information"])
+                self.quota.exhaust()
+                raise QuotaExhausted(data["Information"])
+            if "Note" not in data:
+                return data
+            if attempt == 1:
+                raise QuotaExhausted(data["Note"])
+            time.sleep(self.throttle_backoff)
+
+    def cached_earnings(self, symbol):
+        return self.earnings_cache.get(symbol.upper())
+
+    def earnings(self, symbol):
+        """Returns a symbol's earnings rows, from the cache while it is fresh.
+
+        Only a reply with quarterly earnings is cached, so an error is asked for again on the next run
+        instead of leaving the symbol empty for EARNINGS_TTL.
+        """
+        symbol = symbol.upper()
+        rows = self.earnings_cache.get(symbol)
+        if rows is None:
+            data = self.request({"function": "EARNINGS", "symbol": symbol})
+            if "quarterlyEarnings" not in data:
+                raise ApiError(f"no quarterly earnings in the reply for {symbol}")
+            rows = earnings_rows(symbol, data)
+            self.earnings_cache.put(symbol, rows)
+        return rows
+
+    def resolve_symbol(self, name):
+        """Looks up the best-matching symbol for a company name, from the cache while it is fresh."""
+        cached = self.symbol_cache.get(name)
+        if cached is not None:
+            return cached or None
+        data = self.request({"function": "SYMBOL_SEARCH", "keywords": name})
+        if "bestMatches" not in data:
+            raise ApiError(f"no symbol matches in the reply for {name}")
+        matches = data["bestMatches"]
+        symbol = matches[0].get("1. symbol", "") if matches else ""
+        self.symbol_cache.put(name, symbol)
+        return symbol or None
+
+def fetch_batch(client, symbols):
+    """Fetches earnings for every symbol, calling the API only for those missing from the cache or expired.
+
+    Returns (rows per symbol, summary counts). When the daily quota runs out, the remaining symbols
+    are reported as deferred and picked up by the next run.
+    """
+    results = {}
+    summary = {"cached": 0, "fetched": 0, "failed": 0, "deferred": 0}
+    symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+    for position, symbol in enumerate(symbols):
+        cached = client.cached_earnings(symbol)
+        if cached is not None:
+            results[symbol] = cached
+            summary["cached"] += 1
+            continue
+        try:
+            results[symbol] = client.earnings(symbol)
+            summary["fetched"] += 1
+        except QuotaExhausted as e:
+            remaining = [s for s in symbols[position:] if client.cached_earnings(s) is None]
+            summary["deferred"] += len(remaining)
+            # Symbols after this one may still be cached
+            for s in symbols[position:]:
+                cached = client.cached_earnings(s)
+                if cached is not None:
+                    results[s] = cached
+                    summary["cached"] += 1
+            print(f"Quota reached: {e}")
+            break
+        except (requests.RequestException, ValueError, ApiError) as e:
+            print(f"Failed to fetch {symbol}: {e}")
+            summary["failed"] += 1
+    return results, summary
+
+def read_watchlist(path):
+    """Reads symbols from a file, one per line or comma-separated, ignoring blank lines and # comments."""
+    symbols = []
+    with open(path, encoding="utf-8") as watchlist_file:
+        for line in watchlist_file:
+            line = line.split("#", 1)[0]
+            symbols.extend(part.strip() for part in line.split(",") if part.strip())
+    return symbols
+
+def market_symbols(client, market, top=None, directory=MARKET_DIRECTORY):
+    """Resolves the companies of a scraped market to symbols, largest first.
+
+    The scraped CSVs hold company names only, so each name costs one symbol search, cached for SYMBOL_TTL.
+    """
+    names = pd.read_csv(os.path.join(directory, f"{market}_market.csv"), usecols=["Name"], dtype=str)["Name"].dropna().tolist()
+    symbols = []
+    for name in names[:top]:
+        try:
+            symbol = client.resolve_symbol(name)
+        except QuotaExhausted as e:
+            print(f"Quota reached while resolving symbols: {e}")
+            break
+        except (requests.RequestException, ValueError, ApiError) as e:
+            print(f"Failed to look up {name}: {e}")
+            continue
+        if symbol:
+            symbols.append(symbol)
+    return symbols
+
+def latest_rows(results):
+    """Keeps each symbol's most recent quarter, for a one-row-per-company table."""
+    return [rows[0] for rows in results.values() if rows]
 
 def fetch_earnings_data(symbol="AAPL"):
     """Fetches earnings data for a specific symbol from the Alpha Vantage API."""
@@ -18,22 +261,10 @@ def fetch_earnings_data(symbol="AAPL"):
     }
     
     try:
-        response = requests.get(BASE_URL, params=params)
+        response = requests.get(BASE_URL, params=params, timeout=HTTP_TIMEOUT)
         if response.status_code == 200:
-            data = response.json()
-            earnings_list = []
-            
             # Parse the quarterly earnings data
-            if "quarterlyEarnings" in data:
-                for report in data["quarterlyEarnings"]:
-                    company = symbol
-                    report_date = report.get("fiscalDateEnding", "N/A")
-                    eps_estimate = report.get("estimatedEPS", "N/A")
-                    eps_actual = report.get("reportedEPS", "N/A")
-                    
-                    earnings_list.append([company, report_date, eps_estimate, eps_actual])
-            
-            return earnings_list
+            return earnings_rows(symbol, response.json())
         else:
             print("Failed to fetch data. Please check the API.")
             return []
@@ -101,15 +332,39 @@ def display_earnings_table(earnings_data):
     # Display the table
     console.print(table)
 
-def main():
-    # Fetch data for a specific company (e.g., Apple Inc.)
-    earnings_data = fetch_earnings_data(symbol="AAPL")
-    
-    if earnings_data:
-        # Display the fetched data in a table
-        display_earnings_table(earnings_data)
-    else:
-        print("No data found.")
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Fetches quarterly earnings within the Alpha Vantage quota, caching them by symbol.")
+    parser.add_argument("symbols", nargs="*", help="symbols to fetch, e.g. AAPL MSFT")
+    parser.add_argument("--watchlist", help=f"file of symbols, one per line (e.g. {WATCHLIST_FILE})")
+    parser.add_argument("--market", help="every company of a scraped market in output/, e.g. usa")
+    parser.add_argument("--top", type=int, help="only the largest N companies of --market")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    if not (arguments.symbols or arguments.watchlist or arguments.market):
+        # Fetch data for a specific company (e.g., Apple Inc.)
+        earnings_data = fetch_earnings_data(symbol="AAPL")
+
+        if earnings_data:
+            # Display the fetched data in a table
+            display_earnings_table(earnings_data)
+        else:
+            print("No data found.")
+        return
+
+    client = EarningsClient()
+    symbols = list(arguments.symbols)
+    if arguments.watchlist:
+        symbols += read_watchlist(arguments.watchlist)
+    if arguments.market:
+        symbols += market_symbols(client, arguments.market, arguments.top)
+
+    results, summary = fetch_batch(client, symbols)
+    if results:
+        display_earnings_table(latest_rows(results) or [["-", "N/A", "N/A", "N/A"]])
+    print(f"{len(results)} symbol(s): {summary['cached']} from cache, {summary['fetched']} fetched, "
+          f"{summary['failed']} failed, {summary['deferred']} deferred to a later run ({client.calls} API calls)")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,191 @@
+import json
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+HISTORY_DIRECTORY = "history"
+
+# Compacted day files are sorted by company so row-group statistics can skip other companies
+COMPACTED_FILENAME = "compacted.parquet"
+COMPACTED_ROW_GROUP_SIZE = 16384
+COMPRESSION = "zstd"
+
+# Schema metadata key of a compacted file listing the snapshot files it already holds
+COMPACTED_SNAPSHOTS_KEY = b"compacted_snapshots"
+
+PARTITIONING = ds.partitioning(pa.schema([("market", pa.string()), ("date", pa.string())]), flavor="hive")
+
+logger = logging.getLogger("scraper.history")
+
+# Closed days are compacted one at a time in the background, off the scrape workers' write path
+compaction_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-compaction")
+
+def market_from_filename(filename):
+    """Turns an output filename like 'usa_market.csv' into its market name 'usa'."""
+    return filename[:-len(".csv")].removesuffix("_market")
+
+def partition_path(market, date, directory=HISTORY_DIRECTORY):
+    """Returns the directory holding one market's snapshots for one UTC date."""
+    return os.path.join(directory, f"market={market}", f"date={date}")
+
+def snapshot_table(df, scraped_at):
+    """Converts a scraped DataFrame into an Arrow table with a UTC scrape timestamp column."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    timestamps = pa.array([scraped_at] * len(df), type=pa.timestamp("us", tz="UTC"))
+    return table.add_column(0, "scraped_at", timestamps)
+
+def append_snapshot(market, df, scraped_at=None, directory=HISTORY_DIRECTORY):
+    """Appends one scrape of a market as a new immutable Parquet file in its date partition."""
+    scraped_at = scraped_at or datetime.now(timezone.utc)
+    date = scraped_at.strftime("%Y-%m-%d")
+    path = partition_path(market, date, directory)
+
+    if not os.path.isdir(path):
+        os.makedirs(path, exist_ok=True)
+        # A new day has started for this market, so the earlier days are closed and can be compacted
+        for previous_date in list_dates(market, directory):
+            if previous_date != date:
+                compaction_executor.submit(compact_in_background, market, previous_date, directory)
+
+    filename = f"{scraped_at.strftime('%H%M%S%f')}-{uuid.uuid4().hex[:8]}.parquet"
+    pq.write_table(snapshot_table(df, scraped_at), os.path.join(path, filename), compression=COMPRESSION)
+
+    # A scrape that started before midnight can land after its day was compacted, so merge it in as well
+    if os.path.exists(os.path.join(path, COMPACTED_FILENAME)):
+        compaction_executor.submit(compact_in_background, market, date, directory)
+    return os.path.join(path, filename)
+
+def write_partition(market, date, table, directory=HISTORY_DIRECTORY, snapshots=()):
+    """Writes a whole day of snapshots as one file sorted by company and time.
+
+    snapshots names the snapshot files the day was merged from. They are recorded in the file, so an
+    interrupted compaction knows which leftover snapshot files it already holds.
+    """
+    path = partition_path(market, date, directory)
+    os.makedirs(path, exist_ok=True)
+    table = table.sort_by([("Name", "ascending"), ("scraped_at", "ascending")])
+    metadata = {**(table.schema.metadata or {}), COMPACTED_SNAPSHOTS_KEY: json.dumps(sorted(snapshots)).encode()}
+    table = table.replace_schema_metadata(metadata)
+
+    # Write next to the final file and rename, so readers never see a half-written day
+    temporary_file = os.path.join(path, f".{COMPACTED_FILENAME}.tmp")
+    pq.write_table(table, temporary_file, compression=COMPRESSION, row_group_size=COMPACTED_ROW_GROUP_SIZE)
+    os.replace(temporary_file, os.path.join(path, COMPACTED_FILENAME))
+
+def compacted_snapshots(compacted_file):
+    """Returns the names of the snapshot files a compacted file was merged from."""
+    metadata = pq.read_schema(compacted_file).metadata or {}
+    return set(json.loads(metadata.get(COMPACTED_SNAPSHOTS_KEY, b"[]")))
+
+def compact_partition(market, date, directory=HISTORY_DIRECTORY):
+    """Merges a closed day's per-snapshot files into a single compacted file.
+
+    The compacted file is renamed into place before any snapshot file is deleted. Running it again
+    after a crash in between only deletes the snapshots the compacted file already holds, so no row
+    is ever counted twice.
+    """
+    path = partition_path(market, date, directory)
+    snapshot_names = sorted(f for f in os.listdir(path) if f.endswith(".parquet") and f != COMPACTED_FILENAME)
+    if not snapshot_names:
+        return
+
+    compacted_file = os.path.join(path, COMPACTED_FILENAME)
+    merged = compacted_snapshots(compacted_file) if os.path.exists(compacted_file) else set()
+    new_names = [name for name in snapshot_names if name not in merged]
+    if new_names:
+        tables = [pq.read_table(os.path.join(path, name)) for name in new_names]
+        if os.path.exists(compacted_file):
+            tables.append(pq.read_table(compacted_file))
+        write_partition(market, date, pa.concat_tables(tables, promote_options="default"), directory, merged.union(new_names))
+
+    for name in snapshot_names:
+        os.remove(os.path.join(path, name))
+
+def compact_in_background(market, date, directory):
+    """Runs compact_partition on the compaction thread, logging a failure instead of losing it."""
+    try:
+        compact_partition(market, date, directory)
+    except Exception:
+        logger.exception("History compaction failed", extra={"fields": {"market": market, "date": date}})
+
+def wait_for_compaction():
+    """Blocks until every compaction submitted so far has finished."""
+    compaction_executor.submit(lambda: None).result()
+
+def list_markets(directory=HISTORY_DIRECTORY):
+    """Lists the markets that have history."""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(d.split("=", 1)[1] for d in os.listdir(directory) if d.startswith("market="))
+
+def list_dates(market, directory=HISTORY_DIRECTORY):
+    """Lists the UTC dates that have snapshots for a market."""
+    market_path = os.path.join(directory, f"market={market}")
+    if not os.path.isdir(market_path):
+        return []
+    return sorted(d.split("=", 1)[1] for d in os.listdir(market_path) if d.startswith("date="))
+
+def to_utc(value):
+    """Converts a datetime, date string or pandas Timestamp to a UTC Timestamp."""
+    timestamp = pd.Timestamp(value)
+    return timestamp.tz_localize("UTC") if timestamp.tzinfo is None else timestamp.tz_convert("UTC")
+
+def history_files(markets, start, end, directory):
+    """Lists only the files in the date partitions that overlap [start, end)."""
+    start_date = start.strftime("%Y-%m-%d") if start is not None else None
+    end_date = end.strftime("%Y-%m-%d") if end is not None else None
+
+    files = []
+    for market in markets:
+        for date in list_dates(market, directory):
+            if (start_date and date < start_date) or (end_date and date > end_date):
+                continue
+            path = partition_path(market, date, directory)
+            snapshot_names = sorted(f for f in os.listdir(path) if f.endswith(".parquet") and f != COMPACTED_FILENAME)
+            compacted_file = os.path.join(path, COMPACTED_FILENAME)
+            if os.path.exists(compacted_file):
+                # The compacted file holds the snapshots it lists, even while they are still being removed.
+                # Any other snapshot was written after the day was compacted and is read on its own
+                files.append(compacted_file)
+                merged = compacted_snapshots(compacted_file)
+                snapshot_names = [name for name in snapshot_names if name not in merged]
+            files.extend(os.path.join(path, name) for name in snapshot_names)
+    return files
+
+def load_history(market=None, start=None, end=None, name=None, columns=None, directory=HISTORY_DIRECTORY):
+    """Loads the snapshots taken in [start, end) for one market, one company, or both.
+
+    Date partitions outside the range are never opened, and the time and company filters are
+    pushed down to the Parquet row groups, so a query only reads the data it returns.
+    """
+    start = to_utc(start) if start is not None else None
+    end = to_utc(end) if end is not None else None
+    markets = [market] if market is not None else list_markets(directory)
+
+    files = history_files(markets, start, end, directory)
+    if not files:
+        return pd.DataFrame(columns=columns or ["scraped_at", "market", "Rank", "Name", "Market Cap", "Price", "Country"])
+
+    dataset = ds.dataset(files, format="parquet", partitioning=PARTITIONING, partition_base_dir=directory)
+
+    condition = None
+    filters = []
+    if start is not None:
+        filters.append(ds.field("scraped_at") >= pa.scalar(start.to_pydatetime(), type=pa.timestamp("us", tz="UTC")))
+    if end is not None:
+        filters.append(ds.field("scraped_at") < pa.scalar(end.to_pydatetime(), type=pa.timestamp("us", tz="UTC")))
+    if name is not None:
+        filters.append(ds.field("Name") == name)
+    for f in filters:
+        condition = f if condition is None else condition & f
+
+    df = dataset.to_table(columns=columns, filter=condition).to_pandas()
+    if "scraped_at" in df.columns:
+        df = df.sort_values("scraped_at", kind="stable").reset_index(drop=True)
+    return df
@@ -1,13 +1,103 @@
+import atexit
+import csv
+import hashlib
+import logging
 import os
-import random
+import queue
+import threading
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
 from webdriver_manager.chrome import ChromeDriverManager
-from bs4 import BeautifulSoup
 import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
 import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from archive import PageArchive, to_utc_datetime
+from driver_manager import ManagedDriver
+from history import HISTORY_DIRECTORY, append_snapshot, market_from_filename
+from market_data import write_typed
+from metrics import BYTE_BUCKETS, ROW_BUCKETS, MetricsRegistry, seconds_since, start_metrics_server
+from scheduler import RefreshScheduler
+from scraper_logging import setup_logging
+from table_parser import extract_table_html, parse_market_table
+
+logger = logging.getLogger("scraper")
+
+# Number of long-lived headless Chrome drivers sharing the URL list each cycle
+WORKER_COUNT = 4
+
+# "http" tries a plain GET first and falls back to Chrome, "browser" always renders in Chrome
+FETCH_MODE = "http"
+HTTP_TIMEOUT = 15
+HTTP_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/120.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+# "fast" uses the eager load strategy, blocks images, media, fonts and every host outside ALLOWED_HOSTS
+# and only waits for the table rows; "full" waits for the whole page like a normal browser
+PAGE_LOAD_PROFILE = "fast"
+PAGE_LOAD_TIMEOUT = 20
+TABLE_ROW_SELECTOR = "table.marketcap-table tbody tr"
+# Runs in every page before its own scripts and records when the first table row appears, in
+# milliseconds since navigation started, so both profiles can report time-to-table
+TABLE_READY_SCRIPT = f"""
+new MutationObserver(function (mutations, observer) {{
+    if (document.querySelector("{TABLE_ROW_SELECTOR}")) {{
+        window.tableReadyAt = performance.now();
+        observer.disconnect();
+    }}
+}}).observe(document, {{childList: true, subtree: true}});
+"""
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*.mp4", "*.webm", "*.mp3",
+]
+# The only hosts the "fast" profile resolves: the site and its subdomains, which serve its own assets.
+# Every other host fails to resolve, so third-party scripts are blocked whether or not they are known trackers
+ALLOWED_HOSTS = ["companiesmarketcap.com", "*.companiesmarketcap.com"]
+
+# Follow each ranking's pagination beyond the top 100 over HTTP, streaming every page into one CSV
+DEEP_SCRAPE = False
+# Rows on one page of a ranking, so a CSV that holds several pages still sets a first-page expectation
+PAGE_ROWS = 100
+DEEP_MAX_PAGES = 100
+DEEP_IN_FLIGHT = 4
+# Retries of a deep-scrape page that failed, waiting DEEP_RETRY_BACKOFF * 2 ** attempt seconds, before the market fails
+DEEP_PAGE_RETRIES = 3
+DEEP_RETRY_BACKOFF = 1.0
+DEEP_HISTORY_CHUNK_ROWS = 5000
+
+# Table parser backend: "soup" (full html.parser tree), "strainer" (table only) or "lxml" (C-backed)
+PARSER_BACKEND = "lxml"
+
+# Refresh each market on its own adaptive interval (see scheduler.py) instead of all markets every 60 seconds
+SCHEDULER_ENABLED = True
+SUMMARY_INTERVAL = 300
+
+# Append every changed page to the Parquet history store in history/ as well as the latest CSV
+HISTORY_ENABLED = True
+
+# Also write a typed Arrow copy next to every CSV (see market_data.py), so readers skip parsing display strings
+TYPED_OUTPUT_ENABLED = True
+
+# "record" also archives every page that served a scrape in archive/ (see archive.py), "replay" re-runs the
+# parse-and-write pipeline over that archive into REPLAY_DIRECTORY with no browser or network, "off" does neither
+ARCHIVE_MODE = "off"
+REPLAY_DIRECTORY = "replay"
+
+# Serve Prometheus metrics on http://METRICS_HOST:METRICS_PORT/metrics (see metrics.py) while the scraper runs
+METRICS_ENABLED = True
 
 url_filename_map = {
     "https://companiesmarketcap.com/": "world_market.csv",
@@ -86,105 +176,708 @@ flag_to_country_code = {
     "🇦🇹": "AT"
 }
 
-virgin_messages = [
-    "virgin API consoomer fears HTML",
-    "virgin API consoomer limited to what the API can do",
-    "virgin API consoomer has to identify himself even for read-only APIs",
-    "virgin API consoomer API provider takes away his endpoint",
-    "virgin API consoomer 429 too many requests",
-    "virgin API consoomer has to worry about quota",
-    "virgin API consoomer thinks that he is making his life easier",
-    "virgin API consoomer begs his users for Oauth",
-    "virgin API consoomer API keys (lol)",
-    "virgin API consoomer data is 10 minutes behind anyways",
-    "virgin API consoomer has to verify his email, phone, driver's license, SSN, DNA sample",
-    "virgin API consoomer has to agree to ToS and follow the rules (LMAO)"
-]
+def get_country_code(flag_emoji):
+    return flag_to_country_code.get(flag_emoji, 'Unknown')
 
-chad_messages = [
-    "Chad 3rd party scraper follows no rules, doesn’t agree to any terms and service",
-    "Chad 3rd party scraper scrapes so fast the backend crashes",
-    "Chad 3rd party scraper has no limitations and can access any data he wants",
-    "Chad 3rd party scraper entire industries are dedicated to stopping him",
-    "Chad 3rd party scraper website thinks his user agent is a phone",
-    "Chad 3rd party scraper promising career at high-frequency trading firm (just scrapes in spare time)",
-    "Chad 3rd party scraper pays Indians to solve captchas",
-    "Chad 3rd party scraper can work anonymously",
-    "Chad 3rd party scraper curl://",
-    "Chad 3rd party scraper Selenium goat",
-    "Chad 3rd party scraper millions of engineer hours can’t stop him from scraping"
-]
+def get_service():
+    """Installs ChromeDriver once and returns the service shared by every worker."""
+    global service
+    with service_lock:
+        if service is None:
+            service = Service(ChromeDriverManager().install())
+    return service
+
+def build_chrome_options(profile):
+    """Builds the Chrome options for a page-load profile."""
+    options = Options()
+    options.add_argument("--headless")
+    if profile == "fast":
+        # Hand the page back at DOMContentLoaded instead of waiting for every subresource
+        options.page_load_strategy = "eager"
+        options.add_argument("--blink-settings=imagesEnabled=false")
+        options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+        options.add_argument(host_resolver_rules(ALLOWED_HOSTS))
+    return options
+
+def host_resolver_rules(allowed_hosts):
+    """Returns the Chrome flag that makes every host outside allowed_hosts fail to resolve."""
+    return "--host-resolver-rules=" + ", ".join(["MAP * ~NOTFOUND"] + [f"EXCLUDE {host}" for host in allowed_hosts])
+
+def create_driver():
+    """Starts a headless Chrome driver using the shared service and the active page-load profile."""
+    driver = webdriver.Chrome(service=get_service(), options=build_chrome_options(PAGE_LOAD_PROFILE))
+    driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": TABLE_READY_SCRIPT})
+    if PAGE_LOAD_PROFILE == "fast":
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+    return driver
+
+def get_http_session():
+    """Returns the pooled HTTP session shared by every worker."""
+    global http_session
+    with http_session_lock:
+        if http_session is None:
+            http_session = requests.Session()
+            http_session.headers.update(HTTP_HEADERS)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=WORKER_COUNT * DEEP_IN_FLIGHT)
+            http_session.mount("https://", adapter)
+    return http_session
+
+def get_page_archive():
+    """Opens the raw page archive once and returns it."""
+    global page_archive
+    with page_archive_lock:
+        if page_archive is None:
+            page_archive = PageArchive()
+    return page_archive
+
+def archive_page(url, page_source, path):
+    """Archives the page source that served a scrape when the scraper is recording."""
+    if ARCHIVE_MODE == "record":
+        get_page_archive().record(url, page_source, path=path)
+
+def extract_rows(page_source):
+    """Extracts the company rows from the marketcap table, or returns None if the table is missing."""
+    table_rows = parse_market_table(page_source, backend=PARSER_BACKEND)
+    if table_rows is None:
+        return None
+
+    log_rows = logger.isEnabledFor(logging.DEBUG)
+    data = []
+    for rank, name, market_cap, price, country_flag in table_rows:
+        country_code = get_country_code(country_flag)
+        data.append([rank, name, market_cap, price, country_code])
+        if log_rows:
+            logger.debug("Scraped company", extra={"fields": {"name": name, "market_cap": market_cap, "price": price}})
+    return data
+
+def get_expected_rows(url, filename):
+    """Returns how many rows a complete first page should have, based on the last scrape of it.
+
+    A deep scrape leaves every page of the ranking in the CSV, so its row count is capped at one page.
+    """
+    if url not in expected_row_counts:
+        output_path = os.path.join("output", filename)
+        if os.path.exists(output_path):
+            expected_row_counts[url] = min(len(pd.read_csv(output_path)), PAGE_ROWS)
+        else:
+            expected_row_counts[url] = 1
+    return expected_row_counts[url]
+
+def hash_table(page_source):
+    """Hashes the raw marketcap table markup, or returns None if the page has no table."""
+    table_html = extract_table_html(page_source)
+    if table_html is None:
+        return None
+    return hashlib.sha256(table_html.encode("utf-8")).hexdigest()
+
+def is_unchanged(url, filename, table_hash):
+    """Checks whether the table matches the one behind the CSV that is already on disk."""
+    if table_hash is None or table_hashes.get(url) != table_hash:
+        return False
+    return os.path.exists(os.path.join("output", filename))
+
+def take_request():
+    """Waits for the scheduler's request budget before one page request, when a scheduler is running."""
+    if request_budget is not None:
+        request_budget.take_request()
 
-def print_random_message():
-    if random.choice([True, False]):
-        print(random.choice(virgin_messages))
+def fetch_with_http(url, filename):
+    """Fetches the server-rendered page with a conditional pooled GET, or returns None on failure."""
+    headers = {}
+    # Only ask for a 304 when there is a CSV on disk that the cached validators describe
+    if os.path.exists(os.path.join("output", filename)):
+        validators = http_validators.get(url, {})
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+    take_request()
+    try:
+        response = get_http_session().get(url, headers=headers, timeout=HTTP_TIMEOUT)
+        if response.status_code in (200, 304):
+            return response
+        logger.warning("HTTP fetch returned an error status", extra={"fields": {"url": url, "status": response.status_code}})
+        scrape_failures.inc(market=market_from_filename(filename), cause="http_status")
+    except requests.RequestException as e:
+        logger.warning("HTTP fetch failed", extra={"fields": {"url": url, "error": str(e)}})
+        scrape_failures.inc(market=market_from_filename(filename), cause=failure_cause(e))
+    return None
+
+def fetch_with_browser(driver, url):
+    """Renders the page in Chrome and returns its source, logging time-to-table and full load of the same navigation."""
+    take_request()
+    driver.get(url)
+    if PAGE_LOAD_PROFILE == "fast":
+        # The rows are server-rendered, so the page is usable as soon as the table body has them
+        WebDriverWait(driver, PAGE_LOAD_TIMEOUT).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, TABLE_ROW_SELECTOR))
+        )
     else:
-        print(random.choice(chad_messages))
+        driver.implicitly_wait(10)
 
-def get_country_code(flag_emoji):
-    return flag_to_country_code.get(flag_emoji, 'Unknown')
+    # Both come from this navigation, on the page's own clock. loadEventEnd is still 0 when the "fast"
+    # profile hands the page back before it has finished loading
+    time_to_table_ms, full_load_ms = driver.execute_script(
+        "const timing = performance.timing;"
+        "return [window.tableReadyAt ?? null, timing.loadEventEnd ? timing.loadEventEnd - timing.navigationStart : null];"
+    )
+    logger.info("Browser page load", extra={"fields": {
+        "url": url,
+        "profile": PAGE_LOAD_PROFILE,
+        "time_to_table_ms": round(time_to_table_ms) if time_to_table_ms is not None else None,
+        "full_load_ms": round(full_load_ms) if full_load_ms is not None else None,
+    }})
+    return driver.page_source
 
-os.makedirs("output", exist_ok=True)
+def fetch_page(get_driver, url, filename):
+    """Fetches a page and extracts its rows unless the table is unchanged since the last write.
 
-chrome_options = Options()
-chrome_options.add_argument("--headless")
+    Returns a dict with the rows ("data", None when unchanged), the path that served the page,
+    the table hash and any HTTP validators to remember once the rows are written, along with
+    the page size and the time spent fetching and parsing it.
+    """
+    page = {"data": None, "path": "http", "table_hash": None, "validators": None, "bytes": 0, "fetch_ms": 0.0, "parse_ms": 0.0}
 
-service = Service(ChromeDriverManager().install())
+    if FETCH_MODE == "http":
+        start_time = time.perf_counter()
+        response = fetch_with_http(url, filename)
+        page["fetch_ms"] += (time.perf_counter() - start_time) * 1000
 
-while True:
-    driver = webdriver.Chrome(service=service, options=chrome_options)
-    
-    total_start_time = time.time()
-    
-    urls_scraped = 0
-    csvs_created = 0
-    
+        if response is not None and response.status_code == 304:
+            page.update(table_hash=table_hashes.get(url), validators=http_validators.get(url))
+            return page
+
+        if response is not None:
+            page["bytes"] = len(response.content)
+            page["validators"] = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+            start_time = time.perf_counter()
+            page["table_hash"] = hash_table(response.text)
+            if is_unchanged(url, filename, page["table_hash"]):
+                page["parse_ms"] += (time.perf_counter() - start_time) * 1000
+                archive_page(url, response.text, "http")
+                return page
+
+            data = extract_rows(response.text)
+            page["parse_ms"] += (time.perf_counter() - start_time) * 1000
+            expected_rows = get_expected_rows(url, filename)
+            if data is not None and len(data) >= expected_rows:
+                page["data"] = data
+                archive_page(url, response.text, "http")
+                return page
+            found_rows = 0 if data is None else len(data)
+            logger.info("HTTP page incomplete, falling back to Chrome", extra={"fields": {
+                "url": url, "rows": found_rows, "expected_rows": expected_rows,
+            }})
+
+    # Only start Chrome when the plain HTTP page was not good enough
+    page.update(path="browser", validators=None)
+    start_time = time.perf_counter()
+    page_source = fetch_with_browser(get_driver(), url)
+    page["fetch_ms"] += (time.perf_counter() - start_time) * 1000
+    page["bytes"] = len(page_source.encode("utf-8"))
+    archive_page(url, page_source, "browser")
+
+    start_time = time.perf_counter()
+    page["table_hash"] = hash_table(page_source)
+    if not is_unchanged(url, filename, page["table_hash"]):
+        page["data"] = extract_rows(page_source)
+        if page["data"] is None:
+            raise ValueError(f"marketcap table not found on {url}")
+    page["parse_ms"] += (time.perf_counter() - start_time) * 1000
+    return page
+
+def report_page(url, filename, summary):
+    """Logs the one INFO record written per scraped URL and records it in the metrics."""
+    market = market_from_filename(filename)
+    logger.info("Scraped page", extra={"fields": {"url": url, "market": market, **summary}})
+
+    fetch_seconds.observe(summary["fetch_ms"] / 1000, market=market, path=summary["path"])
+    page_bytes.observe(summary["bytes"], market=market)
+    if "parse_ms" in summary:
+        parse_seconds.observe(summary["parse_ms"] / 1000, market=market)
+    if not summary["skipped"]:
+        rows_parsed.observe(summary["rows"], market=market)
+        write_seconds.observe(summary["write_ms"] / 1000, market=market)
+    pages_scraped.inc(market=market, path=summary["path"], result="skipped" if summary["skipped"] else "written")
+
+    # An unchanged page still confirms that the CSV on disk is current
+    data_updated_at[url] = time.time()
+
+def failure_cause(error):
+    """Buckets a scrape error into a short cause label for the failure metrics."""
+    if isinstance(error, (TimeoutException, requests.Timeout)):
+        return "timeout"
+    if isinstance(error, WebDriverException):
+        return "browser"
+    if isinstance(error, requests.RequestException):
+        return "http_error"
+    if isinstance(error, ValueError):
+        return "table_missing"
+    if isinstance(error, OSError):
+        return "write"
+    return "other"
+
+def collect_data_age():
+    """Returns how old each market's latest data is, falling back to its CSV's age before the first scrape."""
+    now = time.time()
+    ages = []
     for url, filename in url_filename_map.items():
-        print(f"Opening {url}")
+        updated_at = data_updated_at.get(url)
+        if updated_at is None:
+            output_path = os.path.join("output", filename)
+            if not os.path.exists(output_path):
+                continue
+            updated_at = os.path.getmtime(output_path)
+        ages.append(({"market": market_from_filename(filename)}, seconds_since(updated_at, now)))
+    return ages
+
+def collect_driver_events(event):
+    """Returns a per-worker Chrome lifecycle count ("starts", "restarts" or "recycles") from the driver stats."""
+    return [({"worker": worker_id}, managed_driver.stats[event]) for worker_id, managed_driver in sorted(driver_managers.items())]
+
+def page_url(url, page_number):
+    """Returns the URL of one page of a ranking, following the site's /page/N/ pagination."""
+    if page_number == 1:
+        return url
+    return f"{url.rstrip('/')}/page/{page_number}/"
+
+def fetch_deep_page(url, page_number):
+    """Fetches and parses one page of a ranking over HTTP, returning its table hash, rows and size."""
+    take_request()
+    response = get_http_session().get(page_url(url, page_number), timeout=HTTP_TIMEOUT)
+    if response.status_code == 404:
+        return None, [], 0
+    response.raise_for_status()
+    # Archived under their own path, so a replay never mistakes page 1 for the whole market
+    archive_page(page_url(url, page_number), response.text, "deep")
+    data = extract_rows(response.text)
+    return hash_table(response.text), data or [], len(response.content)
+
+def fetch_deep_page_with_retry(url, page_number):
+    """Fetches one deep-scrape page, retrying a failed request so one bad page does not fail the market."""
+    for attempt in range(DEEP_PAGE_RETRIES + 1):
+        try:
+            return fetch_deep_page(url, page_number)
+        except requests.RequestException as e:
+            if attempt == DEEP_PAGE_RETRIES:
+                logger.error("Deep-scrape page failed", extra={"fields": {
+                    "url": url, "page": page_number, "attempts": attempt + 1, "error": str(e),
+                }})
+                raise
+            logger.warning("Deep-scrape page failed, retrying", extra={"fields": {
+                "url": url, "page": page_number, "attempt": attempt + 1, "error": str(e),
+            }})
+            time.sleep(DEEP_RETRY_BACKOFF * 2 ** attempt)
+
+def stream_ranking_pages(url, writer):
+    """Fetches a ranking's pages concurrently and writes their rows strictly in page order.
+
+    At most DEEP_IN_FLIGHT pages are requested or held in memory at once. Returns the number of
+    pages, rows and bytes written, the number of rows on the first page and a hash over every page's table.
+    """
+    combined_hash = hashlib.sha256()
+    pages_written = 0
+    rows_written = 0
+    bytes_read = 0
+    first_page_rows = None
+
+    with ThreadPoolExecutor(max_workers=DEEP_IN_FLIGHT) as pool:
+        in_flight = {}
+        next_page = 1
+        try:
+            while True:
+                while len(in_flight) < DEEP_IN_FLIGHT and next_page <= DEEP_MAX_PAGES:
+                    in_flight[next_page] = pool.submit(fetch_deep_page_with_retry, url, next_page)
+                    next_page += 1
+
+                if pages_written + 1 not in in_flight:
+                    break
+                table_hash, data, page_bytes = in_flight.pop(pages_written + 1).result()
+                if not data:
+                    break
+
+                combined_hash.update((table_hash or "").encode("utf-8"))
+                writer.writerows(data)
+                pages_written += 1
+                rows_written += len(data)
+                bytes_read += page_bytes
+
+                # A page shorter than the first one is the last page
+                first_page_rows = first_page_rows or len(data)
+                if len(data) < first_page_rows:
+                    break
+        finally:
+            for future in in_flight.values():
+                future.cancel()
+
+    return pages_written, rows_written, bytes_read, first_page_rows or 0, combined_hash.hexdigest()
+
+def scrape_deep(url, filename):
+    """Follows a ranking's pagination and streams every page into one ranked CSV.
+
+    Returns the same (path, skipped) pair as scrape_url.
+    """
+    scraped_at = datetime.now(timezone.utc)
+    output_path = os.path.join("output", filename)
+    temporary_path = output_path + ".tmp"
+
+    start_time = time.perf_counter()
+    try:
+        with open(temporary_path, "w", newline="", encoding="utf-8") as output_file:
+            writer = csv.writer(output_file, lineterminator="\n")
+            writer.writerow(['Rank', 'Name', 'Market Cap', 'Price', 'Country'])
+            pages_written, rows_written, bytes_read, first_page_rows, table_hash = stream_ranking_pages(url, writer)
+        if pages_written == 0:
+            raise ValueError(f"marketcap table not found on {url}")
+        # Pages are fetched, parsed and streamed to disk together, so they are timed together
+        summary = {"path": "http", "pages": pages_written, "rows": rows_written, "bytes": bytes_read,
+                   "fetch_ms": round((time.perf_counter() - start_time) * 1000)}
+        if is_unchanged(url, filename, table_hash):
+            os.remove(temporary_path)
+            report_page(url, filename, {**summary, "skipped": True, "write_ms": 0})
+            return "http", True
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+    start_time = time.perf_counter()
+    os.replace(temporary_path, output_path)
+
+    # Read the file back in chunks so the history append and typed copy stay as flat as the scrape
+    def chunks():
+        for chunk in pd.read_csv(output_path, dtype=str, chunksize=DEEP_HISTORY_CHUNK_ROWS):
+            if HISTORY_ENABLED:
+                append_snapshot(market_from_filename(filename), chunk, scraped_at=scraped_at)
+            yield chunk
+
+    if TYPED_OUTPUT_ENABLED:
+        log_unparseable(filename, write_typed(chunks(), output_path))
+    else:
+        for _ in chunks():
+            pass
+    report_page(url, filename, {**summary, "skipped": False, "write_ms": round((time.perf_counter() - start_time) * 1000)})
+
+    table_hashes[url] = table_hash
+    # The plain HTTP path only ever sees the first page, so that is what it is checked against
+    expected_row_counts[url] = first_page_rows
+    return "http", False
+
+def log_unparseable(filename, unparseable):
+    """Warns about scraped values that could not be stored in the typed copy."""
+    for column, values in unparseable.items():
+        logger.warning("Unparseable values in typed output", extra={"fields": {
+            "file": filename, "column": column, "count": len(values), "examples": list(values.unique()[:5]),
+        }})
+
+def write_market(filename, data, scraped_at, output_directory="output", history_directory=HISTORY_DIRECTORY):
+    """Writes a market's rows to its CSV and appends them to the history store."""
+    df = pd.DataFrame(data, columns=['Rank', 'Name', 'Market Cap', 'Price', 'Country'])
+
+    output_path = os.path.join(output_directory, filename)
+    df.to_csv(output_path, index=False)
+    if TYPED_OUTPUT_ENABLED:
+        log_unparseable(filename, write_typed([df], output_path))
+
+    # The CSV is the latest view, the history store keeps every changed snapshot
+    if HISTORY_ENABLED:
+        append_snapshot(market_from_filename(filename), df, scraped_at=scraped_at, directory=history_directory)
+
+def scrape_url(get_driver, url, filename):
+    """Scrapes a single market page and writes its rows to the output CSV if the table changed.
+
+    Returns the path that served the page and whether it was skipped as unchanged.
+    """
+    if DEEP_SCRAPE:
+        return scrape_deep(url, filename)
+
+    scraped_at = datetime.now(timezone.utc)
+    page = fetch_page(get_driver, url, filename)
+    fetch_paths[url] = page["path"]
+    summary = {"path": page["path"], "bytes": page["bytes"], "fetch_ms": round(page["fetch_ms"]), "parse_ms": round(page["parse_ms"])}
+
+    if page["data"] is None:
+        # Keep the validators fresh so the next conditional request still matches
+        if page["validators"]:
+            http_validators[url] = page["validators"]
+        report_page(url, filename, {**summary, "skipped": True, "rows": 0, "write_ms": 0})
+        return page["path"], True
+
+    data = page["data"]
+    start_time = time.perf_counter()
+    write_market(filename, data, scraped_at)
+    report_page(url, filename, {**summary, "skipped": False, "rows": len(data), "write_ms": round((time.perf_counter() - start_time) * 1000)})
+
+    # Only remember the page once its CSV is on disk, so a failed write is retried next cycle
+    expected_row_counts[url] = len(data)
+    table_hashes[url] = page["table_hash"]
+    if page["validators"]:
+        http_validators[url] = page["validators"]
+    else:
+        http_validators.pop(url, None)
+    return page["path"], False
+
+def scrape_with_retry(managed_driver, url, filename):
+    """Scrapes a page, retrying it once on a fresh driver if the browser session died under it."""
+    try:
+        return scrape_url(managed_driver.get, url, filename)
+    except WebDriverException as e:
+        if managed_driver.driver is None or managed_driver.is_healthy():
+            raise
+        managed_driver.restart(f"session died while scraping {url}: {e.__class__.__name__}")
+        return scrape_url(managed_driver.get, url, filename)
+
+def scrape_worker(worker_id, url_queue, worker_stats, on_result=None):
+    """Scrapes URLs from the shared queue until it hands out None, starting Chrome only if a page needs it.
+
+    on_result(url, changed, failed) is called after every page, which is how the scheduler learns
+    when to refresh it next. The worker's driver stays warm after it exits, for the next cycle.
+    """
+    stats = {"pages": 0, "failures": 0, "skipped": 0, "busy_time": 0.0, "http": 0, "browser": 0}
+    worker_stats[worker_id] = stats
+    if worker_id not in driver_managers:
+        driver_managers[worker_id] = ManagedDriver(create_driver, f"Worker {worker_id}")
+    managed_driver = driver_managers[worker_id]
+
+    while True:
+        job = url_queue.get()
+        if job is None:
+            break
+        url, filename = job
+
         start_time = time.time()
-        driver.get(url)
-        driver.implicitly_wait(10)
-        print(f"Started scraping {url}")
-    
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
-    
-        table = soup.find('table', {'class': 'default-table table marketcap-table dataTable'})
-    
-        data = []
-        for row in table.tbody.find_all('tr'):
-            columns = row.find_all('td')
-            if len(columns) >= 5:
-                rank = columns[1].text.strip()
-                name = columns[2].find('div', {'class': 'company-name'}).text.strip()
-                market_cap = columns[3].text.strip()
-                price = columns[4].text.strip()
-                country_flag = columns[7].text.strip().split()[0]
-                country_code = get_country_code(country_flag)
-                data.append([rank, name, market_cap, price, country_code])
-                print(f"Finished scraping {name} at {market_cap} total market cap at {price} price per share")
-    
-        df = pd.DataFrame(data, columns=['Rank', 'Name', 'Market Cap', 'Price', 'Country'])
-    
-        output_path = os.path.join("output", filename)
-        df.to_csv(output_path, index=False)
-        print(f"Finished scraping {url} and saved to {output_path}")
-    
-        urls_scraped += 1
-        csvs_created += 1
-    
-        end_time = time.time()
-        print(f"Time taken for {url}: {end_time - start_time:.2f} seconds")
-    
-    driver.quit()
-    
-    total_end_time = time.time()
-    total_time_taken = total_end_time - total_start_time
-    
-    print(f"Total URLs scraped: {urls_scraped}")
-    print(f"Total CSVs created: {csvs_created}")
-    print(f"Total time taken: {total_time_taken:.2f} seconds")
-    
-    print("Sleeping for 60 seconds before the next run...")
-    for _ in range(60):
-        print_random_message()
-        time.sleep(1)
\ No newline at end of file
+        changed, failed = False, False
+        try:
+            fetch_path, skipped = scrape_with_retry(managed_driver, url, filename)
+            changed = not skipped
+            stats["pages"] += 1
+            stats[fetch_path] += 1
+            if skipped:
+                stats["skipped"] += 1
+            if fetch_path == "browser":
+                managed_driver.page_done()
+        except Exception as e:
+            failed = True
+            stats["failures"] += 1
+            cause = failure_cause(e)
+            scrape_failures.inc(market=market_from_filename(filename), cause=cause)
+            logger.error("Scrape failed", extra={"fields": {"url": url, "worker": worker_id, "cause": cause, "error": str(e)}})
+        finally:
+            elapsed = time.time() - start_time
+            stats["busy_time"] += elapsed
+            if on_result is not None:
+                on_result(url, changed, failed)
+
+def quit_drivers():
+    """Quits every warm driver when the scraper exits."""
+    for managed_driver in driver_managers.values():
+        managed_driver.quit()
+
+def start_workers(worker_count, url_queue, worker_stats, on_result=None):
+    """Starts the pool of scrape workers sharing one URL queue."""
+    workers = [
+        threading.Thread(target=scrape_worker, args=(worker_id, url_queue, worker_stats, on_result), daemon=True)
+        for worker_id in range(1, max(1, min(worker_count, len(url_filename_map))) + 1)
+    ]
+    for worker in workers:
+        worker.start()
+    return workers
+
+def log_worker_summary(worker_stats, total_time=None):
+    """Logs per-worker timing, per-worker Chrome lifecycle and the totals across the pool."""
+    # Per-worker timing makes it easy to pick the right pool size for a box
+    for worker_id, stats in sorted(worker_stats.items()):
+        average = stats["busy_time"] / stats["pages"] if stats["pages"] else 0.0
+        logger.info("Worker summary", extra={"fields": {
+            "worker": worker_id, "pages": stats["pages"], "failures": stats["failures"],
+            "skipped": stats["skipped"], "http": stats["http"], "browser": stats["browser"],
+            "busy_s": round(stats["busy_time"], 2), "seconds_per_page": round(average, 2),
+        }})
+
+    for worker_id, managed_driver in sorted(driver_managers.items()):
+        driver_stats = managed_driver.stats
+        if driver_stats["starts"]:
+            logger.info("Chrome summary", extra={"fields": {
+                "worker": worker_id, "starts": driver_stats["starts"],
+                "startup_s": round(driver_stats["startup_time"], 2), "restarts": driver_stats["restarts"],
+                "recycles": driver_stats["recycles"],
+                "rss_mb": round(driver_stats["rss_mb"]) if driver_stats["rss_mb"] is not None else None,
+            }})
+
+    urls_scraped = sum(stats["pages"] for stats in worker_stats.values())
+    pages_skipped = sum(stats["skipped"] for stats in worker_stats.values())
+    summary = {
+        "urls_scraped": urls_scraped,
+        "http": sum(stats["http"] for stats in worker_stats.values()),
+        "browser": sum(stats["browser"] for stats in worker_stats.values()),
+        "csvs_written": urls_scraped - pages_skipped,
+        "skipped": pages_skipped,
+        "failures": sum(stats["failures"] for stats in worker_stats.values()),
+        "workers": len(worker_stats),
+    }
+    if total_time is not None:
+        summary["total_s"] = round(total_time, 2)
+    logger.info("Run summary", extra={"fields": summary})
+
+def run_cycle(worker_count=WORKER_COUNT):
+    """Scrapes every URL once, sharing the URL list across a pool of workers."""
+    url_queue = queue.Queue()
+    for url, filename in url_filename_map.items():
+        url_queue.put((url, filename))
+
+    worker_stats = {}
+    total_start_time = time.time()
+    workers = start_workers(worker_count, url_queue, worker_stats)
+    for _ in workers:
+        url_queue.put(None)
+    for worker in workers:
+        worker.join()
+    total_time_taken = time.time() - total_start_time
+
+    log_worker_summary(worker_stats, total_time_taken)
+
+def run_scheduler(worker_count=WORKER_COUNT):
+    """Refreshes each market when it is due, instead of every market on a fixed cycle."""
+    global request_budget
+    scheduler = RefreshScheduler({url: market_from_filename(filename) for url, filename in url_filename_map.items()})
+    # Every page request a worker makes, including each deep-scrape page and a Chrome fallback, takes a token
+    request_budget = scheduler
+    url_queue = queue.Queue()
+    worker_stats = {}
+
+    # Only hand out a URL when a worker is free, so the most overdue URL is always the next one fetched
+    free_workers = threading.Semaphore(max(1, min(worker_count, len(url_filename_map))))
+
+    def on_result(url, changed, failed):
+        interval = scheduler.record_result(url, changed, failed)
+        logger.debug("Rescheduled", extra={"fields": {"url": url, "interval_s": interval}})
+        free_workers.release()
+
+    start_workers(worker_count, url_queue, worker_stats, on_result)
+
+    last_summary_time = time.time()
+    while True:
+        free_workers.acquire()
+        url = scheduler.next_url()
+        url_queue.put((url, url_filename_map[url]))
+
+        if time.time() - last_summary_time >= SUMMARY_INTERVAL:
+            log_worker_summary(worker_stats)
+            last_summary_time = time.time()
+
+def replay_archive(start=None, end=None, directory=REPLAY_DIRECTORY, archive=None):
+    """Re-runs the parse-and-write pipeline over the archived pages fetched in [start, end), oldest first.
+
+    Pages are read straight from the archive, with no browser or network, and written to
+    directory/output and directory/history so the live CSVs and history are left alone. As in a
+    live scrape, a page whose table matches the previous replayed page of its URL is skipped.
+    Deep-scrape pages are archived with the path "deep" and are not replayed.
+    """
+    output_directory = os.path.join(directory, "output")
+    history_directory = os.path.join(directory, "history")
+    os.makedirs(output_directory, exist_ok=True)
+
+    replayed_hashes = {}
+    stats = {"pages": 0, "written": 0, "skipped": 0, "failures": 0, "bytes": 0}
+    start_time = time.perf_counter()
+    archive = archive or get_page_archive()
+    for entry, page_source in archive.pages(url_filename_map, start, end):
+        if entry["path"] == "deep":
+            continue
+        url = entry["url"]
+        filename = url_filename_map[url]
+        stats["pages"] += 1
+        stats["bytes"] += entry["size"]
+
+        table_hash = hash_table(page_source)
+        if table_hash is not None and replayed_hashes.get(url) == table_hash:
+            stats["skipped"] += 1
+            continue
+
+        data = extract_rows(page_source)
+        if data is None:
+            stats["failures"] += 1
+            logger.warning("Archived page has no marketcap table", extra={"fields": {"url": url, "fetched_at": entry["fetched_at"]}})
+            continue
+        write_market(filename, data, to_utc_datetime(entry["fetched_at"]), output_directory, history_directory)
+        replayed_hashes[url] = table_hash
+        stats["written"] += 1
+
+    elapsed = time.perf_counter() - start_time
+    logger.info("Replay summary", extra={"fields": {
+        **stats, "total_s": round(elapsed, 2),
+        "pages_per_s": round(stats["pages"] / elapsed, 1) if elapsed else None,
+        "mb_per_s": round(stats["bytes"] / 1e6 / elapsed, 1) if elapsed else None,
+        "directory": directory,
+    }})
+    return stats
+
+service = None
+service_lock = threading.Lock()
+
+http_session = None
+http_session_lock = threading.Lock()
+
+page_archive = None
+page_archive_lock = threading.Lock()
+
+# The RefreshScheduler whose request budget every page request takes from, set while the scheduler runs
+request_budget = None
+
+# One warm Chrome driver per worker, kept across cycles
+driver_managers = {}
+atexit.register(quit_drivers)
+
+# Rows seen on the last successful scrape of each URL, and which path served it
+expected_row_counts = {}
+fetch_paths = {}
+
+# Hash of the table behind each URL's CSV on disk, and the HTTP validators of that response
+table_hashes = {}
+http_validators = {}
+
+# When each URL's CSV was last confirmed current, for the data-age metric
+data_updated_at = {}
+
+metrics_registry = MetricsRegistry()
+fetch_seconds = metrics_registry.histogram("scraper_fetch_seconds", "Time spent fetching a page.", ("market", "path"))
+parse_seconds = metrics_registry.histogram("scraper_parse_seconds", "Time spent hashing and parsing a page.", ("market",))
+write_seconds = metrics_registry.histogram("scraper_write_seconds", "Time spent writing a changed page to CSV and history.", ("market",))
+rows_parsed = metrics_registry.histogram("scraper_rows_parsed", "Rows parsed from a changed page.", ("market",), ROW_BUCKETS)
+page_bytes = metrics_registry.histogram("scraper_page_bytes", "Size of the fetched page source.", ("market",), BYTE_BUCKETS)
+pages_scraped = metrics_registry.counter("scraper_pages_total", "Pages scraped, by path and whether the CSV was rewritten.", ("market", "path", "result"))
+scrape_failures = metrics_registry.counter("scraper_failures_total", "Failed fetches and scrapes by cause; http_status and HTTP errors may still be served by Chrome.", ("market", "cause"))
+metrics_registry.callback("scraper_data_age_seconds", "Seconds since each market's CSV was last confirmed current.", collect_data_age)
+metrics_registry.callback("scraper_driver_starts_total", "Chrome drivers started per worker.", lambda: collect_driver_events("starts"), "counter")
+metrics_registry.callback("scraper_driver_restarts_total", "Chrome drivers restarted after a failed health check or dead session.", lambda: collect_driver_events("restarts"), "counter")
+metrics_registry.callback("scraper_driver_recycles_total", "Healthy Chrome drivers replaced for page count or memory.", lambda: collect_driver_events("recycles"), "counter")
+
+if __name__ == "__main__":
+    setup_logging()
+
+    if ARCHIVE_MODE == "replay":
+        replay_archive()
+        raise SystemExit
+
+    os.makedirs("output", exist_ok=True)
+
+    if METRICS_ENABLED:
+        try:
+            start_metrics_server(metrics_registry)
+        except OSError as e:
+            # A second scraper on the same box should still scrape, just without its own endpoint
+            logger.warning("Metrics endpoint not started", extra={"fields": {"error": str(e)}})
+
+    if SCHEDULER_ENABLED:
+        run_scheduler()
+    else:
+        while True:
+            run_cycle()
+
+            logger.info("Sleeping for 60 seconds before the next run")
+            time.sleep(60)
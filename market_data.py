@@ -0,0 +1,206 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+from history import market_from_filename
+from market_values import parse_money_column
+
+MARKET_DIRECTORY = "output"
+
+# Typed copy of each market CSV, written next to it as an uncompressed Arrow IPC file so it can be memory-mapped
+TYPED_EXTENSION = ".arrow"
+
+# Parsed copies of CSVs that have no current typed copy, keyed by path, modification time and size
+CACHE_DIRECTORY = os.path.join(".cache", "markets")
+# Loading is mostly memory-mapping and CSV parsing in Arrow and pandas, which release the GIL
+LOAD_WORKERS = 8
+
+# Rank fits in 16 bits (the site lists well under 65,535 companies) and Country is a dictionary-encoded code
+TYPED_SCHEMA = pa.schema([
+    ("Rank", pa.uint16()),
+    ("Name", pa.string()),
+    ("Market Cap", pa.float64()),
+    ("Price", pa.float64()),
+    ("Country", pa.dictionary(pa.int8(), pa.string())),
+])
+
+def typed_path(csv_path):
+    """Returns the typed file that sits next to a market CSV."""
+    return os.path.splitext(csv_path)[0] + TYPED_EXTENSION
+
+def typed_table(df):
+    """Converts a scraped market frame of display strings into a typed Arrow table.
+
+    Returns the table and a dict of the values per column that could not be parsed, which are
+    stored as nulls.
+    """
+    market_cap, unparseable_market_cap = parse_money_column(df["Market Cap"])
+    price, unparseable_price = parse_money_column(df["Price"])
+    rank = pd.to_numeric(df["Rank"], errors="coerce")
+    unparseable = {
+        "Rank": df["Rank"][df["Rank"].notna().to_numpy() & rank.isna().to_numpy()],
+        "Market Cap": unparseable_market_cap,
+        "Price": unparseable_price,
+    }
+
+    table = pa.table({
+        "Rank": pa.array(rank, type=pa.uint16(), from_pandas=True),
+        "Name": pa.array(df["Name"], type=pa.string(), from_pandas=True),
+        "Market Cap": pa.array(market_cap, type=pa.float64(), from_pandas=True),
+        "Price": pa.array(price, type=pa.float64(), from_pandas=True),
+        "Country": pa.array(df["Country"], type=pa.string(), from_pandas=True).dictionary_encode().cast(TYPED_SCHEMA.field("Country").type),
+    }, schema=TYPED_SCHEMA)
+    return table, {column: values for column, values in unparseable.items() if not values.empty}
+
+def write_typed(frames, csv_path):
+    """Writes the typed copy of a market CSV from one or more frames, atomically.
+
+    Each frame is converted and written as its own record batch, so only one chunk is held in
+    memory at a time. Returns the unparseable values per column, as typed_table does.
+    """
+    unparseable = {}
+    countries = []
+
+    def batches():
+        for df in frames:
+            table, table_unparseable = typed_table(df)
+            for column, values in table_unparseable.items():
+                unparseable[column] = pd.concat([unparseable[column], values]) if column in unparseable else values
+            # An IPC file holds one dictionary per column, so every batch extends the same country dictionary
+            country = encode_countries(pa.array(df["Country"], type=pa.string(), from_pandas=True), countries)
+            yield from table.set_column(table.schema.get_field_index("Country"), "Country", country).to_batches()
+
+    write_arrow_batches(batches(), TYPED_SCHEMA, typed_path(csv_path))
+    return unparseable
+
+def encode_countries(values, countries):
+    """Dictionary-encodes country codes against a dictionary shared by every batch, appending any new codes to it."""
+    countries.extend(code for code in pc.unique(values.drop_null()).to_pylist() if code not in countries)
+    dictionary = pa.array(countries, type=pa.string())
+    indices = pc.index_in(values, value_set=dictionary).cast(TYPED_SCHEMA.field("Country").type.index_type)
+    return pa.DictionaryArray.from_arrays(indices, dictionary)
+
+def write_arrow(table, path):
+    """Writes a table as an uncompressed Arrow IPC file, renaming it into place so readers never see half a file."""
+    write_arrow_batches(table.to_batches(), table.schema, path)
+
+def write_arrow_batches(batches, schema, path):
+    """Writes record batches one at a time as an uncompressed Arrow IPC file, renamed into place once complete.
+
+    A dictionary that grows from one batch to the next is written as a delta, which the file format allows.
+    """
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    options = ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+    try:
+        with pa.OSFile(temporary_path, "wb") as sink, ipc.new_file(sink, schema, options=options) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+    os.replace(temporary_path, path)
+
+def read_arrow(path):
+    """Memory-maps an Arrow IPC file as a table, without parsing anything."""
+    with pa.memory_map(path) as source:
+        return ipc.open_file(source).read_all()
+
+def has_fresh_typed(csv_path):
+    """Checks that a market's typed copy exists and was written after its CSV."""
+    path = typed_path(csv_path)
+    return os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(csv_path)
+
+def cache_path(csv_path, cache_directory=CACHE_DIRECTORY):
+    """Returns the cache file for the current state of a CSV, named after its path, mtime and size."""
+    stat = os.stat(csv_path)
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    path_key = hashlib.sha1(os.path.abspath(csv_path).encode("utf-8")).hexdigest()[:8]
+    state_key = hashlib.sha1(f"{stat.st_mtime_ns}:{stat.st_size}".encode("utf-8")).hexdigest()[:8]
+    return os.path.join(cache_directory, f"{stem}-{path_key}-{state_key}{TYPED_EXTENSION}")
+
+def cache_table(table, path):
+    """Stores a parsed table in the cache and removes the entries for older versions of the same CSV."""
+    directory = os.path.dirname(path)
+    prefix = os.path.basename(path).rsplit("-", 1)[0] + "-"
+    try:
+        os.makedirs(directory, exist_ok=True)
+        write_arrow(table, path)
+        for filename in os.listdir(directory):
+            if filename.startswith(prefix) and filename.endswith(TYPED_EXTENSION) and filename != os.path.basename(path):
+                os.remove(os.path.join(directory, filename))
+    except OSError:
+        # A read-only checkout still loads, it just parses every time
+        pass
+
+def read_market_table(csv_path, cache_directory=CACHE_DIRECTORY):
+    """Returns a market as a typed Arrow table at the lowest cost available.
+
+    The scraper's typed copy is memory-mapped when it is current. Otherwise a cached parse of this
+    exact CSV version is memory-mapped, and only a CSV that changed since it was last loaded is parsed.
+    """
+    if has_fresh_typed(csv_path):
+        return read_arrow(typed_path(csv_path))
+
+    cached = cache_path(csv_path, cache_directory)
+    if os.path.exists(cached):
+        return read_arrow(cached)
+
+    table, _ = typed_table(pd.read_csv(csv_path, dtype=str))
+    cache_table(table, cached)
+    return table
+
+def load_market(csv_path, cache_directory=CACHE_DIRECTORY):
+    """Loads a market as a typed frame with a uint16 Rank, float64 Market Cap and Price, and a categorical Country."""
+    return read_market_table(csv_path, cache_directory).to_pandas()
+
+def market_paths(markets=None, directory=MARKET_DIRECTORY):
+    """Maps each market name, like 'usa', to its CSV in the output directory, optionally only the given markets."""
+    paths = {
+        market_from_filename(filename): os.path.join(directory, filename)
+        for filename in sorted(os.listdir(directory)) if filename.endswith(".csv")
+    }
+    if markets is None:
+        return paths
+    missing = set(markets) - set(paths)
+    if missing:
+        raise FileNotFoundError(f"No CSV in '{directory}' for market(s): {', '.join(sorted(missing))}")
+    return {market: paths[market] for market in markets}
+
+def read_market_tables(markets=None, directory=MARKET_DIRECTORY, cache_directory=CACHE_DIRECTORY, max_workers=LOAD_WORKERS):
+    """Reads any set of markets, or all of them, in parallel as typed Arrow tables keyed by market."""
+    paths = market_paths(markets, directory)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(paths)))) as pool:
+        tables = pool.map(lambda path: read_market_table(path, cache_directory), paths.values())
+        return dict(zip(paths, tables))
+
+def load_markets(markets=None, directory=MARKET_DIRECTORY, cache_directory=CACHE_DIRECTORY, max_workers=LOAD_WORKERS):
+    """Loads any set of markets, or all of them, in parallel as typed frames keyed by market."""
+    tables = read_market_tables(markets, directory, cache_directory, max_workers)
+    return {market: table.to_pandas() for market, table in tables.items()}
+
+def load_all_markets(markets=None, directory=MARKET_DIRECTORY, cache_directory=CACHE_DIRECTORY, max_workers=LOAD_WORKERS):
+    """Loads markets in parallel into one typed frame with a categorical Market column.
+
+    A company listed in several markets (every US company is also in 'world') appears once per market.
+    """
+    tables = read_market_tables(markets, directory, cache_directory, max_workers)
+    if not tables:
+        return TYPED_SCHEMA.empty_table().to_pandas().assign(Market=pd.Categorical([]))
+
+    labelled = []
+    for market, table in tables.items():
+        market_column = pa.DictionaryArray.from_arrays(pa.array([0] * len(table), type=pa.int8()), pa.array([market]))
+        labelled.append(table.append_column("Market", market_column))
+    # Each table carries its own dictionaries, so they are unified before converting once
+    return pa.concat_tables(labelled).unify_dictionaries().to_pandas()
+
+def rank_across_markets(frame):
+    """Ranks a multi-market frame by market cap, keeping each company once (at its first, largest listing)."""
+    ranked = frame.sort_values("Market Cap", ascending=False, na_position="last", kind="stable")
+    ranked = ranked.drop_duplicates(subset=["Name", "Country"]).reset_index(drop=True)
+    ranked["Rank"] = pd.RangeIndex(1, len(ranked) + 1).astype("uint32")
+    return ranked
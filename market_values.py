@@ -0,0 +1,84 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Scale suffixes used for market caps on the site, as in "$3.595 T" or "$222.45 B"
+SUFFIXES = pa.array(["K", "M", "B", "T"])
+MULTIPLIERS = pa.array([1e3, 1e6, 1e9, 1e12])
+# A value split into its number and at most one scale suffix, once the dollar sign is stripped
+MONEY_PATTERN = r"^(?P<number>.*?) *(?P<suffix>[KMBT]?)$"
+# What is left of a well-formed value once the dollar sign, suffix and thousands separators are stripped
+NUMBER_PATTERN = r"^-?(?:[0-9]+\.?[0-9]*|\.[0-9]+)$"
+
+def to_arrow_strings(values):
+    """Returns a column as an Arrow string array with nulls for missing values, without copying Arrow-backed columns."""
+    try:
+        return pa.array(values, type=pa.string(), from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # An object column mixing strings with other types
+        return pa.array(values.astype(object).where(values.notna(), None).map(str, na_action="ignore"), type=pa.string(), from_pandas=True)
+
+def parse_numbers(numbers):
+    """Casts stripped number strings to float64, nulling the malformed ones instead of failing the whole column."""
+    try:
+        parsed = pc.cast(numbers, pa.float64())
+    except pa.ArrowInvalid:
+        numbers = pc.replace_substring(numbers, ",", "")
+        try:
+            parsed = pc.cast(numbers, pa.float64())
+        except pa.ArrowInvalid:
+            # Only a column with garbage in it pays for the slower validated path
+            well_formed = pc.match_substring_regex(numbers, NUMBER_PATTERN)
+            parsed = pc.cast(pc.if_else(well_formed, numbers, pa.scalar(None, pa.string())), pa.float64())
+    # The cast also accepts spellings like "nan" and "inf", which are not prices
+    return pc.if_else(pc.is_finite(parsed), parsed, pa.scalar(None, pa.float64()))
+
+def parse_money_column(values):
+    """Converts a whole column of money strings like '$3.595 T' or '$169.17' to float64 in one vectorized pass.
+
+    Returns (numbers, unparseable): numbers is a float64 Series on the same index, with NaN where
+    the value was missing or could not be parsed, and unparseable holds the original strings that
+    could not be parsed, so callers can report them instead of silently losing rows.
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(values.dtype):
+        return values.astype("float64"), values.iloc[:0].astype(object)
+
+    # Only a single suffix is split off, so a value like '3.5BT' keeps 'B' in its number and is rejected
+    parts = pc.extract_regex(pc.ascii_trim(to_arrow_strings(values), "$ "), MONEY_PATTERN)
+    multiplier = pc.take(MULTIPLIERS, pc.index_in(pc.struct_field(parts, "suffix"), value_set=SUFFIXES))
+    number = parse_numbers(pc.struct_field(parts, "number"))
+    result = pc.multiply(number, pc.fill_null(multiplier, 1.0))
+    numbers = pd.Series(result.to_numpy(zero_copy_only=False), index=values.index, dtype="float64")
+
+    unparseable = values[values.notna().to_numpy() & numbers.isna().to_numpy()]
+    return numbers, unparseable.astype(object)
+
+def describe_unparseable(column, unparseable, limit=5):
+    """Returns a one-line notice naming a column's unparseable values, or None when there are none."""
+    if unparseable.empty:
+        return None
+    examples = ", ".join(repr(value) for value in unparseable.unique()[:limit])
+    return f"{len(unparseable)} value(s) in '{column}' could not be parsed and were left empty: {examples}"
+
+def format_market_cap(value):
+    """Formats a market cap in USD the way the site displays it, like '$3.595 T' or '$222.45 B'."""
+    if pd.isna(value):
+        return ""
+    if abs(value) >= 1e12:
+        return f"${value / 1e12:.3f} T"
+    if abs(value) >= 1e9:
+        return f"${value / 1e9:.2f} B"
+    if abs(value) >= 1e6:
+        return f"${value / 1e6:.2f} M"
+    return f"${value:,.0f}"
+
+def format_price(value):
+    """Formats a price the way the site displays it, like '$236.48', '$1,234' or '$0.004512'."""
+    if pd.isna(value):
+        return ""
+    if abs(value) >= 1000:
+        return f"${value:,.0f}"
+    if abs(value) >= 1:
+        return f"${value:.2f}"
+    return f"${value:.6g}"
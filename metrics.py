@@ -0,0 +1,197 @@
+import logging
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("scraper.metrics")
+
+# Only listen on loopback by default, the endpoint is meant for a local Prometheus or node agent
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
+
+# Bucket upper bounds, in seconds for timings
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40)
+ROW_BUCKETS = (0, 10, 50, 100, 250, 500, 1000, 5000, 10000)
+BYTE_BUCKETS = (1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7)
+
+def format_value(value):
+    """Formats a sample value the way the Prometheus text format expects."""
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def format_labels(labels):
+    """Renders a label dict as {name="value",...}, escaping the characters the format reserves."""
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+class Metric:
+    """Base for a named metric family whose samples are keyed by their label values."""
+
+    type_name = "untyped"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def key(self, labels):
+        """Returns the label values in declaration order, rejecting unknown or missing labels."""
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """Returns (suffix, labels, value) for every sample of the family."""
+        with self.lock:
+            return [("", dict(zip(self.labelnames, key)), value) for key, value in sorted(self.values.items())]
+
+    def render(self):
+        """Renders the family in the Prometheus text exposition format."""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_name}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{format_labels(labels)} {format_value(value)}")
+        return lines
+
+class Counter(Metric):
+    """A value that only goes up, like pages scraped or failures."""
+
+    type_name = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(Metric):
+    """A value that can go up and down."""
+
+    type_name = "gauge"
+
+    def set(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = value
+
+class CallbackMetric(Metric):
+    """A metric computed when it is scraped, from a function returning (labels, value) pairs.
+
+    Used for values that are only meaningful at read time, like how old a market's data is now,
+    or that another object already counts, like driver restarts.
+    """
+
+    def __init__(self, name, help_text, collect, type_name="gauge"):
+        super().__init__(name, help_text)
+        self.collect = collect
+        self.type_name = type_name
+
+    def samples(self):
+        return [("", labels, value) for labels, value in self.collect()]
+
+class Histogram(Metric):
+    """Counts observations into cumulative buckets, so percentiles can be computed by Prometheus."""
+
+    type_name = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self.values[key] = (counts, total + value)
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            for key, (counts, total) in sorted(self.values.items()):
+                labels = dict(zip(self.labelnames, key))
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    samples.append(("_bucket", {**labels, "le": format_value(bound)}, cumulative))
+                samples.append(("_sum", labels, total))
+                samples.append(("_count", labels, cumulative))
+        return samples
+
+class MetricsRegistry:
+    """Holds every metric family the process exposes and renders them together."""
+
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self.register(Gauge(name, help_text, labelnames))
+
+    def callback(self, name, help_text, collect, type_name="gauge"):
+        return self.register(CallbackMetric(name, help_text, collect, type_name))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DURATION_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self):
+        """Renders every registered family as one Prometheus text exposition."""
+        with self.lock:
+            metrics = list(self.metrics)
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # A broken callback should cost one family, not the whole scrape
+                logger.warning("Metric collection failed", extra={"fields": {"metric": metric.name, "error": str(e)}})
+        return "\n".join(lines) + "\n"
+
+def start_metrics_server(registry, host=METRICS_HOST, port=METRICS_PORT):
+    """Serves the registry on http://host:port/metrics from a background thread and returns the server."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Prometheus scrapes every few seconds, so request lines only go to DEBUG
+            logger.debug("Metrics request", extra={"fields": {"client": self.client_address[0], "request": format % args}})
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info("Metrics endpoint listening", extra={"fields": {"url": f"http://{host}:{server.server_address[1]}/metrics"}})
+    return server
+
+def seconds_since(timestamp, now=None):
+    """Returns how many seconds ago a Unix timestamp was."""
+    return max(0.0, (now or time.time()) - timestamp)
@@ -0,0 +1,232 @@
+import argparse
+import json
+import sys
+import time
+import numpy as np
+import pandas as pd
+from rich.console import Console
+from rich.table import Table
+from rich.style import Style
+from market_data import MARKET_DIRECTORY, load_all_markets, rank_across_markets
+from market_values import format_market_cap, format_price, parse_money_column
+
+# Columns with a sorted index for range filters, and the columns with a hash index for exact matches
+RANGE_COLUMNS = ("Market Cap", "Price", "Rank")
+HASH_COLUMNS = ("Country", "Market")
+PAGE_SIZE = 50
+# The direction each sort column runs in unless one is asked for: biggest values first, rank 1 and A first
+SORT_DESCENDING = {"Market Cap": True, "Price": True, "Rank": False, "Name": False}
+
+class ScreenEngine:
+    """Holds every market in memory with indexes, so a screen touches only the rows it can match.
+
+    Range filters binary-search a sorted copy of their column, country and market filters look up
+    the rows in a hash index, and name prefixes binary-search the sorted lower-cased names. The most
+    selective filter picks the candidate rows, and the remaining filters are only checked on those.
+    """
+
+    def __init__(self, frame):
+        self.frame = frame.reset_index(drop=True)
+        self.columns = {column: self.frame[column].to_numpy(dtype="float64", na_value=np.nan) for column in RANGE_COLUMNS}
+
+        # Sorted (values, row ids) per range column, leaving out rows where the value is missing
+        self.sorted_indexes = {}
+        for column, values in self.columns.items():
+            present = np.flatnonzero(~np.isnan(values))
+            order = present[np.argsort(values[present], kind="stable")]
+            self.sorted_indexes[column] = (values[order], order)
+
+        self.hash_indexes = {}
+        for column in HASH_COLUMNS:
+            if column in self.frame.columns:
+                codes = self.frame[column].astype(str).str.upper()
+                self.hash_indexes[column] = {key: np.sort(rows) for key, rows in codes.groupby(codes).indices.items()}
+
+        names = self.frame["Name"].astype(str).str.lower().to_numpy()
+        name_order = np.argsort(names, kind="stable")
+        self.name_index = (names[name_order], name_order)
+        self.names = names
+
+    @classmethod
+    def from_output(cls, directory=MARKET_DIRECTORY, unique=False):
+        """Builds an engine over every market in the output directory, optionally listing each company once."""
+        frame = load_all_markets(directory=directory)
+        return cls(rank_across_markets(frame) if unique else frame)
+
+    def range_rows(self, column, low=None, high=None):
+        """Returns the rows whose value lies in [low, high], using the column's sorted index."""
+        values, order = self.sorted_indexes[column]
+        start = 0 if low is None else np.searchsorted(values, low, side="left")
+        stop = len(values) if high is None else np.searchsorted(values, high, side="right")
+        return order[start:stop]
+
+    def hash_rows(self, column, keys):
+        """Returns the rows whose value is one of keys, using the column's hash index."""
+        index = self.hash_indexes.get(column, {})
+        matches = [index[key.upper()] for key in keys if key.upper() in index]
+        if not matches:
+            return np.empty(0, dtype=np.intp)
+        return np.sort(np.concatenate(matches)) if len(matches) > 1 else matches[0]
+
+    def prefix_rows(self, prefix):
+        """Returns the rows whose name starts with prefix, ignoring case, using the sorted name index."""
+        names, order = self.name_index
+        prefix = prefix.lower()
+        start = np.searchsorted(names, prefix, side="left")
+        stop = np.searchsorted(names, prefix + "\U0010ffff", side="left")
+        return order[start:stop]
+
+    def candidate_filters(self, market_cap, price, rank, countries, markets, name_prefix):
+        """Lists each active filter as (row lookup, check on candidate rows)."""
+        filters = []
+        for column, bounds in (("Market Cap", market_cap), ("Price", price), ("Rank", rank)):
+            if bounds is not None and bounds != (None, None):
+                low, high = bounds
+                values = self.columns[column]
+                filters.append((
+                    lambda column=column, low=low, high=high: self.range_rows(column, low, high),
+                    lambda rows, values=values, low=low, high=high: (
+                        (values[rows] >= (-np.inf if low is None else low)) & (values[rows] <= (np.inf if high is None else high))
+                    ),
+                ))
+        for column, keys in (("Country", countries), ("Market", markets)):
+            if keys:
+                filters.append((
+                    lambda column=column, keys=keys: self.hash_rows(column, keys),
+                    lambda rows, column=column, keys=keys: np.isin(rows, self.hash_rows(column, keys)),
+                ))
+        if name_prefix:
+            prefix = name_prefix.lower()
+            filters.append((
+                lambda: self.prefix_rows(prefix),
+                lambda rows: np.char.startswith(self.names[rows].astype(str), prefix),
+            ))
+        return filters
+
+    def query(self, market_cap=None, price=None, rank=None, countries=None, markets=None, name_prefix=None,
+              sort_by="Market Cap", descending=None, page=1, page_size=PAGE_SIZE):
+        """Screens every loaded row and returns (total matches, one page of matching rows).
+
+        market_cap, price and rank are (low, high) bounds where either side may be None;
+        countries and markets are lists of codes matched case-insensitively. descending=None sorts
+        in the column's direction from SORT_DESCENDING.
+        """
+        if descending is None:
+            descending = SORT_DESCENDING.get(sort_by, True)
+        filters = self.candidate_filters(market_cap, price, rank, countries, markets, name_prefix)
+        if filters:
+            # Start from the smallest candidate set and only check the other filters on it
+            candidate_sets = [(lookup(), check) for lookup, check in filters]
+            candidate_sets.sort(key=lambda candidates: len(candidates[0]))
+            rows = candidate_sets[0][0]
+            for _, check in candidate_sets[1:]:
+                if not len(rows):
+                    break
+                rows = rows[check(rows)]
+        else:
+            rows = np.arange(len(self.frame))
+
+        if sort_by in self.columns:
+            keys = self.columns[sort_by][rows]
+            # Missing values go last in either direction
+            keys = np.where(np.isnan(keys), -np.inf if descending else np.inf, keys)
+            order = np.argsort(-keys if descending else keys, kind="stable")
+        else:
+            order = np.argsort(self.names[rows], kind="stable")
+            if descending:
+                order = order[::-1]
+
+        start = (max(page, 1) - 1) * page_size
+        page_rows = rows[order[start:start + page_size]]
+        return len(rows), self.frame.iloc[page_rows]
+
+def parse_bounds(text, money=False):
+    """Parses a 'low:high' range where either side may be empty, like '100 B:' or ':50'."""
+    if text is None:
+        return None
+    low, _, high = text.partition(":")
+    def parse(value):
+        if not value.strip():
+            return None
+        if money:
+            numbers, unparseable = parse_money_column(pd.Series([value]))
+            if not unparseable.empty:
+                raise argparse.ArgumentTypeError(f"not an amount: {value!r}")
+            return float(numbers.iloc[0])
+        return float(value)
+    return parse(low), parse(high)
+
+def display_results(results, total, page, page_size, elapsed):
+    """Displays one page of screen results in a table."""
+    console = Console()
+    header_style = Style(color="white", bold=True)
+    pages = max(1, -(-total // page_size))
+    table = Table(title=f"{total:,} matches, page {page} of {pages} ({elapsed * 1000:.1f} ms)", show_header=True, header_style=header_style)
+
+    table.add_column("Rank", justify="center")
+    table.add_column("Name", justify="left")
+    table.add_column("Market Cap", justify="right")
+    table.add_column("Price", justify="right")
+    table.add_column("Country", justify="center")
+    if "Market" in results.columns:
+        table.add_column("Market", justify="left")
+
+    for record in results.to_dict("records"):
+        row = [str(record["Rank"]), record["Name"], format_market_cap(record["Market Cap"]), format_price(record["Price"]), str(record["Country"])]
+        if "Market" in results.columns:
+            row.append(str(record["Market"]))
+        table.add_row(*row)
+
+    console.print(table)
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Screens every scraped market without opening the viewer.")
+    parser.add_argument("--market-cap", help="market-cap range as low:high, e.g. '100 B:1 T' or '1e12:'")
+    parser.add_argument("--price", help="price range as low:high, e.g. '10:' or ':$5'")
+    parser.add_argument("--rank", help="rank band within each market as low:high, e.g. '1:20'")
+    parser.add_argument("--country", action="append", help="country code, e.g. US (repeatable)")
+    parser.add_argument("--market", action="append", help="market name, e.g. usa (repeatable)")
+    parser.add_argument("--name", help="company name prefix, case-insensitive")
+    parser.add_argument("--unique", action="store_true", help="list each company once, ranked across markets")
+    parser.add_argument("--sort", default="Market Cap", choices=list(SORT_DESCENDING),
+                        help="sort column; Market Cap and Price sort largest first, Rank and Name ascending")
+    direction = parser.add_mutually_exclusive_group()
+    direction.add_argument("--ascending", dest="descending", action="store_false", default=None,
+                           help="sort smallest first, whatever the column")
+    direction.add_argument("--descending", dest="descending", action="store_true", default=None,
+                           help="sort largest first, whatever the column")
+    parser.add_argument("--page", type=int, default=1)
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    parser.add_argument("--format", default="table", choices=["table", "csv", "json"])
+    parser.add_argument("--directory", default=MARKET_DIRECTORY)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    try:
+        market_cap = parse_bounds(arguments.market_cap, money=True)
+        price = parse_bounds(arguments.price, money=True)
+        rank = parse_bounds(arguments.rank)
+    except (argparse.ArgumentTypeError, ValueError) as e:
+        sys.exit(f"Invalid range: {e}")
+
+    engine = ScreenEngine.from_output(arguments.directory, unique=arguments.unique)
+    start_time = time.perf_counter()
+    total, results = engine.query(
+        market_cap=market_cap, price=price, rank=rank, countries=arguments.country, markets=arguments.market,
+        name_prefix=arguments.name, sort_by=arguments.sort, descending=arguments.descending,
+        page=arguments.page, page_size=arguments.page_size,
+    )
+    elapsed = time.perf_counter() - start_time
+
+    if arguments.format == "csv":
+        results.to_csv(sys.stdout, index=False)
+    elif arguments.format == "json":
+        json.dump({"total": total, "page": arguments.page, "page_size": arguments.page_size,
+                   "results": json.loads(results.to_json(orient="records"))}, sys.stdout, indent=2)
+        print()
+    else:
+        display_results(results, total, arguments.page, arguments.page_size, elapsed)
+
+if __name__ == "__main__":
+    main()
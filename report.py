@@ -0,0 +1,225 @@
+import argparse
+import html
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+from rich.console import Console
+from rich.table import Table
+from rich.style import Style
+from charts import TOP_N, chart_labels, correlation_matrix, draw_heatmap, top_companies
+from market_data import MARKET_DIRECTORY, load_all_markets, load_market, market_paths, rank_across_markets
+from market_values import describe_unparseable
+
+REPORT_DIRECTORY = "reports"
+FORMATS = ("png", "svg")
+# Rendering is CPU-bound in matplotlib, so one process per core
+REPORT_WORKERS = os.cpu_count() or 1
+# Name of the cross-market report entry, ranked with each company once
+ALL_MARKETS = "all"
+
+# Text stays text in SVGs, which keeps them small and fast to write
+matplotlib.rcParams["svg.fonttype"] = "none"
+
+# Figures of each worker process, created on first use and reused for every market after that
+figures = {}
+
+class TopChart:
+    """A top-N bar chart whose bars, labels and title are updated in place for each market.
+
+    Margins are set from the label lengths instead of tight_layout, which would draw the whole
+    figure once more just to measure it.
+    """
+
+    def __init__(self, top_n):
+        self.fig, self.ax = plt.subplots(figsize=(10, 15))
+        self.positions = np.arange(top_n)
+        self.bars = self.ax.barh(self.positions, np.zeros(top_n), color="blue")
+        self.ax.set_xlabel("Market Cap (in USD)")
+        self.ax.grid(axis="x", linestyle="--", alpha=0.7)
+
+    def update(self, top, title):
+        widths = top["Market Cap (Numeric)"].to_numpy()
+        for position, bar in enumerate(self.bars):
+            bar.set_visible(position < len(widths))
+            if position < len(widths):
+                bar.set_width(widths[position])
+        labels = chart_labels(top)
+        self.ax.set_yticks(self.positions[:len(labels)], labels)
+        # Largest at the top
+        self.ax.set_ylim(max(len(labels), 1) - 0.5, -0.5)
+        self.ax.set_xlim(0, widths.max() * 1.05 if len(widths) else 1)
+        self.ax.set_title(title)
+        longest = max((len(label) for label in labels), default=0)
+        self.fig.subplots_adjust(left=min(0.6, 0.04 + 0.0075 * longest), right=0.97, top=0.97, bottom=0.04)
+        return self.fig
+
+def get_top_chart(top_n):
+    """Returns this process's reusable bar chart for top_n companies."""
+    if ("top", top_n) not in figures:
+        figures[("top", top_n)] = TopChart(top_n)
+    return figures[("top", top_n)]
+
+def get_heatmap_figure():
+    """Returns this process's reusable heatmap figure, with its axes cleared."""
+    if "heatmap" not in figures:
+        fig, (ax, cbar_ax) = plt.subplots(1, 2, figsize=(7, 5.5), gridspec_kw={"width_ratios": [20, 1]})
+        fig.subplots_adjust(left=0.16, right=0.92, top=0.92, bottom=0.1, wspace=0.08)
+        figures["heatmap"] = (fig, ax, cbar_ax)
+    fig, ax, cbar_ax = figures["heatmap"]
+    ax.clear()
+    cbar_ax.clear()
+    return fig, ax, cbar_ax
+
+def save_figure(fig, directory, name, formats):
+    """Writes a figure once per format and returns the file names."""
+    filenames = []
+    for extension in formats:
+        filename = f"{name}.{extension}"
+        fig.savefig(os.path.join(directory, filename), format=extension)
+        filenames.append(filename)
+    return filenames
+
+def render_market(market, source, directory, formats=FORMATS, top_n=TOP_N):
+    """Renders one market's top-N chart and correlation heatmap into directory, and returns what was written.
+
+    source is the market's CSV, or the whole market directory for the ALL_MARKETS entry.
+    """
+    start_time = time.perf_counter()
+    if market == ALL_MARKETS:
+        data = rank_across_markets(load_all_markets(directory=source))
+    else:
+        data = load_market(source)
+    top, unparseable = top_companies(data, top_n)
+
+    fig = get_top_chart(top_n).update(top, f"Top {len(top)} Companies by Market Cap ({market})")
+    charts = {"top": save_figure(fig, directory, f"{market}_top", formats)}
+
+    matrix = correlation_matrix(data)
+    if matrix is not None:
+        fig, ax, cbar_ax = get_heatmap_figure()
+        draw_heatmap(ax, matrix, f"Correlation Heatmap ({market})", cbar_ax=cbar_ax)
+        charts["heatmap"] = save_figure(fig, directory, f"{market}_heatmap", formats)
+
+    return {
+        "market": market,
+        "rows": len(data),
+        "charts": charts,
+        "notice": describe_unparseable("Market Cap", unparseable),
+        "seconds": time.perf_counter() - start_time,
+    }
+
+def write_index(results, directory, elapsed):
+    """Writes a static index.html linking every market's charts, and returns its path."""
+    sections = []
+    for result in results:
+        market = html.escape(result["market"])
+        images = []
+        for kind in ("top", "heatmap"):
+            filenames = result["charts"].get(kind)
+            if not filenames:
+                continue
+            links = " | ".join(f'<a href="{html.escape(filename)}">{html.escape(filename.rsplit(".", 1)[1].upper())}</a>' for filename in filenames)
+            preview = next((filename for filename in filenames if filename.endswith(".png")), filenames[0])
+            images.append(f'<figure><a href="{html.escape(preview)}"><img src="{html.escape(preview)}" loading="lazy" alt="{market} {kind}"></a><figcaption>{links}</figcaption></figure>')
+        notice = f'<p class="notice">{html.escape(result["notice"])}</p>' if result["notice"] else ""
+        sections.append(f'<section id="{market}"><h2>{market} <small>{result["rows"]:,} companies</small></h2>{notice}{"".join(images)}</section>')
+
+    contents = "".join(f'<a href="#{html.escape(result["market"])}">{html.escape(result["market"])}</a> ' for result in results)
+    page = f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>Screener report</title>
+<style>
+body {{ font-family: sans-serif; margin: 2em; }}
+figure {{ display: inline-block; margin: 0 1em 1em 0; vertical-align: top; }}
+img {{ max-height: 480px; border: 1px solid #ddd; }}
+.notice {{ color: #b00; }}
+</style>
+</head>
+<body>
+<h1>Screener report</h1>
+<p>Generated {datetime.now():%Y-%m-%d %H:%M:%S} for {len(results)} markets in {elapsed:.1f} s.</p>
+<nav>{contents}</nav>
+{"".join(sections)}
+</body>
+</html>
+"""
+    path = os.path.join(directory, "index.html")
+    with open(path, "w", encoding="utf-8") as index_file:
+        index_file.write(page)
+    return path
+
+def generate_report(markets=None, directory=MARKET_DIRECTORY, output_directory=REPORT_DIRECTORY, formats=FORMATS,
+                    top_n=TOP_N, workers=REPORT_WORKERS, include_all=True):
+    """Renders charts for every market (or the given ones) across a process pool and writes the HTML index.
+
+    The cross-market entry is included with every market, or when ALL_MARKETS is one of the given markets.
+    Returns (results, index path, elapsed seconds).
+    """
+    start_time = time.perf_counter()
+    if markets is not None:
+        include_all = ALL_MARKETS in markets
+        markets = [market for market in markets if market != ALL_MARKETS]
+    jobs = market_paths(markets, directory)
+    if include_all:
+        jobs = {ALL_MARKETS: directory, **jobs}
+    os.makedirs(output_directory, exist_ok=True)
+
+    if workers <= 1:
+        results = [render_market(market, path, output_directory, formats, top_n) for market, path in jobs.items()]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            futures = [pool.submit(render_market, market, path, output_directory, formats, top_n) for market, path in jobs.items()]
+            results = [future.result() for future in futures]
+
+    elapsed = time.perf_counter() - start_time
+    return results, write_index(results, output_directory, elapsed), elapsed
+
+def display_report_summary(results, index_path, elapsed):
+    """Displays per-market rendering times and where the report was written."""
+    console = Console()
+    header_style = Style(color="white", bold=True)
+    table = Table(title=f"Report: {len(results)} markets in {elapsed:.1f} s", show_header=True, header_style=header_style)
+    table.add_column("Market", justify="left")
+    table.add_column("Companies", justify="right")
+    table.add_column("Charts", justify="right")
+    table.add_column("Seconds", justify="right")
+    for result in results:
+        charts = sum(len(filenames) for filenames in result["charts"].values())
+        table.add_row(result["market"], f"{result['rows']:,}", str(charts), f"{result['seconds']:.2f}")
+    console.print(table)
+    for result in results:
+        if result["notice"]:
+            console.print(f"{result['market']}: {result['notice']}")
+    console.print(f"Index written to {index_path}")
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Renders top-N charts and correlation heatmaps for every market, with an HTML index.")
+    parser.add_argument("markets", nargs="*", help="markets to render, e.g. usa china all (default: every market plus the cross-market 'all')")
+    parser.add_argument("--top", type=int, default=TOP_N, help="companies per bar chart")
+    parser.add_argument("--formats", nargs="+", default=list(FORMATS), choices=["png", "svg", "pdf"])
+    parser.add_argument("--workers", type=int, default=REPORT_WORKERS)
+    parser.add_argument("--directory", default=MARKET_DIRECTORY)
+    parser.add_argument("--output", default=REPORT_DIRECTORY)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    try:
+        results, index_path, elapsed = generate_report(
+            markets=arguments.markets or None, directory=arguments.directory, output_directory=arguments.output,
+            formats=arguments.formats, top_n=arguments.top, workers=arguments.workers,
+        )
+    except FileNotFoundError as e:
+        print(e)
+        return
+    display_report_summary(results, index_path, elapsed)
+
+if __name__ == "__main__":
+    main()
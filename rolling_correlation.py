@@ -0,0 +1,157 @@
+from collections import deque
+import numpy as np
+import pandas as pd
+from history import HISTORY_DIRECTORY, load_history
+from market_values import parse_money_column
+
+# Number of most recent snapshot-to-snapshot returns the matrices cover
+ROLLING_WINDOW = 60
+
+class RollingCorrelation:
+    """Rolling covariance and correlation of returns over the last window snapshots, updated online.
+
+    The mean return of each company and the co-moment matrix of the window are kept with Welford's
+    update. Each new snapshot adds its return vector and drops the one leaving the window. That costs
+    one rank-two update of an N x N matrix, with no recomputation over the window.
+
+    The set of companies is fixed when the first snapshot arrives, unless it is given. A company that
+    is missing from a snapshot keeps its last value, so its return for that step is zero. A company
+    that first appears later is ignored.
+    """
+
+    def __init__(self, assets=None, window=ROLLING_WINDOW):
+        self.window = window
+        self.assets = None
+        self.returns = deque()
+        self.count = 0
+        self.updated_at = None
+        if assets is not None:
+            self.set_assets(assets)
+
+    def set_assets(self, assets):
+        size = len(assets)
+        self.assets = pd.Index(assets)
+        self.last_values = np.full(size, np.nan)
+        self.mean = np.zeros(size)
+        self.comoment = np.zeros((size, size))
+        # Scratch space for the rank-one updates, so no N x N temporary is allocated per snapshot
+        self.outer = np.empty((size, size))
+
+    def add(self, values):
+        """Adds one return vector to the window statistics."""
+        self.count += 1
+        delta = values - self.mean
+        self.mean += delta / self.count
+        np.multiply.outer(delta, values - self.mean, out=self.outer)
+        self.comoment += self.outer
+
+    def remove(self, values):
+        """Removes one return vector from the window statistics, undoing its add."""
+        self.count -= 1
+        if self.count == 0:
+            self.mean[:] = 0
+            self.comoment[:] = 0
+            return
+        delta = values - self.mean
+        self.mean -= delta / self.count
+        np.multiply.outer(delta, values - self.mean, out=self.outer)
+        self.comoment -= self.outer
+
+    def slide(self, values, oldest):
+        """Adds one return vector and removes the oldest, as a single rank-two update of the co-moments."""
+        delta_in = values - self.mean
+        self.mean += delta_in / (self.count + 1)
+        spread_in = values - self.mean
+        delta_out = oldest - self.mean
+        self.mean -= delta_out / self.count
+        spread_out = oldest - self.mean
+        # One BLAS product writes both outer products at once, so the matrix is only swept twice
+        np.matmul(np.stack([delta_in, -delta_out], axis=1), np.stack([spread_in, spread_out]), out=self.outer)
+        self.comoment += self.outer
+
+    def update(self, values, scraped_at=None):
+        """Feeds the next snapshot, a Series of market caps or prices keyed by company."""
+        if self.assets is None:
+            self.set_assets(values.index[values.notna().to_numpy()].unique())
+        current = values[~values.index.duplicated()].reindex(self.assets).to_numpy(dtype="float64", na_value=np.nan)
+        return self.update_values(current, scraped_at)
+
+    def update_values(self, current, scraped_at=None):
+        """Feeds the next snapshot as an array aligned with assets, with NaN for missing companies."""
+        current = np.where(np.isnan(current), self.last_values, current)
+
+        if not np.isnan(self.last_values).all():
+            with np.errstate(divide="ignore", invalid="ignore"):
+                returns = current / self.last_values - 1.0
+            # A company without two prices yet, or with a zero price, contributes no return
+            returns[~np.isfinite(returns)] = 0.0
+            self.returns.append(returns)
+            if len(self.returns) > self.window:
+                self.slide(returns, self.returns.popleft())
+            else:
+                self.add(returns)
+
+        self.last_values = current
+        self.updated_at = scraped_at
+        return self
+
+    def covariance_matrix(self):
+        """Returns the sample covariance of returns over the window as a NumPy array."""
+        if self.count < 2:
+            return np.full_like(self.comoment, np.nan)
+        return self.comoment / (self.count - 1)
+
+    def correlation_matrix(self):
+        """Returns the correlation of returns over the window as a NumPy array, NaN for companies that did not move."""
+        covariance = self.covariance_matrix()
+        deviation = np.sqrt(np.clip(np.diag(covariance), 0, None))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            correlation = covariance / np.multiply.outer(deviation, deviation)
+        correlation[:, deviation == 0] = np.nan
+        correlation[deviation == 0, :] = np.nan
+        return np.clip(correlation, -1.0, 1.0)
+
+    def covariance(self, assets=None):
+        """Returns the covariance matrix as a DataFrame, optionally only for some companies."""
+        return self.frame(self.covariance_matrix(), assets)
+
+    def correlation(self, assets=None):
+        """Returns the correlation matrix as a DataFrame, optionally only for some companies."""
+        return self.frame(self.correlation_matrix(), assets)
+
+    def frame(self, matrix, assets):
+        if assets is None:
+            return pd.DataFrame(matrix, index=self.assets, columns=self.assets)
+        positions = self.assets.get_indexer(assets)
+        positions = positions[positions >= 0]
+        return pd.DataFrame(matrix[np.ix_(positions, positions)], index=self.assets[positions], columns=self.assets[positions])
+
+def snapshot_values(history, column="Market Cap"):
+    """Turns a history frame into one row per snapshot and one column per company, parsed to float64."""
+    values, _ = parse_money_column(history[column])
+    frame = pd.DataFrame({"scraped_at": history["scraped_at"].to_numpy(), "Name": history["Name"].to_numpy(), "value": values.to_numpy()})
+    return frame.pivot_table(index="scraped_at", columns="Name", values="value", aggfunc="last", sort=True)
+
+def rolling_from_history(market, column="Market Cap", window=ROLLING_WINDOW, start=None, end=None, rolling=None, directory=HISTORY_DIRECTORY):
+    """Feeds every snapshot of a market in [start, end) into a RollingCorrelation, oldest first, and returns it.
+
+    Pass the returned object back as rolling with start set to its updated_at to pick up only newer snapshots.
+    """
+    rolling = rolling or RollingCorrelation(window=window)
+    history = load_history(market=market, start=start, end=end, columns=["scraped_at", "Name", column], directory=directory)
+    if history.empty:
+        return rolling
+    snapshots = snapshot_values(history, column)
+    if rolling.updated_at is not None:
+        snapshots = snapshots[snapshots.index > rolling.updated_at]
+    if snapshots.empty:
+        return rolling
+    if rolling.assets is None:
+        first = snapshots.iloc[0]
+        rolling.set_assets(first.index[first.notna().to_numpy()])
+
+    # Aligned once, so each snapshot is a plain row of the array
+    values = snapshots.reindex(columns=rolling.assets).to_numpy(dtype="float64", na_value=np.nan)
+    for scraped_at, row in zip(snapshots.index, values):
+        rolling.update_values(row, scraped_at)
+    return rolling
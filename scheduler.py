@@ -0,0 +1,163 @@
+import heapq
+import threading
+import time
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+# How stale each market may get while its data is moving, in seconds
+DEFAULT_TARGET_FRESHNESS = 180
+TARGET_FRESHNESS = {
+    "world": 60,
+    "usa": 60,
+    "china": 60,
+    "eu": 90,
+    "japan": 90,
+    "india": 90,
+    "uk": 90,
+    "germany": 90,
+}
+
+# Unchanged pages back off up to this interval while the exchange is open
+MAX_OPEN_INTERVAL = 15 * 60
+# Market caps are quoted in USD, so currency moves still change closed markets, just slowly
+CLOSED_INTERVAL = 30 * 60
+BACKOFF_FACTOR = 2
+
+# Global request budget shared by every market
+REQUESTS_PER_MINUTE = 60
+
+WEEKDAYS = (0, 1, 2, 3, 4)
+SUNDAY_TO_THURSDAY = (6, 0, 1, 2, 3)
+
+# Regular session of each market's main exchange in local time; None means the page spans many exchanges
+market_hours = {
+    "world": None,
+    "eu": None,
+    "usa": ("America/New_York", "09:30", "16:00", WEEKDAYS),
+    "canada": ("America/Toronto", "09:30", "16:00", WEEKDAYS),
+    "mexico": ("America/Mexico_City", "08:30", "15:00", WEEKDAYS),
+    "brazil": ("America/Sao_Paulo", "10:00", "17:00", WEEKDAYS),
+    "chile": ("America/Santiago", "09:30", "16:00", WEEKDAYS),
+    "germany": ("Europe/Berlin", "09:00", "17:30", WEEKDAYS),
+    "uk": ("Europe/London", "08:00", "16:30", WEEKDAYS),
+    "france": ("Europe/Paris", "09:00", "17:30", WEEKDAYS),
+    "spain": ("Europe/Madrid", "09:00", "17:30", WEEKDAYS),
+    "netherlands": ("Europe/Amsterdam", "09:00", "17:30", WEEKDAYS),
+    "sweden": ("Europe/Stockholm", "09:00", "17:30", WEEKDAYS),
+    "italy": ("Europe/Rome", "09:00", "17:30", WEEKDAYS),
+    "switzerland": ("Europe/Zurich", "09:00", "17:30", WEEKDAYS),
+    "poland": ("Europe/Warsaw", "09:00", "17:00", WEEKDAYS),
+    "finland": ("Europe/Helsinki", "10:00", "18:30", WEEKDAYS),
+    "china": ("Asia/Shanghai", "09:30", "15:00", WEEKDAYS),
+    "japan": ("Asia/Tokyo", "09:00", "15:30", WEEKDAYS),
+    "south_korea": ("Asia/Seoul", "09:00", "15:30", WEEKDAYS),
+    "hong_kong": ("Asia/Hong_Kong", "09:30", "16:00", WEEKDAYS),
+    "singapore": ("Asia/Singapore", "09:00", "17:00", WEEKDAYS),
+    "indonesia": ("Asia/Jakarta", "09:00", "16:00", WEEKDAYS),
+    "india": ("Asia/Kolkata", "09:15", "15:30", WEEKDAYS),
+    "malaysia": ("Asia/Kuala_Lumpur", "09:00", "17:00", WEEKDAYS),
+    "taiwan": ("Asia/Taipei", "09:00", "13:30", WEEKDAYS),
+    "thailand": ("Asia/Bangkok", "10:00", "16:30", WEEKDAYS),
+    "australia": ("Australia/Sydney", "10:00", "16:00", WEEKDAYS),
+    "new_zealand": ("Pacific/Auckland", "10:00", "16:45", WEEKDAYS),
+    "israel": ("Asia/Jerusalem", "09:59", "17:25", WEEKDAYS),
+    "saudi_arabia": ("Asia/Riyadh", "10:00", "15:00", SUNDAY_TO_THURSDAY),
+    "turkey": ("Europe/Istanbul", "10:00", "18:00", WEEKDAYS),
+    "russia": ("Europe/Moscow", "10:00", "18:50", WEEKDAYS),
+    "south_africa": ("Africa/Johannesburg", "09:00", "17:00", WEEKDAYS),
+}
+
+def is_market_open(market, now=None):
+    """Checks whether a market's main exchange is in its regular session (holidays are not tracked)."""
+    hours = market_hours.get(market)
+    if hours is None:
+        return True
+
+    zone, open_time, close_time, trading_days = hours
+    local_now = (now or datetime.now(timezone.utc)).astimezone(ZoneInfo(zone))
+    if local_now.weekday() not in trading_days:
+        return False
+    return open_time <= local_now.strftime("%H:%M") < close_time
+
+class RefreshScheduler:
+    """Hands out URLs in order of when they are due, adapting each URL's interval to how often it changes.
+
+    A page that changed is refreshed again after its market's target freshness. Each unchanged
+    refresh doubles the interval up to MAX_OPEN_INTERVAL, and a closed exchange is only checked every
+    CLOSED_INTERVAL. Every page request, not every refresh, takes a token from one request budget
+    shared by all URLs, so a deep scrape or a browser fallback pays for each page it fetches.
+    """
+
+    def __init__(self, url_markets, requests_per_minute=REQUESTS_PER_MINUTE, burst=None):
+        self.url_markets = dict(url_markets)
+        self.intervals = {url: self.target_freshness(url) for url in self.url_markets}
+        self.condition = threading.Condition()
+
+        # Everything is due now, in the order the URLs were given
+        now = time.monotonic()
+        self.due = [(now, order, url) for order, url in enumerate(self.url_markets)]
+        heapq.heapify(self.due)
+        self.order = len(self.due)
+
+        self.rate = requests_per_minute / 60
+        self.capacity = burst or max(1, requests_per_minute // 6)
+        self.tokens = self.capacity
+        self.last_refill = now
+
+    def target_freshness(self, url):
+        """Returns how stale the URL's market may get while its data is moving."""
+        return TARGET_FRESHNESS.get(self.url_markets[url], DEFAULT_TARGET_FRESHNESS)
+
+    def refill_tokens(self, now):
+        """Adds the request tokens earned since the last refill."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def next_url(self):
+        """Blocks until a URL is due, then hands it out. Its page requests are paid for with take_request."""
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                if self.due and self.due[0][0] <= now:
+                    return heapq.heappop(self.due)[2]
+                # A URL handed back by a worker may be due sooner, so wake up on notify as well
+                self.condition.wait(timeout=self.due[0][0] - now if self.due else None)
+
+    def take_request(self):
+        """Blocks until the request budget has a token for one page request, then takes it."""
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                self.refill_tokens(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                self.condition.wait(timeout=(1 - self.tokens) / self.rate)
+
+    def record_result(self, url, changed, failed=False):
+        """Schedules a URL's next refresh based on whether its data changed."""
+        target = self.target_freshness(url)
+
+        with self.condition:
+            market_open = is_market_open(self.url_markets[url])
+            if market_open and self.intervals[url] == CLOSED_INTERVAL:
+                # The exchange has just opened, so back off from the target again, not from the closed interval
+                self.intervals[url] = target
+
+            if not market_open:
+                interval = CLOSED_INTERVAL
+            elif changed or failed:
+                interval = target
+            else:
+                interval = min(max(self.intervals[url], target) * BACKOFF_FACTOR, MAX_OPEN_INTERVAL)
+            self.intervals[url] = interval
+
+            heapq.heappush(self.due, (time.monotonic() + interval, self.order, url))
+            self.order += 1
+            self.condition.notify_all()
+        return interval
+
+    def pending(self):
+        """Returns how many URLs are waiting for their next refresh."""
+        with self.condition:
+            return len(self.due)
@@ -1,12 +1,17 @@
 import os
-import pandas as pd
+import sys
 import matplotlib.pyplot as plt
 from rich.console import Console
-from rich.table import Table
 from rich.style import Style
 from rich.text import Text
 from rich.panel import Panel
-import random
+from market_data import load_all_markets, load_market, rank_across_markets
+from charts import draw_top_chart, top_companies
+from market_values import describe_unparseable, format_market_cap, format_price
+from table_view import END_COLOR, START_COLOR, TableView, generate_gradient_color, gradient_styles
+
+# Menu choice that loads every market at once instead of a single CSV
+ALL_MARKETS = "all"
 
 def list_csv_files(directory):
     """List all CSV files in the specified directory."""
@@ -22,13 +27,17 @@ def select_csv_file():
         return None
     
     print("Available CSV files:")
+    print("0. All markets (cross-market view)")
     for idx, file in enumerate(csv_files):
         print(f"{idx + 1}. {file}")
     
     # Get user's choice
     while True:
         try:
-            choice = int(input(f"Select a file (1-{len(csv_files)}): "))
+            choice = int(input(f"Select a file (0-{len(csv_files)}): "))
+            if choice == 0:
+                print("Selected: all markets")
+                return ALL_MARKETS
             if 1 <= choice <= len(csv_files):
                 selected_file = os.path.join(output_directory, csv_files[choice - 1])
                 print(f"Selected file: {csv_files[choice - 1]}")
@@ -39,84 +48,57 @@ def select_csv_file():
             print("Please enter a valid number.")
 
 def load_data(world_market_file):
-    """Load data from the specified CSV file."""
+    """Load a market as a typed frame, or every market ranked together when ALL_MARKETS is selected."""
+    if world_market_file == ALL_MARKETS:
+        return rank_across_markets(load_all_markets())
     if os.path.exists(world_market_file):
-        df = pd.read_csv(world_market_file)
+        df = load_market(world_market_file)
         return df
     else:
         print(f"{world_market_file} not found.")
         return None
 
-def convert_market_cap_to_numeric(market_cap_str):
-    """Converts market cap strings like '3.5 T' or '500 B' to float values."""
-    market_cap_str = market_cap_str.replace('$', '').strip()
-    if 'T' in market_cap_str:
-        return float(market_cap_str.replace('T', '')) * 1e12
-    elif 'B' in market_cap_str:
-        return float(market_cap_str.replace('B', '')) * 1e9
-    elif 'M' in market_cap_str:
-        return float(market_cap_str.replace('M', '')) * 1e6
-    else:
-        return float(market_cap_str)  # Assuming it's a plain number
-
-def generate_gradient_color(start_rgb, end_rgb, steps):
-    """Generates a list of RGB color strings creating a gradient from start_rgb to end_rgb."""
-    gradient_colors = []
-    for step in range(steps):
-        r = int(start_rgb[0] + (end_rgb[0] - start_rgb[0]) * (step / (steps - 1)))
-        g = int(start_rgb[1] + (end_rgb[1] - start_rgb[1]) * (step / (steps - 1)))
-        b = int(start_rgb[2] + (end_rgb[2] - start_rgb[2]) * (step / (steps - 1)))
-        gradient_colors.append(f"rgb({r},{g},{b})")
-    return gradient_colors
-
 def display_terminal_title(console, start_color, end_color):
-    # Create a gradient for the title text
-    gradient_colors = generate_gradient_color(start_color, end_color, len("Screener"))
+    # Create a gradient for the title text, from styles cached across redraws
+    title_styles = gradient_styles(len("Screener"), start_color, end_color)
     title_text = Text()
 
     # Apply gradient to each letter
-    for idx, char in enumerate("Screener"):
-        color = gradient_colors[idx]
-        title_text.append(char, style=Style(color=color, bold=True))
+    for char, char_style in zip("Screener", title_styles):
+        title_text.append(char, style=char_style)
     
     # Create a larger title using a Panel for emphasis
     console.print(Panel(title_text, expand=False, border_style="bold white"))
 
-def display_table(data):
+def display_table(data, view=None):
+    """Displays one page of the data (the first 50 rows unless a scrolled view is given)."""
     console = Console()
-    # Define the start and end colors for the gradient
-    start_color = (30, 144, 255)  # Light blue
-    end_color = (255, 69, 0)      # Red
-    
+    view = view or TableView(data)
+
     # Show terminal title with gradient
-    display_terminal_title(console, start_color, end_color)
-    
-    # Generate a gradient list based on the number of rows to display
-    gradient_colors = generate_gradient_color(start_color, end_color, 50)
-    
-    # Define table with a bold header style
-    header_style = Style(color="white", bold=True)
-    table = Table(show_header=True, header_style=header_style)
-    
-    table.add_column("Rank", justify="center")
-    table.add_column("Name", justify="left")
-    table.add_column("Market Cap", justify="right")
-    table.add_column("Price", justify="right")
-    table.add_column("Country", justify="center")
-    
-    # Display the first 50 rows with gradient color
-    for idx, (_, row) in enumerate(data.head(50).iterrows()):
-        row_style = Style(color=gradient_colors[idx], bold=True)
-        table.add_row(
-            str(row['Rank']),
-            row['Name'],
-            row['Market Cap'],
-            row['Price'],
-            row['Country'],
-            style=row_style
-        )
-    
-    console.print(table)
+    display_terminal_title(console, START_COLOR, END_COLOR)
+    console.print(view.render())
+
+def browse_table(data):
+    """Displays the table and lets the user page and scroll through every row."""
+    view = TableView(data)
+    display_table(data, view)
+    while view.page_count > 1:
+        command = input(f"Page {view.page}/{view.page_count} - [n]ext, [p]revious, +N/-N to scroll, g N for page N, Enter to continue: ").strip().lower()
+        if not command:
+            break
+        if command == "n":
+            view.next_page()
+        elif command == "p":
+            view.previous_page()
+        elif command[0] in "+-" and command[1:].isdigit():
+            view.scroll(int(command))
+        elif command.startswith("g") and command[1:].strip().isdigit():
+            view.go_to_page(int(command[1:]))
+        else:
+            print("Unknown command.")
+            continue
+        display_table(data, view)
 
 def display_focus_window(data, start_color, end_color):
     # Pick a random company from the data
@@ -124,8 +106,8 @@ def display_focus_window(data, start_color, end_color):
     company_details = [
         f"Company: {random_company['Name']}",
         f"Rank: {random_company['Rank']}",
-        f"Market Cap: {random_company['Market Cap']}",
-        f"Price: {random_company['Price']}",
+        f"Market Cap: {format_market_cap(random_company['Market Cap'])}",
+        f"Price: {format_price(random_company['Price'])}",
         f"Country: {random_company['Country']}"
     ]
 
@@ -143,26 +125,26 @@ def display_focus_window(data, start_color, end_color):
     console.print(Panel(details_text, title="Company Details", border_style="bold white", width=73))
 
 def display_chart(data):
-    # Convert market cap to numeric values
-    data['Market Cap (Numeric)'] = data['Market Cap'].apply(convert_market_cap_to_numeric)
-    # Sort by Market Cap in descending order and take the top 50 companies
-    sorted_data = data.sort_values(by='Market Cap (Numeric)', ascending=False).head(50)
-    
-    # Prepare labels for the chart
-    sorted_data['Label'] = sorted_data.apply(lambda x: f"{x['Name']} ({x['Market Cap']}, {x['Country']})", axis=1)
-    
+    # Take the top 50 companies by numeric market cap
+    sorted_data, unparseable = top_companies(data, 50)
+    notice = describe_unparseable('Market Cap', unparseable)
+    if notice:
+        print(notice)
+
     # Generate a vertical bar chart
-    plt.figure(figsize=(10, 15))
-    plt.barh(sorted_data['Label'], sorted_data['Market Cap (Numeric)'], color='blue')
-    plt.gca().invert_yaxis()  # Largest at the top
-    plt.xlabel('Market Cap (in USD)')
-    plt.title('Top 50 Companies by Market Cap')
-    plt.grid(axis='x', linestyle='--', alpha=0.7)
-    plt.tight_layout()
-    
+    fig, ax = plt.subplots(figsize=(10, 15))
+    draw_top_chart(ax, sorted_data, 'Top 50 Companies by Market Cap')
+    fig.tight_layout()
+
     plt.show()
 
 def main():
+    if "--live" in sys.argv[1:]:
+        # Imported here because the dashboard builds on this module
+        from dashboard import main as run_live
+        run_live([])
+        return
+
     # Prompt the user to select a CSV file
     selected_file = select_csv_file()
     
@@ -170,14 +152,10 @@ def main():
         data = load_data(selected_file)
         
         if data is not None:
-            display_table(data)  # Now showing 50 companies
-            
-            # Define the start and end colors for the gradient
-            start_color = (30, 144, 255)  # Light blue
-            end_color = (255, 69, 0)      # Red
+            browse_table(data)
 
             # Show a random company in a focus window
-            display_focus_window(data, start_color, end_color)
+            display_focus_window(data, START_COLOR, END_COLOR)
             
             print("\nGenerating chart...")
             display_chart(data)
@@ -1,49 +1,157 @@
+import argparse
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 from rich.console import Console
 from rich.table import Table
 from rich.style import Style
 from rich.text import Text
 from rich.panel import Panel
 
+try:
+    import lxml.html
+except ImportError:  # lxml is optional, the fragment is parsed with html.parser without it
+    lxml = None
+    from bs4 import BeautifulSoup
+
 YAHOO_FINANCE_URL = "https://finance.yahoo.com/quote/{}/key-statistics"
+HTTP_TIMEOUT = 15
+HTTP_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/120.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+# Symbols fetched at once in bulk mode. The work is waiting on the network, so threads are enough
+WORKER_COUNT = 16
+
+# Row labels of the Share Statistics table and the column each one fills. Labels are compared
+# exactly, after the date in parentheses and the footnote number are stripped from them
+STAT_LABELS = {
+    "Short % of Float": "Short Interest",
+    "Short Percent of Float": "Short Interest",
+    "Short Ratio": "Days to Cover",
+    "Float": "Float",
+    "Shares Short": "Shares Short",
+}
+COLUMNS = ["Symbol", "Short Interest", "Days to Cover", "Float", "Shares Short"]
+
+# "Short % of Float (Oct 15, 2024) 4" -> "Short % of Float", but the prior month's row keeps its
+# "(prior month)" so it never overwrites the current one
+LABEL_PATTERN = re.compile(r"^(.*?)\s*(?:\((prior month)?[^)]*\))?\s*\d*$")
+# The statistics table is the one holding the short interest row
+ANCHOR_PATTERN = re.compile(r">\s*Short (?:%|Percent) of Float")
+
+class StatisticsNotFound(Exception):
+    """The page has no statistics table, as for an unknown symbol or a consent page."""
+
+http_session = None
+http_session_lock = threading.Lock()
+
+def get_http_session(workers=WORKER_COUNT):
+    """Returns the pooled HTTP session shared by every worker."""
+    global http_session
+    with http_session_lock:
+        if http_session is None:
+            http_session = requests.Session()
+            http_session.headers.update(HTTP_HEADERS)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+            http_session.mount("https://", adapter)
+            http_session.mount("http://", adapter)
+    return http_session
+
+def normalize_label(text):
+    """Strips the date and footnote from a row label, leaving the label to match exactly."""
+    match = LABEL_PATTERN.match(" ".join(text.split()))
+    return f"{match.group(1)} ({match.group(2)})" if match.group(2) else match.group(1)
+
+def extract_statistics_html(page_source):
+    """Slices the raw statistics table markup out of the page without parsing it."""
+    match = ANCHOR_PATTERN.search(page_source)
+    if match is None:
+        return None
+    start = page_source.rfind("<table", 0, match.start())
+    end = page_source.find("</table>", match.end())
+    if start == -1 or end == -1:
+        return None
+    return page_source[start:end + len("</table>")]
+
+def table_cells(table_html):
+    """Yields the text of the first two cells of every row in a table fragment."""
+    if lxml is not None:
+        for row in lxml.html.fragment_fromstring(table_html).iter("tr"):
+            cells = row.findall("td")
+            if len(cells) >= 2:
+                yield cells[0].text_content(), cells[1].text_content()
+    else:
+        for row in BeautifulSoup(table_html, "html.parser").find_all("tr"):
+            cells = row.find_all("td")
+            if len(cells) >= 2:
+                yield cells[0].get_text(), cells[1].get_text()
+
+def empty_stats(symbol):
+    return {**{column: "N/A" for column in COLUMNS}, "Symbol": symbol.upper()}
 
-def fetch_short_interest_data(symbol):
+def parse_short_interest(symbol, page_source):
+    """Reads the short interest stats of one key-statistics page, 'N/A' for any that are missing.
+
+    Raises StatisticsNotFound when the page has no statistics table at all.
+    """
+    stats = empty_stats(symbol)
+    table_html = extract_statistics_html(page_source)
+    if table_html is None:
+        raise StatisticsNotFound("statistics table not found")
+    for label, value in table_cells(table_html):
+        column = STAT_LABELS.get(normalize_label(label))
+        if column is not None:
+            stats[column] = value.strip()
+    return stats
+
+def fetch_short_interest_data(symbol, session=None):
     """Fetches short interest data for a given stock symbol from Yahoo Finance."""
     try:
         url = YAHOO_FINANCE_URL.format(symbol)
-        response = requests.get(url)
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Extract short interest-related stats (example extraction)
-        stats = {}
-        stats["Symbol"] = symbol.upper()
-        stats["Short Interest"] = "N/A"
-        stats["Days to Cover"] = "N/A"
-        stats["Float"] = "N/A"
-        
-        # Searching for the statistics table that contains relevant data
-        tables = soup.find_all('table')
-        for table in tables:
-            if "Short Percent of Float" in table.text:
-                rows = table.find_all('tr')
-                for row in rows:
-                    if "Short Percent of Float" in row.text:
-                        stats["Short Interest"] = row.find_all('td')[1].text.strip()
-                    if "Shares Short (prior month)" in row.text:
-                        stats["Days to Cover"] = row.find_all('td')[1].text.strip()
-                    if "Float" in row.text:
-                        stats["Float"] = row.find_all('td')[1].text.strip()
-        
-        return stats
+        response = (session or get_http_session()).get(url, timeout=HTTP_TIMEOUT)
+        response.raise_for_status()
+        return parse_short_interest(symbol, response.text)
     except Exception as e:
-        print(f"Error occurred: {e}")
+        print(f"Error occurred for {symbol}: {e}")
         return None
 
+def fetch_short_interest_bulk(symbols, workers=WORKER_COUNT, url=YAHOO_FINANCE_URL):
+    """Fetches many symbols at once over one pooled session and returns a single frame, one row per symbol.
+
+    Symbols that could not be fetched or parsed, or whose page has no statistics table, keep their
+    row with 'N/A' for every stat, and are returned separately as a list of (symbol, error) pairs.
+    """
+    symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+    session = get_http_session(workers)
+
+    def fetch(symbol):
+        try:
+            response = session.get(url.format(symbol), timeout=HTTP_TIMEOUT)
+            response.raise_for_status()
+            return parse_short_interest(symbol, response.text), None
+        except (requests.RequestException, StatisticsNotFound) as e:
+            return empty_stats(symbol), str(e)
+        except Exception as e:
+            # One malformed page must not abort the whole batch
+            return empty_stats(symbol), f"could not parse the page: {e}"
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(symbols)))) as pool:
+        results = list(pool.map(fetch, symbols))
+    failures = [(stats["Symbol"], error) for stats, error in results if error is not None]
+    return pd.DataFrame([stats for stats, _ in results], columns=COLUMNS), failures
+
 def display_short_interest_table(short_interest_data):
-    """Displays short interest data in a nicely formatted table."""
+    """Displays short interest data in a nicely formatted table, from one symbol's stats or a bulk frame."""
     console = Console()
-    
+    if not isinstance(short_interest_data, pd.DataFrame):
+        short_interest_data = pd.DataFrame([short_interest_data] if short_interest_data else [], columns=COLUMNS)
+
     # Define the start and end colors for the gradient
     start_color = (30, 144, 255)  # Light blue
     end_color = (255, 69, 0)      # Red
@@ -65,14 +173,10 @@ def display_short_interest_table(short_interest_data):
     table.add_column("Short Interest (%)", justify="right")
     table.add_column("Days to Cover", justify="right")
     table.add_column("Float", justify="right")
+    table.add_column("Shares Short", justify="right")
     
-    if short_interest_data:
-        table.add_row(
-            short_interest_data["Symbol"],
-            short_interest_data["Short Interest"],
-            short_interest_data["Days to Cover"],
-            short_interest_data["Float"]
-        )
+    for row in short_interest_data[COLUMNS].itertuples(index=False):
+        table.add_row(*row)
     
     console.print(table)
 
@@ -86,17 +190,38 @@ def generate_gradient_color(start_rgb, end_rgb, steps):
         gradient_colors.append(f"rgb({r},{g},{b})")
     return gradient_colors
 
-def main():
+def read_symbols(path):
+    """Reads symbols from a file, one per line or comma-separated, ignoring blank lines and # comments."""
+    symbols = []
+    with open(path, encoding="utf-8") as symbols_file:
+        for line in symbols_file:
+            line = line.split("#", 1)[0]
+            symbols.extend(part.strip() for part in line.split(",") if part.strip())
+    return symbols
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Shows short interest stats from Yahoo Finance for one or many symbols.")
+    parser.add_argument("symbols", nargs="*", help="symbols to fetch (default: AAPL TSLA GME)")
+    parser.add_argument("--file", help="file of symbols, one per line, for bulk mode")
+    parser.add_argument("--workers", type=int, default=WORKER_COUNT, help="symbols fetched at once")
+    parser.add_argument("--csv", help="also write the combined table to this CSV file")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
     # Example symbols
-    symbols = ["AAPL", "TSLA", "GME"]  # Replace with any stock symbol of interest
-    
-    # Fetch and display data for each symbol
-    for symbol in symbols:
-        short_interest_data = fetch_short_interest_data(symbol)
-        if short_interest_data:
-            display_short_interest_table(short_interest_data)
-        else:
-            print(f"Failed to fetch data for {symbol}.")
+    symbols = list(arguments.symbols)
+    if arguments.file:
+        symbols += read_symbols(arguments.file)
+    symbols = symbols or ["AAPL", "TSLA", "GME"]  # Replace with any stock symbol of interest
+
+    # Fetch every symbol at once and display them in one table
+    short_interest_data, failures = fetch_short_interest_bulk(symbols, arguments.workers)
+    display_short_interest_table(short_interest_data)
+    for symbol, error in failures:
+        print(f"Failed to fetch data for {symbol}: {error}")
+    if arguments.csv:
+        short_interest_data.to_csv(arguments.csv, index=False)
 
 if __name__ == "__main__":
     main()
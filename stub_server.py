@@ -0,0 +1,57 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Local HTTP servers that stand in for the sites and APIs the scripts call, shared by benchmark.py and tests/
+
+class StubServer:
+    """A local HTTP server run on a background thread. Subclasses answer each GET through respond."""
+
+    def __init__(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                status, body, headers = stub.respond(parsed.path, {key: values[0] for key, values in parse_qs(parsed.query).items()})
+                payload = body if isinstance(body, bytes) else json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def respond(self, path, params):
+        raise NotImplementedError
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+class PageStub(StubServer):
+    """Serves fixed HTML pages by path, after a fixed latency, and 404 for any other path."""
+
+    def __init__(self, pages, latency=0):
+        super().__init__()
+        self.pages = pages
+        self.latency = latency
+
+    def respond(self, path, params):
+        time.sleep(self.latency)
+        if path not in self.pages:
+            return 404, b"Not Found", {"Content-Type": "text/plain"}
+        return 200, self.pages[path].encode(), {"Content-Type": "text/html; charset=utf-8"}
@@ -0,0 +1,108 @@
+import re
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml.html
+except ImportError:  # lxml is optional, the BeautifulSoup backends work without it
+    lxml = None
+
+TABLE_CLASS = "marketcap-table"
+COMPANY_NAME_CLASS = "company-name"
+
+# The strainer sees the raw class attribute string, so match the class as a whole word
+TABLE_CLASS_PATTERN = re.compile(rf"(^|\s){TABLE_CLASS}(\s|$)")
+TABLE_START_PATTERN = re.compile(rf"""<table[^>]*\sclass=["'](?:[^"']*\s)?{TABLE_CLASS}[\s"']""")
+
+def has_class_xpath(class_name):
+    """Builds an XPath predicate matching elements whose class list contains class_name."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')"
+
+TABLE_ROWS_XPATH = f"//table[{has_class_xpath(TABLE_CLASS)}]/tbody/tr"
+COMPANY_NAME_XPATH = f".//div[{has_class_xpath(COMPANY_NAME_CLASS)}]"
+
+def first_word(text):
+    """Returns the first whitespace-separated token of text, or an empty string."""
+    words = text.split()
+    return words[0] if words else ""
+
+def extract_table_html(page_source):
+    """Slices the raw marketcap table markup out of the page without parsing it."""
+    match = TABLE_START_PATTERN.search(page_source)
+    if match is None:
+        return None
+    end = page_source.find("</table>", match.start())
+    if end == -1:
+        return None
+    return page_source[match.start():end + len("</table>")]
+
+def rows_from_soup_table(table):
+    """Extracts [rank, name, market cap, price, country flag] rows from a BeautifulSoup table."""
+    if table is None or table.tbody is None:
+        return None
+
+    rows = []
+    for row in table.tbody.find_all('tr'):
+        columns = row.find_all('td')
+        if len(columns) >= 5:
+            rank = columns[1].text.strip()
+            name = columns[2].find('div', {'class': COMPANY_NAME_CLASS}).text.strip()
+            market_cap = columns[3].text.strip()
+            price = columns[4].text.strip()
+            country_flag = first_word(columns[7].text) if len(columns) > 7 else ""
+            rows.append([rank, name, market_cap, price, country_flag])
+    return rows
+
+def parse_with_soup(page_source):
+    """Builds a full html.parser tree of the page, as the scraper originally did."""
+    soup = BeautifulSoup(page_source, 'html.parser')
+    return rows_from_soup_table(soup.find('table', class_=TABLE_CLASS))
+
+def parse_with_strainer(page_source):
+    """Builds a tree of the marketcap table only, skipping the rest of the page."""
+    strainer = SoupStrainer('table', class_=TABLE_CLASS_PATTERN)
+    soup = BeautifulSoup(page_source, 'html.parser', parse_only=strainer)
+    return rows_from_soup_table(soup.find('table', class_=TABLE_CLASS))
+
+def parse_with_lxml(page_source):
+    """Parses the page with libxml2 and reads the rows through XPath."""
+    if lxml is None:
+        raise ImportError("the lxml parser backend requires the lxml package")
+
+    document = lxml.html.fromstring(page_source)
+    table_rows = document.xpath(TABLE_ROWS_XPATH)
+    if not table_rows:
+        # Match the BeautifulSoup backends, which tell a missing table apart from an empty one
+        return [] if document.xpath(f"//table[{has_class_xpath(TABLE_CLASS)}]/tbody") else None
+
+    rows = []
+    for row in table_rows:
+        columns = row.findall('td')
+        if len(columns) >= 5:
+            rank = columns[1].text_content().strip()
+            name = columns[2].xpath(COMPANY_NAME_XPATH)[0].text_content().strip()
+            market_cap = columns[3].text_content().strip()
+            price = columns[4].text_content().strip()
+            country_flag = first_word(columns[7].text_content()) if len(columns) > 7 else ""
+            rows.append([rank, name, market_cap, price, country_flag])
+    return rows
+
+PARSER_BACKENDS = {
+    "soup": parse_with_soup,
+    "strainer": parse_with_strainer,
+    "lxml": parse_with_lxml,
+}
+
+def available_backends():
+    """Lists the parser backends whose dependencies are installed."""
+    return [name for name in PARSER_BACKENDS if name != "lxml" or lxml is not None]
+
+def parse_market_table(page_source, backend="lxml"):
+    """Extracts the marketcap table rows with the chosen backend, or returns None if the table is missing.
+
+    The lxml backend falls back to the strainer backend when lxml is not installed.
+    """
+    if backend not in PARSER_BACKENDS:
+        raise ValueError(f"Unknown parser backend '{backend}'. Choose from: {', '.join(PARSER_BACKENDS)}")
+    if backend == "lxml" and lxml is None:
+        backend = "strainer"
+    return PARSER_BACKENDS[backend](page_source)
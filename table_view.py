@@ -0,0 +1,102 @@
+import functools
+import pandas as pd
+from rich.style import Style
+from rich.table import Table
+from market_values import format_market_cap, format_price
+
+# Rows per page in the viewer's table
+PAGE_SIZE = 50
+
+START_COLOR = (30, 144, 255)  # Light blue
+END_COLOR = (255, 69, 0)      # Red
+
+HEADER_STYLE = Style(color="white", bold=True)
+
+def generate_gradient_color(start_rgb, end_rgb, steps):
+    """Generates a list of RGB color strings creating a gradient from start_rgb to end_rgb."""
+    gradient_colors = []
+    for step in range(steps):
+        r = int(start_rgb[0] + (end_rgb[0] - start_rgb[0]) * (step / (steps - 1)))
+        g = int(start_rgb[1] + (end_rgb[1] - start_rgb[1]) * (step / (steps - 1)))
+        b = int(start_rgb[2] + (end_rgb[2] - start_rgb[2]) * (step / (steps - 1)))
+        gradient_colors.append(f"rgb({r},{g},{b})")
+    return gradient_colors
+
+@functools.lru_cache(maxsize=None)
+def gradient_styles(steps, start_rgb=START_COLOR, end_rgb=END_COLOR):
+    """Returns one bold Style per row of a gradient, built once per size and colors."""
+    colors = generate_gradient_color(start_rgb, end_rgb, max(steps, 2))[:steps]
+    return tuple(Style(color=color, bold=True) for color in colors)
+
+def format_text(values):
+    """Formats a column of labels, leaving missing values empty."""
+    return ["" if pd.isna(value) else str(value) for value in values]
+
+def format_rank(values):
+    """Formats a column of ranks, which read back as floats when a rank is missing."""
+    return ["" if pd.isna(value) else str(int(value)) for value in values]
+
+def format_window(data, start, stop):
+    """Formats rows [start, stop) of a market frame into display strings, one column array at a time.
+
+    Only the rows in the window are touched, so the cost does not grow with the size of the frame.
+    """
+    window = data.iloc[start:stop]
+    return list(zip(
+        format_rank(window["Rank"].tolist()),
+        format_text(window["Name"].tolist()),
+        [format_market_cap(value) for value in window["Market Cap"].tolist()],
+        [format_price(value) for value in window["Price"].tolist()],
+        format_text(window["Country"].tolist()),
+    ))
+
+class TableView:
+    """A scrollable window over a market frame of any size, rendered one page at a time."""
+
+    def __init__(self, data, page_size=PAGE_SIZE):
+        self.data = data
+        self.page_size = max(1, page_size)
+        self.offset = 0
+
+    @property
+    def page_count(self):
+        return max(1, -(-len(self.data) // self.page_size))
+
+    @property
+    def page(self):
+        """The 1-based page holding the first visible row."""
+        return self.offset // self.page_size + 1
+
+    def scroll_to(self, offset):
+        """Moves the window so it starts at row offset, no further than the start of the last page."""
+        last_offset = (self.page_count - 1) * self.page_size
+        self.offset = min(max(0, offset), last_offset)
+
+    def scroll(self, rows):
+        self.scroll_to(self.offset + rows)
+
+    def go_to_page(self, page):
+        self.scroll_to((page - 1) * self.page_size)
+
+    def next_page(self):
+        self.scroll(self.page_size)
+
+    def previous_page(self):
+        self.scroll(-self.page_size)
+
+    def render(self):
+        """Builds the Rich table for the visible window only."""
+        stop = min(self.offset + self.page_size, len(self.data))
+        title = f"Rows {self.offset + 1:,}-{stop:,} of {len(self.data):,}" if len(self.data) > self.page_size else None
+        table = Table(title=title, show_header=True, header_style=HEADER_STYLE)
+
+        table.add_column("Rank", justify="center")
+        table.add_column("Name", justify="left")
+        table.add_column("Market Cap", justify="right")
+        table.add_column("Price", justify="right")
+        table.add_column("Country", justify="center")
+
+        styles = gradient_styles(self.page_size)
+        for row_style, cells in zip(styles, format_window(self.data, self.offset, stop)):
+            table.add_row(*cells, style=row_style)
+        return table
@@ -0,0 +1,80 @@
+import time
+from stub_server import StubServer
+
+class QuotaStub(StubServer):
+    """Answers EARNINGS calls like Alpha Vantage, with its HTTP 200 quota replies.
+
+    More than calls_per_window calls within window_seconds get a 'Note', and any call after
+    calls_per_day have been served gets an 'Information'. Every call is recorded.
+    """
+
+    def __init__(self, calls_per_window, window_seconds, calls_per_day):
+        super().__init__()
+        self.calls_per_window = calls_per_window
+        self.window_seconds = window_seconds
+        self.calls_per_day = calls_per_day
+        self.url = f"{self.base_url}/query"
+        # (monotonic time, symbol) of every call that was served
+        self.served = []
+        self.throttled = 0
+        self.over_daily = 0
+
+    def respond(self, path, params):
+        symbol = params.get("symbol", "")
+        with self.lock:
+            now = time.monotonic()
+            if len(self.served) >= self.calls_per_day:
+                self.over_daily += 1
+                return 200, {"Information": f"Our standard API rate limit is {self.calls_per_day} requests per day."}, {}
+            recent = [at for at, _ in self.served if at > now - self.window_seconds]
+            if len(recent) >= self.calls_per_window:
+                self.throttled += 1
+                return 200, {"Note": f"Our standard API call frequency is {self.calls_per_window} calls per minute."}, {}
+            self.served.append((now, symbol))
+        if symbol.startswith("UNKNOWN"):
+            return 200, {"Error Message": "Invalid API call."}, {}
+        if symbol.startswith("PREMIUM"):
+            return 200, {"Information": "This is a premium endpoint."}, {}
+        return 200, {"symbol": symbol, "quarterlyEarnings": [
+            {"fiscalDateEnding": f"2024-{month:02d}-30", "reportedEPS": "1.50", "estimatedEPS": "1.45"} for month in (9, 6, 3)
+        ]}, {}
+
+    def symbols(self):
+        return [symbol for _, symbol in self.served]
+
+class CoinMarketStub(StubServer):
+    """Answers /coins/markets pages like CoinGecko, from a fixed coin universe and after a fixed latency.
+
+    More than max_concurrent calls at once are answered with 429 and a Retry-After header, like the
+    public API's rate limit.
+    """
+
+    def __init__(self, coins=1000, latency=0.05, max_concurrent=3, retry_after=0.05):
+        super().__init__()
+        self.coins = [
+            {"id": f"coin-{number}", "symbol": f"c{number}", "name": f"Coin {number}", "current_price": 1000.0 / number,
+             "market_cap": 1e12 / number, "total_volume": 1e10 / number, "price_change_percentage_24h": (number % 21) - 10.0}
+            for number in range(1, coins + 1)
+        ]
+        self.latency = latency
+        self.max_concurrent = max_concurrent
+        self.retry_after = retry_after
+        self.url = f"{self.base_url}/api/v3/coins/markets"
+        self.active = 0
+        self.served = 0
+        self.throttled = 0
+
+    def respond(self, path, params):
+        with self.lock:
+            if self.active >= self.max_concurrent:
+                self.throttled += 1
+                return 429, {"status": {"error_code": 429}}, {"Retry-After": str(self.retry_after)}
+            self.active += 1
+            self.served += 1
+        try:
+            time.sleep(self.latency)
+            page, per_page = int(params.get("page", 1)), int(params.get("per_page", 100))
+            return 200, self.coins[(page - 1) * per_page:page * per_page], {}
+        finally:
+            with self.lock:
+                self.active -= 1
@@ -0,0 +1,71 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from crypto_client import PAGE_SIZE, MarketClient
+from stubs import CoinMarketStub
+
+def ids(coins):
+    return [coin["id"] for coin in coins]
+
+def test_concurrent_identical_requests_make_one_call():
+    callers = 8
+    with CoinMarketStub(latency=0.2, max_concurrent=callers) as stub:
+        client = MarketClient(stub.url, cache_directory=None)
+        barrier = threading.Barrier(callers)
+
+        def get():
+            barrier.wait()
+            return client.get(page=1, per_page=PAGE_SIZE)
+
+        with ThreadPoolExecutor(max_workers=callers) as pool:
+            results = list(pool.map(lambda _: get(), range(callers)))
+        assert stub.served == 1
+        assert client.calls == 1
+        assert all(ids(result) == ids(stub.coins[:PAGE_SIZE]) for result in results)
+
+def test_screens_share_one_page():
+    with CoinMarketStub() as stub:
+        client = MarketClient(stub.url, cache_directory=None)
+        assert ids(client.top(50)) == ids(stub.coins[:50])
+        assert ids(client.top(5)) == ids(stub.coins[:5])
+        assert stub.served == 1
+
+def test_disk_cache_is_shared_across_clients(tmp_path):
+    with CoinMarketStub() as stub:
+        MarketClient(stub.url, cache_directory=tmp_path).top(50)
+        assert ids(MarketClient(stub.url, cache_directory=tmp_path).top(5)) == ids(stub.coins[:5])
+        assert stub.served == 1
+
+def test_disk_hit_keeps_only_its_remaining_ttl(tmp_path):
+    with CoinMarketStub() as stub:
+        first = MarketClient(stub.url, cache_ttl=1.0, cache_directory=tmp_path)
+        first.top(5)
+        # Backdate the disk entry, so only 0.2 seconds of its TTL are left
+        key = next(iter(first.responses))
+        path = first.disk_cache.path(key)
+        with open(path, encoding="utf-8") as cache_file:
+            entry = json.load(cache_file)
+        entry["stored_at"] -= 0.8
+        with open(path, "w", encoding="utf-8") as cache_file:
+            json.dump(entry, cache_file)
+
+        second = MarketClient(stub.url, cache_ttl=1.0, cache_directory=tmp_path)
+        second.top(5)
+        assert stub.served == 1
+        time.sleep(0.4)
+        # Past the entry's own TTL, the disk hit is no longer served from memory
+        second.top(5)
+        assert stub.served == 2
+
+def test_all_coins_pages_concurrently_in_order():
+    with CoinMarketStub(coins=2 * PAGE_SIZE + 17, max_concurrent=3) as stub:
+        client = MarketClient(stub.url, cache_directory=None, max_concurrency=3)
+        assert ids(client.all_coins()) == ids(stub.coins)
+        assert stub.throttled == 0
+
+def test_all_coins_backs_off_on_429():
+    with CoinMarketStub(coins=5 * PAGE_SIZE, max_concurrent=2) as stub:
+        client = MarketClient(stub.url, cache_directory=None, max_concurrency=5, backoff_seconds=0.05)
+        assert ids(client.all_coins()) == ids(stub.coins)
+        assert stub.throttled > 0
@@ -0,0 +1,93 @@
+import json
+import os
+import pytest
+from earnings import EarningsClient, fetch_batch
+from stubs import QuotaStub
+
+# The quota is scaled from calls per minute to calls per second, so the tests run in seconds
+CALLS_PER_SECOND = 10
+# The stub's window is a little shorter than a second, to allow for jitter between the client and the server
+STUB_WINDOW = 0.95
+WATCHLIST = [f"SYM{number:02d}" for number in range(8)]
+
+@pytest.fixture
+def stub():
+    with QuotaStub(CALLS_PER_SECOND, STUB_WINDOW, calls_per_day=10_000) as stub:
+        yield stub
+
+def make_client(stub, cache_directory, calls_per_day=10_000):
+    return EarningsClient(api_key="demo", base_url=stub.url, calls_per_minute=CALLS_PER_SECOND * 60,
+                          calls_per_day=calls_per_day, cache_directory=cache_directory, throttle_backoff=1)
+
+def expire(cache_directory, symbols):
+    """Ages the cached earnings of some symbols past their TTL."""
+    for symbol in symbols:
+        path = os.path.join(cache_directory, "earnings", f"{symbol}.json")
+        with open(path, encoding="utf-8") as cache_file:
+            entry = json.load(cache_file)
+        entry["stored_at"] = 0
+        with open(path, "w", encoding="utf-8") as cache_file:
+            json.dump(entry, cache_file)
+
+def test_cold_cache_fetches_every_symbol(stub, tmp_path):
+    results, summary = fetch_batch(make_client(stub, tmp_path), WATCHLIST)
+    assert summary == {"cached": 0, "fetched": len(WATCHLIST), "failed": 0, "deferred": 0}
+    assert sorted(stub.symbols()) == sorted(WATCHLIST)
+    assert results["SYM00"][0] == ["SYM00", "2024-09-30", "1.45", "1.50"]
+
+def test_error_replies_are_failures_and_not_cached(stub, tmp_path):
+    symbols = ["SYM00", "UNKNOWN", "PREMIUM"]
+    results, summary = fetch_batch(make_client(stub, tmp_path), symbols)
+    assert summary == {"cached": 0, "fetched": 1, "failed": 2, "deferred": 0}
+    assert list(results) == ["SYM00"]
+
+    # The failed symbols are asked for again on the next run, the good one comes from the cache
+    client = make_client(stub, tmp_path)
+    _, summary = fetch_batch(client, symbols)
+    assert client.calls == 2
+    assert summary == {"cached": 1, "fetched": 0, "failed": 2, "deferred": 0}
+
+def test_warm_cache_makes_no_calls(stub, tmp_path):
+    fetch_batch(make_client(stub, tmp_path), WATCHLIST)
+    calls = len(stub.served)
+    client = make_client(stub, tmp_path)
+    results, summary = fetch_batch(client, WATCHLIST)
+    assert len(stub.served) == calls
+    assert client.calls == 0
+    assert summary["cached"] == len(WATCHLIST)
+    assert len(results) == len(WATCHLIST)
+
+def test_refresh_fetches_only_expired_symbols(stub, tmp_path):
+    fetch_batch(make_client(stub, tmp_path), WATCHLIST)
+    calls = len(stub.served)
+    expired = ["SYM01", "SYM04"]
+    expire(tmp_path, expired)
+    _, summary = fetch_batch(make_client(stub, tmp_path), WATCHLIST)
+    assert stub.symbols()[calls:] == expired
+    assert summary == {"cached": len(WATCHLIST) - len(expired), "fetched": len(expired), "failed": 0, "deferred": 0}
+
+def test_daily_limit_defers_the_rest(tmp_path):
+    daily_limit = 5
+    with QuotaStub(CALLS_PER_SECOND, STUB_WINDOW, calls_per_day=daily_limit) as stub:
+        results, summary = fetch_batch(make_client(stub, tmp_path), WATCHLIST)
+        assert summary == {"cached": 0, "fetched": daily_limit, "failed": 0, "deferred": len(WATCHLIST) - daily_limit}
+        assert len(results) == daily_limit
+
+        # The limit is remembered, so the next run defers the same symbols without calling the API
+        client = make_client(stub, tmp_path)
+        results, summary = fetch_batch(client, WATCHLIST)
+        assert client.calls == 0
+        assert summary == {"cached": daily_limit, "fetched": 0, "failed": 0, "deferred": len(WATCHLIST) - daily_limit}
+
+def test_local_daily_quota_stops_before_the_api_does(stub, tmp_path):
+    client = make_client(stub, tmp_path, calls_per_day=3)
+    _, summary = fetch_batch(client, WATCHLIST)
+    assert summary["fetched"] == 3 and summary["deferred"] == len(WATCHLIST) - 3
+    assert stub.over_daily == 0
+
+def test_calls_stay_within_the_rate_limit(stub, tmp_path):
+    fetch_batch(make_client(stub, tmp_path), [f"RATE{number:02d}" for number in range(2 * CALLS_PER_SECOND + 5)])
+    assert stub.throttled == 0
+    times = [at for at, _ in stub.served]
+    for position, at in enumerate(times):
+        assert sum(1 for other in times[position:] if other < at + STUB_WINDOW) <= CALLS_PER_SECOND
@@ -0,0 +1,80 @@
+import os
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+import pytest
+import history
+from history import (COMPACTED_FILENAME, append_snapshot, compact_partition, load_history, partition_path,
+                     wait_for_compaction)
+
+MARKET = "usa"
+DAY = datetime(2024, 1, 1, 23, 50, tzinfo=timezone.utc)
+
+def market_frame(offset):
+    return pd.DataFrame({
+        "Rank": [str(rank) for rank in range(1, 4)],
+        "Name": ["Apple", "Microsoft", "Nvidia"],
+        "Market Cap": [f"${3 + offset}.1 T", "$3.0 T", "$2.9 T"],
+        "Price": ["$225.10", "$410.00", "$120.00"],
+        "Country": ["US", "US", "US"],
+    })
+
+def append_day(directory, snapshots=3):
+    for minute in range(snapshots):
+        append_snapshot(MARKET, market_frame(minute), DAY + timedelta(minutes=minute), directory)
+
+def day_files(directory):
+    return sorted(os.listdir(partition_path(MARKET, DAY.strftime("%Y-%m-%d"), directory)))
+
+def test_new_day_compacts_the_previous_one_in_the_background(tmp_path):
+    # pyarrow's dataset reader takes string paths only
+    directory = str(tmp_path)
+    append_day(directory)
+    append_snapshot(MARKET, market_frame(0), DAY + timedelta(hours=1), directory)
+    wait_for_compaction()
+    assert day_files(directory) == [COMPACTED_FILENAME]
+    assert len(load_history(market=MARKET, start=DAY, end=DAY + timedelta(minutes=10), directory=directory)) == 9
+
+def test_compaction_interrupted_before_deleting_snapshots_is_not_duplicated(tmp_path, monkeypatch):
+    # pyarrow's dataset reader takes string paths only
+    directory = str(tmp_path)
+    append_day(directory)
+    date = DAY.strftime("%Y-%m-%d")
+
+    def crash(path):
+        raise OSError("interrupted")
+
+    # The compacted file is in place, but none of the snapshot files were deleted
+    monkeypatch.setattr(history.os, "remove", crash)
+    with pytest.raises(OSError):
+        compact_partition(MARKET, date, directory)
+    monkeypatch.undo()
+    assert len(day_files(directory)) == 4
+
+    # A later snapshot of the same day is merged, the already compacted ones are only deleted
+    append_snapshot(MARKET, market_frame(5), DAY + timedelta(minutes=5), directory)
+    wait_for_compaction()
+    assert day_files(directory) == [COMPACTED_FILENAME]
+    loaded = load_history(market=MARKET, start=DAY, end=DAY + timedelta(minutes=10), directory=directory)
+    assert len(loaded) == 12
+    assert not loaded.duplicated(subset=["scraped_at", "Name"]).any()
+
+def test_snapshot_written_after_compaction_is_read_and_merged(tmp_path, monkeypatch):
+    # pyarrow's dataset reader takes string paths only
+    directory = str(tmp_path)
+    append_day(directory)
+    compact_partition(MARKET, DAY.strftime("%Y-%m-%d"), directory)
+
+    # A worker that scraped just before midnight finishes after the day was compacted
+    submitted = []
+    monkeypatch.setattr(history.compaction_executor, "submit", lambda *args: submitted.append(args))
+    append_snapshot(MARKET, market_frame(7), DAY + timedelta(minutes=7), directory)
+    assert len(day_files(directory)) == 2
+    loaded = load_history(market=MARKET, start=DAY, end=DAY + timedelta(minutes=10), directory=directory)
+    assert len(loaded) == 12
+
+    # The day is compacted again, picking the late snapshot up
+    monkeypatch.undo()
+    history.compaction_executor.submit(*submitted[0])
+    wait_for_compaction()
+    assert day_files(directory) == [COMPACTED_FILENAME]
+    assert len(load_history(market=MARKET, start=DAY, end=DAY + timedelta(minutes=10), directory=directory)) == 12
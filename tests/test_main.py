@@ -0,0 +1,122 @@
+import os
+import pandas as pd
+import pytest
+import requests
+import main
+from archive import PageArchive
+from benchmark_fixtures import render_fixture_page
+
+URL = "https://companiesmarketcap.com/usa/largest-companies-in-the-usa-by-market-cap/"
+FILENAME = "usa_market.csv"
+
+def ranking_rows(first_rank, count):
+    return [[str(rank), f"Company {rank}", "$1.0 B", "$10.00", "US"] for rank in range(first_rank, first_rank + count)]
+
+@pytest.fixture
+def scraper(tmp_path, monkeypatch):
+    """Runs the scraper in an empty working directory with no remembered pages and no history writes."""
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("output")
+    monkeypatch.setattr(main, "expected_row_counts", {})
+    monkeypatch.setattr(main, "table_hashes", {})
+    monkeypatch.setattr(main, "HISTORY_ENABLED", False)
+    monkeypatch.setattr(main, "TYPED_OUTPUT_ENABLED", False)
+    return main
+
+def test_expected_rows_from_a_deep_csv_are_one_page(scraper):
+    pd.DataFrame(ranking_rows(1, 240), columns=['Rank', 'Name', 'Market Cap', 'Price', 'Country']).to_csv(
+        os.path.join("output", FILENAME), index=False)
+
+    assert scraper.get_expected_rows(URL, FILENAME) == scraper.PAGE_ROWS
+
+def test_expected_rows_from_a_short_csv_are_its_rows(scraper):
+    pd.DataFrame(ranking_rows(1, 40), columns=['Rank', 'Name', 'Market Cap', 'Price', 'Country']).to_csv(
+        os.path.join("output", FILENAME), index=False)
+
+    assert scraper.get_expected_rows(URL, FILENAME) == 40
+
+def test_deep_scrape_expects_the_first_page_size(scraper, monkeypatch):
+    pages = {1: ranking_rows(1, 100), 2: ranking_rows(101, 100), 3: ranking_rows(201, 40)}
+
+    def fetch_deep_page(url, page_number):
+        data = pages.get(page_number, [])
+        return f"hash-{page_number}", data, 1000 if data else 0
+
+    monkeypatch.setattr(scraper, "fetch_deep_page", fetch_deep_page)
+    scraper.scrape_deep(URL, FILENAME)
+
+    assert len(pd.read_csv(os.path.join("output", FILENAME))) == 240
+    assert scraper.get_expected_rows(URL, FILENAME) == 100
+
+class DeepPageSession:
+    """Serves one short deep-scrape page, which replay would otherwise write as the whole market."""
+
+    def __init__(self, columns):
+        self.text = render_fixture_page(pd.DataFrame(ranking_rows(1, 10), columns=columns))
+
+    status_code = 200
+
+    def get(self, url, **kwargs):
+        return self
+
+    @property
+    def content(self):
+        return self.text.encode("utf-8")
+
+    def raise_for_status(self):
+        pass
+
+def test_replay_skips_deep_scrape_pages(scraper, monkeypatch):
+    columns = ['Rank', 'Name', 'Market Cap', 'Price', 'Country']
+    archive = PageArchive("archive")
+    archive.record(URL, render_fixture_page(pd.DataFrame(ranking_rows(1, 100), columns=columns)), path="http")
+
+    # A later deep scrape archives its first page under the plain ranking URL
+    monkeypatch.setattr(scraper, "ARCHIVE_MODE", "record")
+    monkeypatch.setattr(scraper, "page_archive", archive)
+    monkeypatch.setattr(scraper, "get_http_session", lambda: DeepPageSession(columns))
+    scraper.fetch_deep_page(URL, 1)
+    assert [entry["path"] for entry in archive.entries()] == ["http", "deep"]
+
+    stats = scraper.replay_archive(directory="replay", archive=archive)
+    assert stats["pages"] == 1 and stats["written"] == 1
+    assert len(pd.read_csv(os.path.join("replay", "output", FILENAME))) == 100
+
+def test_failed_deep_page_is_retried(scraper, monkeypatch):
+    pages = {1: ranking_rows(1, 100), 2: ranking_rows(101, 100), 3: ranking_rows(201, 40)}
+    failures = {2: 2}
+
+    def fetch_deep_page(url, page_number):
+        if failures.get(page_number):
+            failures[page_number] -= 1
+            raise requests.HTTPError("503 Server Error")
+        data = pages.get(page_number, [])
+        return f"hash-{page_number}", data, 1000 if data else 0
+
+    monkeypatch.setattr(scraper, "fetch_deep_page", fetch_deep_page)
+    monkeypatch.setattr(scraper, "DEEP_RETRY_BACKOFF", 0)
+    scraper.scrape_deep(URL, FILENAME)
+
+    assert len(pd.read_csv(os.path.join("output", FILENAME))) == 240
+
+def test_deep_page_failing_every_retry_fails_the_market(scraper, monkeypatch, caplog):
+    def fetch_deep_page(url, page_number):
+        if page_number == 2:
+            raise requests.Timeout("read timed out")
+        return f"hash-{page_number}", ranking_rows(100 * page_number - 99, 100), 1000
+
+    monkeypatch.setattr(scraper, "fetch_deep_page", fetch_deep_page)
+    monkeypatch.setattr(scraper, "DEEP_RETRY_BACKOFF", 0)
+    with pytest.raises(requests.Timeout):
+        scraper.scrape_deep(URL, FILENAME)
+
+    failed = [record for record in caplog.records if record.getMessage() == "Deep-scrape page failed"]
+    assert [record.fields["page"] for record in failed] == [2]
+    assert failed[0].fields["attempts"] == scraper.DEEP_PAGE_RETRIES + 1
+    assert not os.path.exists(os.path.join("output", FILENAME))
+
+def test_fast_profile_only_resolves_the_site():
+    options = main.build_chrome_options("fast")
+    assert ("--host-resolver-rules=MAP * ~NOTFOUND, EXCLUDE companiesmarketcap.com, EXCLUDE *.companiesmarketcap.com"
+            in options.arguments)
+    assert not any(argument.startswith("--host-resolver-rules") for argument in main.build_chrome_options("full").arguments)
@@ -0,0 +1,39 @@
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+from market_data import load_all_markets, typed_path, write_typed
+
+def market_chunk(first_rank, countries):
+    return pd.DataFrame({
+        "Rank": [str(rank) for rank in range(first_rank, first_rank + len(countries))],
+        "Name": [f"Company {rank}" for rank in range(first_rank, first_rank + len(countries))],
+        "Market Cap": ["$1.5 T"] * len(countries),
+        "Price": ["$10.00"] * len(countries),
+        "Country": countries,
+    })
+
+def test_chunks_are_written_as_separate_batches(tmp_path):
+    chunks = [market_chunk(1, ["US", "CN", None]), market_chunk(4, ["JP", "US"]), market_chunk(6, ["CN"])]
+    csv_path = os.path.join(tmp_path, "usa_market.csv")
+    pd.concat(chunks).to_csv(csv_path, index=False)
+
+    written = []
+
+    def frames():
+        for chunk in chunks:
+            # Each chunk reaches the file before the next one is converted
+            written.append(os.path.getsize(next(tmp_path.glob("*.tmp"))) if written else 0)
+            yield chunk
+
+    assert write_typed(frames(), csv_path) == {}
+    assert written[1] > 0 and written[2] > written[1]
+    with pa.memory_map(typed_path(csv_path)) as source:
+        reader = ipc.open_file(source)
+        assert reader.num_record_batches == len(chunks)
+        table = reader.read_all()
+    assert table.column("Country").to_pylist() == ["US", "CN", None, "JP", "US", "CN"]
+    assert table.column("Rank").to_pylist() == list(range(1, 7))
+
+    frame = load_all_markets(directory=str(tmp_path), cache_directory=str(tmp_path / "cache"))
+    assert frame["Country"].tolist()[:2] == ["US", "CN"] and len(frame) == 6
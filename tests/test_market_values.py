@@ -0,0 +1,25 @@
+import math
+import pandas as pd
+import pytest
+from market_values import parse_money_column
+
+@pytest.mark.parametrize("value, expected", [
+    ("$3.595 T", 3.595e12),
+    ("$222.45 B", 222.45e9),
+    ("$15.2 M", 15.2e6),
+    ("$0.5K", 500.0),
+    ("$169.17", 169.17),
+    ("$1,234", 1234.0),
+    ("$3.5  T", 3.5e12),
+])
+def test_well_formed_values_parse(value, expected):
+    numbers, unparseable = parse_money_column(pd.Series([value]))
+    assert numbers[0] == pytest.approx(expected)
+    assert unparseable.empty
+
+@pytest.mark.parametrize("value", ["3.5BT", "$3.5 BT", "$3.5 TT", "T", "$ B", "abc", "nan"])
+def test_malformed_values_are_rejected(value):
+    numbers, unparseable = parse_money_column(pd.Series(["$1.0 T", value]))
+    assert numbers[0] == 1e12
+    assert math.isnan(numbers[1])
+    assert unparseable.tolist() == [value]
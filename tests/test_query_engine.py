@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+from query_engine import ScreenEngine, parse_arguments
+
+@pytest.fixture
+def engine():
+    return ScreenEngine(pd.DataFrame({
+        "Rank": [2, 1, 3],
+        "Name": ["Microsoft", "Apple", "Nvidia"],
+        "Market Cap": [3.0e12, 3.4e12, 2.9e12],
+        "Price": [410.0, 225.1, 120.0],
+        "Country": ["US", "US", "US"],
+        "Market": ["usa", "usa", "usa"],
+    }))
+
+def names(engine, **screen):
+    return list(engine.query(**screen)[1]["Name"])
+
+@pytest.mark.parametrize("sort_by, expected", [
+    ("Market Cap", ["Apple", "Microsoft", "Nvidia"]),
+    ("Price", ["Microsoft", "Apple", "Nvidia"]),
+    ("Rank", ["Apple", "Microsoft", "Nvidia"]),
+    ("Name", ["Apple", "Microsoft", "Nvidia"]),
+])
+def test_each_column_sorts_in_its_default_direction(engine, sort_by, expected):
+    assert names(engine, sort_by=sort_by) == expected
+
+def test_explicit_direction_overrides_the_default(engine):
+    assert names(engine, sort_by="Name", descending=True) == ["Nvidia", "Microsoft", "Apple"]
+    assert names(engine, sort_by="Market Cap", descending=False) == ["Nvidia", "Microsoft", "Apple"]
+
+@pytest.mark.parametrize("argv, descending", [
+    (["--sort", "Name"], None),
+    (["--sort", "Name", "--descending"], True),
+    (["--sort", "Price", "--ascending"], False),
+])
+def test_cli_leaves_the_direction_to_the_column_unless_given(argv, descending):
+    assert parse_arguments(argv).descending is descending
+
+def test_cli_rejects_both_directions():
+    with pytest.raises(SystemExit):
+        parse_arguments(["--ascending", "--descending"])
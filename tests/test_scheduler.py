@@ -0,0 +1,90 @@
+import time
+import pytest
+import main
+import scheduler
+from scheduler import RefreshScheduler
+
+URL = "https://companiesmarketcap.com/"
+
+class CountingBudget:
+    """Stands in for the scheduler's request budget and counts the tokens taken."""
+
+    def __init__(self):
+        self.taken = 0
+
+    def take_request(self):
+        self.taken += 1
+
+class FakeResponse:
+    status_code = 200
+    text = "<html><body>no table</body></html>"
+    content = text.encode("utf-8")
+    headers = {}
+
+    def raise_for_status(self):
+        pass
+
+class FakeSession:
+    def get(self, url, **kwargs):
+        return FakeResponse()
+
+def test_next_url_does_not_spend_the_request_budget():
+    scheduler = RefreshScheduler({URL: "world", URL + "usa/": "usa"}, requests_per_minute=60, burst=1)
+
+    assert [scheduler.next_url(), scheduler.next_url()] == [URL, URL + "usa/"]
+    assert scheduler.tokens == 1
+
+def test_take_request_spaces_requests_to_the_rate():
+    scheduler = RefreshScheduler({URL: "world"}, requests_per_minute=600, burst=2)
+
+    start = time.monotonic()
+    for _ in range(5):
+        scheduler.take_request()
+    # Two tokens are in the bucket, the other three are earned at 10 per second
+    assert time.monotonic() - start == pytest.approx(0.3, abs=0.1)
+
+@pytest.fixture
+def budget(monkeypatch):
+    budget = CountingBudget()
+    monkeypatch.setattr(main, "request_budget", budget)
+    monkeypatch.setattr(main, "get_http_session", lambda: FakeSession())
+    return budget
+
+def test_every_deep_page_takes_a_token(budget):
+    for page_number in range(1, 4):
+        main.fetch_deep_page(URL, page_number)
+
+    assert budget.taken == 3
+
+def test_browser_fallback_takes_a_second_token(budget, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main, "FETCH_MODE", "http")
+
+    class FakeDriver:
+        page_source = FakeResponse.text
+
+        def get(self, url):
+            pass
+
+        def implicitly_wait(self, seconds):
+            pass
+
+        def execute_script(self, script):
+            return [None, None]
+
+    # The page has no table, so it falls back to Chrome, which finds none either
+    monkeypatch.setattr(main, "PAGE_LOAD_PROFILE", "full")
+    with pytest.raises(ValueError):
+        main.fetch_page(FakeDriver, URL, "world_market.csv")
+
+    assert budget.taken == 2
+
+def test_market_that_opens_backs_off_from_its_target(monkeypatch):
+    exchange = {"open": False}
+    monkeypatch.setattr(scheduler, "is_market_open", lambda market, now=None: exchange["open"])
+    refresh = RefreshScheduler({URL: "usa"})
+    target = refresh.target_freshness(URL)
+
+    assert refresh.record_result(URL, changed=False) == scheduler.CLOSED_INTERVAL
+    exchange["open"] = True
+    assert [refresh.record_result(URL, changed=False) for _ in range(3)] == [target * 2, target * 4, target * 8]
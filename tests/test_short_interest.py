@@ -0,0 +1,62 @@
+import pytest
+import short_interest
+from short_interest import COLUMNS, StatisticsNotFound, fetch_short_interest_bulk, normalize_label, parse_short_interest
+from stub_server import PageStub
+
+def statistics_page(rows):
+    cells = "".join(f'<tr><td class="label">{label}</td><td class="value">{value}</td></tr>' for label, value in rows)
+    return f'<html><body><table><tr><td>Market Cap</td><td>3.5T</td></tr></table><table><tbody>{cells}</tbody></table></body></html>'
+
+SHARE_STATISTICS = [
+    ("Float <sup>8</sup>", "15.04B"),
+    ("Shares Short (Oct 15, 2024) <sup>4</sup>", "154.85M"),
+    ("Short Ratio (Oct 15, 2024) <sup>4</sup>", "3.1"),
+    ("Short % of Float (Oct 15, 2024) <sup>4</sup>", "1.03%"),
+    ("Short % of Shares Outstanding (Oct 15, 2024) <sup>4</sup>", "1.02%"),
+    ("Shares Short (prior month Sep 13, 2024) <sup>4</sup>", "137.12M"),
+]
+
+@pytest.mark.parametrize("label, expected", [
+    ("Short % of Float (Oct 15, 2024) 4", "Short % of Float"),
+    ("Shares Short (prior month Sep 13, 2024) 4", "Shares Short (prior month)"),
+    ("Float 8", "Float"),
+    ("% Held by Insiders 1", "% Held by Insiders"),
+])
+def test_normalize_label(label, expected):
+    assert normalize_label(label) == expected
+
+def test_rows_are_matched_on_exact_labels():
+    stats = parse_short_interest("aapl", statistics_page(SHARE_STATISTICS))
+    assert stats == {"Symbol": "AAPL", "Short Interest": "1.03%", "Days to Cover": "3.1", "Float": "15.04B", "Shares Short": "154.85M"}
+
+def test_missing_statistics_table_raises():
+    with pytest.raises(StatisticsNotFound):
+        parse_short_interest("AAPL", "<html><body><p>Consent required</p></body></html>")
+
+def test_bulk_reports_every_failure_without_aborting(monkeypatch):
+    pages = {
+        "/quote/GOOD/key-statistics": statistics_page(SHARE_STATISTICS),
+        "/quote/NOTABLE/key-statistics": "<html><body><p>No data</p></body></html>",
+        "/quote/BROKEN/key-statistics": statistics_page([("Short % of Float", "broken")]),
+    }
+    table_cells = short_interest.table_cells
+
+    def failing_table_cells(table_html):
+        if "broken" in table_html:
+            raise ValueError("malformed row")
+        return table_cells(table_html)
+
+    monkeypatch.setattr(short_interest, "table_cells", failing_table_cells)
+    with PageStub(pages) as stub:
+        frame, failures = fetch_short_interest_bulk(["GOOD", "NOTABLE", "BROKEN", "MISSING"], workers=4,
+                                                    url=f"{stub.base_url}/quote/{{}}/key-statistics")
+
+    assert list(frame.columns) == COLUMNS
+    assert frame["Symbol"].tolist() == ["GOOD", "NOTABLE", "BROKEN", "MISSING"]
+    assert frame.loc[0, "Short Interest"] == "1.03%"
+    assert (frame.loc[1:, COLUMNS[1:]] == "N/A").all().all()
+    errors = dict(failures)
+    assert sorted(errors) == ["BROKEN", "MISSING", "NOTABLE"]
+    assert errors["NOTABLE"] == "statistics table not found"
+    assert "malformed row" in errors["BROKEN"]
+    assert "404" in errors["MISSING"]
@@ -5,38 +5,31 @@ from rich.table import Table
 from rich.style import Style
 from rich.panel import Panel
 from rich import box
+from crypto_client import get_client
 
-API_URL = "https://api.coingecko.com/api/v3/coins/markets"
-PARAMS = {
-    "vs_currency": "usd",
-    "order": "market_cap_desc",
-    "per_page": 5,
-    "page": 1,
-    "sparkline": False,
-}
+# Number of cryptocurrencies to show
+TOP_COINS = 5
 
-def fetch_volume_data():
-    """Fetches volume data for cryptocurrencies from the CoinGecko API and returns it as a list."""
+def fetch_volume_data(count=TOP_COINS):
+    """Fetches volume data for the largest cryptocurrencies through the shared CoinGecko client and returns it as a list."""
     try:
-        response = requests.get(API_URL, params=PARAMS)
-        if response.status_code == 200:
-            volume_data = response.json()
-            volume_list = []
+        volume_data = get_client().top(count)
+        volume_list = []
 
-            # Extract relevant data for each cryptocurrency
-            for asset in volume_data:
-                name = asset.get("name", "N/A")
-                symbol = asset.get("symbol", "N/A").upper()
-                current_price = asset.get("current_price", 0.0)
-                volume = asset.get("total_volume", 0)
-                percent_change = asset.get("price_change_percentage_24h", 0)
-                
-                volume_list.append([name, symbol, current_price, volume, percent_change])
-                
-            return volume_list
-        else:
-            print("Failed to fetch data. Please check the API.")
-            return []
+        # Extract relevant data for each cryptocurrency
+        for asset in volume_data:
+            name = asset.get("name", "N/A")
+            symbol = asset.get("symbol", "N/A").upper()
+            current_price = asset.get("current_price") or 0.0
+            volume = asset.get("total_volume") or 0
+            percent_change = asset.get("price_change_percentage_24h") or 0
+
+            volume_list.append([name, symbol, current_price, volume, percent_change])
+
+        return volume_list
+    except requests.RequestException as e:
+        print(f"Failed to fetch data. Please check the API. ({e})")
+        return []
     except Exception as e:
         print(f"Error occurred: {e}")
         return []